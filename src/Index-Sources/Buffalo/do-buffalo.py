@@ -70,14 +70,24 @@ fb.load_corrections()
 
 Buffalo_csv_file = Path( 'Raw-Index', 'buffalo-index.csv.gz' )
 
+#   WRW - Streamed, the csv is sorted by book from extract-csv-from-html.py so a book is
+#       complete at the first row of the next one. Write it to Music-Index then, only
+#       one book is held at a time.
+
 # with open( Buffalo_csv_file ) as ifd:
 with gzip.open( Buffalo_csv_file.as_posix(), 'rt' ) as ifd:
     csvreader = csv.reader( ifd )
     lineno = 0
+    prior_book = None
     for line in csvreader:
         lineno += 1
+        if line[0] != prior_book:
+            fb.flush_book( "Buffalo", "Buf", prior_book )
+            prior_book = line[0]
         proc_item( fb, line, Buffalo_csv_file, lineno )
 
+    fb.flush_book( "Buffalo", "Buf", prior_book )
+
 # ------------------------------------------------------------------------
 
 fb.save( "Buffalo", "Buf" )
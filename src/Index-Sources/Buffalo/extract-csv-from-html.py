@@ -34,6 +34,7 @@ import re
 import os
 import sys
 import collections
+import itertools
 from pathlib import Path
 
 sys.path.append( "../../bin" )
@@ -87,6 +88,7 @@ Buffalo_csv_file = "./buffalo-index.csv.gz"
 Errors = "./Errors.txt"
 
 period = 36         # Number of lines per item
+Run_Size = 20000    # Items held before they are moved to a temp file by fb.save_csv_run()
 
 Books = collections.Counter()
 Elements = collections.Counter()
@@ -231,16 +233,19 @@ conf.set_class_variables()
 fb = fb_utils.FB()
 fb.set_classes( conf )
 fb.set_class_config()
+fb.load_corrections()
+
+#   WRW - Read line by line, not readlines(), the html file is large. An item is its <h2>
+#       line and the following period - 1 lines taken from the same iterator.
 
 ipath = Path( Src ).expanduser()
 with open( ipath ) as ifd, open( Errors, "w" ) as efd:
     prior_line = "<No Prior>"
-    lines = ifd.readlines()
     i = 0
+    count = 0
     in_contents = False                         # A little state machine
-    while i < len( lines ):
-        line = lines[i]
-        line = line.strip()
+    for raw_line in ifd:
+        line = raw_line.strip()
 
         if line == '<div id="content">':        #   Start at <div id="content">
             in_contents = True
@@ -250,10 +255,14 @@ with open( ipath ) as ifd, open( Errors, "w" ) as efd:
 
         if in_contents:
             if "<h2>" in line:
-                item = lines[i:i+period]
+                item = [ raw_line ] + list( itertools.islice( ifd, period - 1 ) )
 
                 proc_item( fb, efd, item )      # *** Bang!
-                i += period
+                i += len( item )
+
+                count += 1
+                if count % Run_Size == 0:
+                    fb.save_csv_run()
             else:
                 print( f"WARNING: Line {i+1}, unexpected line: [{line}]", file=efd )
                 print( f"   Prior line: [{prior_line}]", file=efd )
@@ -1,14 +1,38 @@
 #!/bin/bash
+#   WRW - Run the do-*.py converter of each source, up to JOBS at once, default number of CPUs.
+#       Each writes only its own Music-Index files. Output of each is shown together when
+#       it finishes, each line prefixed with the folder, then its time and exit status.
 
 export PYTHONPATH=../../birdland
+JOBS=${JOBS:-$(nproc)}
+
+run_one() {
+    local x=$1
+    local start=$SECONDS
+    local out rc
+
+    out=$( cd $x && ./do-*.py 2>&1 )
+    rc=$?
+    printf '%s\n' "$( sed "s/^/[$x] /" <<< "$out" )" "[$x] exit: $rc, seconds: $(( SECONDS - start ))" ""
+    return $rc
+}
+
+status=0
 for x in *
 do
     if [[ -d $x ]]
     then
-    (
-        echo $x
-        cd $x
-        do-*.py
-    )
+        while (( $( jobs -rp | wc -l ) >= JOBS ))
+        do
+            wait -n || status=1
+        done
+        run_one $x &
     fi
 done
+
+while (( $( jobs -p | wc -l ) > 0 ))
+do
+    wait -n || status=1
+done
+
+exit $status
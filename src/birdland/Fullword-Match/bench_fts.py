@@ -0,0 +1,104 @@
+#!/usr/bin/python
+# ------------------------------------------------------------------------
+#   bench_fts.py
+#       WRW - Compare the Sqlite FTS5 search used with birdland.py --fulltext
+#       against the plain my_match_c() search on a database built with
+#       build_tables.py --fulltext. Both must find exactly the same rows.
+
+#   Usage: bench_fts.py path-to-Birdland.db [count]
+# ------------------------------------------------------------------------
+
+import sys
+import os
+import time
+import sqlite3
+
+sys.path.insert( 0, os.path.join( os.path.dirname( os.path.realpath( __file__ )), '..' ))
+import fullword
+import fb_utils
+
+test_values = [
+    "love",
+    "night",
+    "the",
+    "a",
+    "blues",
+    "stella starlight",
+    "all of you",
+    "ain't",
+    "don't get around",
+    "body and soul",
+    "round midnight",
+    "gershwin",
+    "porter",
+    "hart",
+    "zzzqqq",
+    "champthe",                 # Ignore chars inside a word, "Champ(The)".
+    "ourlove stay",
+]
+
+# ------------------------------------------------------------------------
+
+def my_match_c( column, value ):
+    return fullword.match( column, value )
+
+def run( conn, query, data, count ):
+    start = time.time()
+    for i in range( count ):
+        rows = conn.execute( query, data ).fetchall()
+    return set( [ x[0] for x in rows ] ), ( time.time() - start ) / count
+
+# ------------------------------------------------------------------------
+
+def main():
+    if len( sys.argv ) < 2:
+        print( f"usage: {sys.argv[0]} path-to-Birdland.db [count]", file=sys.stderr )
+        sys.exit(1)
+
+    count = int( sys.argv[2] ) if len( sys.argv ) > 2 else 5
+
+    conn = sqlite3.connect( sys.argv[1] )
+    conn.create_function( 'my_match_c', 2, my_match_c )
+
+    total_match = total_fts = 0
+    errors = 0
+
+    print( f"{'Column':<28} {'Value':<20} {'Rows':>6} {'my_match_c ms':>14} {'FTS5 ms':>10}" )
+
+    for col, ( key, fts, fts_col ) in fb_utils.Fts_Index.items():
+        table = col.split( '.' )[0]
+
+        try:
+            rows = conn.execute( f"SELECT COUNT(*) FROM {fts}" ).fetchone()[0]
+        except sqlite3.OperationalError:
+            print( f"ERROR: no {fts} table, build with build_tables.py --fulltext", file=sys.stderr )
+            sys.exit(1)
+
+        if not rows:
+            continue
+
+        for value in test_values:
+            q1 = f"SELECT {key} FROM {table} WHERE my_match_c( {col}, ? )"
+            q2 = f"""SELECT {key} FROM {table}
+                     WHERE {key} IN ( SELECT rowid FROM {fts} WHERE {fts} MATCH ? ) AND my_match_c( {col}, ? )"""
+
+            r1, t1 = run( conn, q1, [ value ], count )
+            r2, t2 = run( conn, q2, [ fb_utils.fts_query( fts_col, value ), value ], count )
+
+            total_match += t1
+            total_fts += t2
+
+            flag = '' if r1 == r2 else '  *** MISMATCH'
+            if flag:
+                errors += 1
+
+            print( f"{col:<28} {value:<20} {len(r1):>6} {t1*1000:>14.2f} {t2*1000:>10.2f}{flag}" )
+
+    print()
+    print( f"Total: my_match_c {total_match*1000:.1f} ms, FTS5 {total_fts*1000:.1f} ms, mismatches: {errors}" )
+    return 1 if errors else 0
+
+# ------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    sys.exit( main() )
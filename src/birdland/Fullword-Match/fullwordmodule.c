@@ -19,6 +19,9 @@
 
     Cheating a little here with fixed size buffers and lists but with a 2:1 safety margin over longest string seen.
     Maybe someday do with dynamic buffer. Overflows are detected and reported with an exception.
+    WRW - Now someday. Column buffers are still on the stack for the usual short column but go to
+        the heap when a column is longer, the value buffers are sized to the value. No more limits,
+        long audio tags and file paths match like any other instead of raising an exception per row.
 
     Note: ignore_word are not implemented yet. Maybe never.
 
@@ -30,6 +33,12 @@
             Break and ignore chars are in strings instead of if() stmts.
             Use break and ignore chars consistently on both column and value.
             Add cache code to only process value when it changes.
+
+    WRW - Added compiled matcher, fullword.compile( value ), holding its own tokenized value.
+        match( column ) on it needs no global cache and is reentrant. match_many( strings )
+        matches a whole sequence of column strings in one call with the GIL released and
+        returns bytes with one 0/1 flag per string, e.g. for itertools.compress().
+        Matching itself is now in match_lists() and used by both.
 */
 /* ---------------------------------------------------------------------------------------- */
 
@@ -42,15 +51,14 @@
     #include <stdio.h>
 #endif
 
-static PyObject *MatchError;
-void do_exception();
+static PyObject *MatchError;           // No longer raised, kept as fullword.error for callers catching it.
 
-#define LIST_SIZE 80                    // Maximum number of tokens in column or value.  Saw 38 tokens.
-#define BUF_SIZE  500                   // 500 Maximum string length for column or value. Saw 254 bytes.
+#define LIST_SIZE 80                    // Tokens in column on stack. Saw 38 tokens. More go to heap.
+#define BUF_SIZE  500                   // Column length on stack. Saw 254 bytes. Longer go to heap.
 
-char cached_value[ BUF_SIZE ] = "Y";    // Cache copy of original string. value_buf is partioned into separate strings and not suitable for strcmp().
-char *value_list[ LIST_SIZE ];          // Cache value list in global space
-char value_buf[ BUF_SIZE ] = "X";       // Cache value string in global space. "X" and "Y" needed to fail initial strcmp().
+char *cached_value = NULL;              // Cache copy of original string. value_buf is partioned into separate strings and not suitable for strcmp().
+char **value_list = NULL;               // Cache value list in global space
+char *value_buf = NULL;                 // Cache value string in global space.
 int value_cnt;                          // Global for access on cache hit.
 
 char *ignore_chars = "\"!?()";          // chars ignored in value and column when matching
@@ -70,10 +78,10 @@ int char_in_string( char c, char *s ) {
 
 // ---------------------------------------------------------------------
 //  Split 'buf' into separate words on space boundaries.
-//      Create list of pointers to words in 'list'
-//      Return count of words or -1 on error.
+//      Create list of pointers to words in 'list' of 'size' entries.
+//      Return count of words or -1 if more than 'size'. Does not touch Python, safe without the GIL.
 
-int partition_buffer( char *id, char *buf, char **list ) {
+int split_buffer( char *buf, char **list, int size ) {
     int count = 0;
     int i;
     char c;
@@ -82,19 +90,24 @@ int partition_buffer( char *id, char *buf, char **list ) {
 
     for( i = 0; (c = buf[i]); i++ ) {
         if( c == ' ' ) {
-            buf[i] = 0x00;                      // Terminate word in buffer
-            list[ count++ ] = &buf[i+1];        // And add next word to list
-
-            if( count >= LIST_SIZE ) {
-                sprintf( buf, "%s token count exceeds internal limit: %d", id, LIST_SIZE );
-                do_exception( buf );
+            if( count >= size ) {
                 return -1;
             }
+            buf[i] = 0x00;                      // Terminate word in buffer
+            list[ count++ ] = &buf[i+1];        // And add next word to list
         }
     }
     return count;
 }
 
+// ---------------------------------------------------------------------
+//  Upper bound on number of words in 'src' after copy_to_buffer(). Words there are
+//      separated by a single space with none leading or trailing.
+
+int max_tokens( size_t length ) {
+    return length / 2 + 2;
+}
+
 // ---------------------------------------------------------------------
 //  Copy 'src' to 'dst' ignoring some some chars, converting others to space.
 
@@ -118,6 +131,131 @@ void copy_to_buffer( const char *src, char *dst ) {
     }
 }
 
+// ---------------------------------------------------------------------
+//  Finally, approximate "MATCH( column ) AGAINST( value ) IN BOOLEAN MODE" from mysql.
+//  Match in value in order given. Return 1 on match, else 0.
+
+int match_lists( char **value_list, int value_cnt, char **column_list, int column_cnt ) {
+    int i;
+    int j;
+    int next_i = 0;
+    int matches = 0;
+
+    for( j = 0; j < column_cnt; j++ ) {                         // for each token in column (the column value )
+        for( i = next_i; (i < value_cnt); i++ ) {               // for each token in value (the search value )
+            if( ! strcmp( value_list[i], column_list[j] )) {    // found word in column, stop looking for word
+                matches++;
+                next_i = i + 1;                                 // Start next iteration of value where left off in previous.
+                break;
+            }
+        }
+    }
+
+    /* ----------------------------------------- */
+    //  All values must match.
+
+    return value_cnt == matches ? 1 : 0;
+}
+
+// ---------------------------------------------------------------------
+//  Match one column against an already partitioned value.
+//  Fast path with column buffers on stack. A column too long for column_buf or with too many
+//      words for column_list gets heap buffers of the size needed.
+//  Return 1 or 0, -1 only if out of memory. Safe without the GIL.
+
+int match_column( char **value_list, int value_cnt, const char *column ) {
+    char column_buf[ BUF_SIZE ];
+    char *column_list[ LIST_SIZE ];
+    char *buf = column_buf;
+    char **list = column_list;
+    size_t length = strlen( column );
+    int column_cnt;
+    int match = -1;
+
+    if( length >= BUF_SIZE ) {
+        buf = PyMem_RawMalloc( length + 1 );
+        if( buf == NULL ) {
+            return -1;
+        }
+    }
+
+    copy_to_buffer( column, buf );
+    column_cnt = split_buffer( buf, list, LIST_SIZE );
+
+    if( column_cnt < 0 ) {                          // Too many words, split again into list of size needed.
+        list = PyMem_RawMalloc( max_tokens( length ) * sizeof( char * ) );
+        if( list == NULL ) {
+            goto done;
+        }
+        copy_to_buffer( column, buf );              // split_buffer() terminated words in buf, start over.
+        column_cnt = split_buffer( buf, list, max_tokens( length ) );
+    }
+
+    #ifdef DEBUG
+        {
+            int i;
+            for( i = 0; (i < column_cnt); i++ ) {
+                printf( "column_list: '%s'\n", list[i] );
+            }
+            printf( "\n" );
+        }
+    #endif
+
+    match = match_lists( value_list, value_cnt, list, column_cnt );
+
+done:
+    if( buf != column_buf ) {
+        PyMem_RawFree( buf );
+    }
+    if( list != column_list ) {
+        PyMem_RawFree( list );
+    }
+    return match;
+}
+
+// ---------------------------------------------------------------------
+//  Replace cached value for fullword.match(). Caller holds the GIL.
+//  Return 0 or -1 with exception set.
+
+int set_cached_value( const char *value ) {
+    size_t length = strlen( value );
+
+    PyMem_Free( cached_value );
+    PyMem_Free( value_buf );
+    PyMem_Free( value_list );
+
+    cached_value = PyMem_Malloc( length + 1 );
+    value_buf = PyMem_Malloc( length + 1 );
+    value_list = PyMem_Malloc( max_tokens( length ) * sizeof( char * ) );
+
+    if( cached_value == NULL || value_buf == NULL || value_list == NULL ) {
+        PyMem_Free( cached_value );
+        PyMem_Free( value_buf );
+        PyMem_Free( value_list );
+        cached_value = value_buf = NULL;
+        value_list = NULL;
+        PyErr_NoMemory();
+        return -1;
+    }
+
+    strcpy( cached_value, value );
+    copy_to_buffer( value, value_buf );
+    value_cnt = split_buffer( value_buf, value_list, max_tokens( length ) );     //  Split value on space into list
+
+    #ifdef DEBUG
+        {
+            int i;
+            printf( "value: '%s'\n", value );
+            printf( "value_buf: '%s'\n", value_buf );
+            for( i = 0; (i < value_cnt); i++ ) {
+                printf( "value_list: '%s'\n", value_list[i] );
+            }
+        }
+    #endif
+
+    return 0;
+}
+
 // ---------------------------------------------------------------------
 // PyArg_ParseTuple second arg: z: str or None, s: str,
 //      There are some Nulls at least in the audio_file table, maybe elsewhere when no column.
@@ -141,113 +279,227 @@ fullword_match( PyObject *self, PyObject *column_args, PyObject *value_args ) {
         printf( "----------------------------------------\n" );
     #endif
 
-    // ---------------------------------------------------------------------
-    //  Lenght checks on column and value
+    // -----------------------------------------------------------------
+    //  Value cache.
+    //  Only copy_to_buffer() and split_buffer() when value changes.
+
+    if( cached_value == NULL || strcmp( value, cached_value )) {    // This one strcmp() should be faster than
+        if( set_cached_value( value ) < 0 ) {                       // several copy_to_buffer() and split_buffer() on each iteration.
+            return NULL;
+        }
+    }
+
+    // -----------------------------------------------------------------
+
+    int match = match_column( value_list, value_cnt, column );
+    if( match < 0 ) {
+        return PyErr_NoMemory();
+    }
+
+    return PyLong_FromLong( match );
+}
 
-    char column_buf[ BUF_SIZE ];          // temp column on stack so don't have to worry about free() if malloc()ed.
-    char *column_list[LIST_SIZE];         // also use column_buf for exception messages.
+// ----------------------------------------------------------------------------------------   
+//  Compiled matcher. Holds its own copy of the processed and partitioned value so nothing
+//      is shared between matchers. Not changed after compile() so any number of threads
+//      may use one matcher at the same time.
+
+typedef struct {
+    PyObject_HEAD
+    PyObject *value;                    // Original value string, for repr().
+    char *value_buf;
+    char **value_list;
+    int value_cnt;
+} MatcherObject;
+
+static PyTypeObject MatcherType;
+
+// ---------------------------------------------------------------------
 
-    if( strlen( column ) > BUF_SIZE ) {
-        sprintf( column_buf, "Column data length exceeds internal limit: %d", BUF_SIZE );
-        do_exception( column_buf );
+static void
+matcher_dealloc( MatcherObject *self ) {
+    Py_XDECREF( self->value );
+    PyMem_Free( self->value_buf );
+    PyMem_Free( self->value_list );
+    Py_TYPE( self )->tp_free( ( PyObject * ) self );
+}
+
+// ---------------------------------------------------------------------
+
+static PyObject *
+matcher_repr( MatcherObject *self ) {
+    return PyUnicode_FromFormat( "<fullword matcher %R>", self->value );
+}
+
+// ---------------------------------------------------------------------
+//  fullword.compile( value ) - Build a matcher for value.
+
+static PyObject *
+fullword_compile( PyObject *self, PyObject *args ) {
+    PyObject *value_obj;
+    const char *value;
+    Py_ssize_t length;
+    MatcherObject *m;
+    int size;
+
+    if( !PyArg_ParseTuple( args, "U", &value_obj )) {
         return NULL;
     }
 
-    if( strlen( value ) > BUF_SIZE ) {
-        sprintf( column_buf, "Value data length exceeds internal limit: %d", BUF_SIZE );
-        do_exception( column_buf );
+    value = PyUnicode_AsUTF8AndSize( value_obj, &length );
+    if( ! value ) {
         return NULL;
     }
 
-    // -----------------------------------------------------------------
-    //  Value cache.
-    //  Only copy_to_buffer() and partition_buffer() when value changes.
+    m = PyObject_New( MatcherObject, &MatcherType );
+    if( m == NULL ) {
+        return NULL;
+    }
 
-    if( strcmp( value, cached_value )) {        // This one strcmp() and strcpy() should be faster than
-        strcpy( cached_value, value );          // several copy_to_buffer() and partition_buffer() on each iteration.
+    m->value = NULL;                // PyObject_New() doesn't zero, matcher_dealloc() frees all three.
+    m->value_buf = NULL;
+    m->value_list = NULL;
 
-        copy_to_buffer( value, value_buf );
+    Py_INCREF( value_obj );
+    m->value = value_obj;
+    m->value_buf = PyMem_Malloc( length + 1 );
 
-        #ifdef DEBUG
-            printf( "value: '%s'\n", value );
-            printf( "value_buf: '%s'\n", value_buf );
-        #endif
+    size = max_tokens( length );
+    m->value_list = PyMem_Malloc( size * sizeof( char * ) );
 
-        value_cnt = partition_buffer( "Value", value_buf, value_list );         //  Split value on space into list
-        if( value_cnt < 0 ) {
-            return NULL;
-        }
-    }       
+    if( m->value_buf == NULL || m->value_list == NULL ) {
+        Py_DECREF( m );
+        return PyErr_NoMemory();
+    }
 
-    int column_cnt;
+    copy_to_buffer( value, m->value_buf );
+    m->value_cnt = split_buffer( m->value_buf, m->value_list, size );
 
-    copy_to_buffer( column, column_buf );
-    #ifdef DEBUG
-        printf( "column: '%s'\n", column );
-        printf( "column_buf: '%s'\n", column_buf );
-    #endif
+    return ( PyObject * ) m;
+}
 
-    column_cnt = partition_buffer( "Column", column_buf, column_list );            //  Split column on space into list
-    if( column_cnt < 0 ) {
+// ---------------------------------------------------------------------
+//  matcher.match( column ) - Same as fullword.match( column, value ).
+
+static PyObject *
+matcher_match( MatcherObject *self, PyObject *args ) {
+    const char *column;
+    int match;
+
+    if( !PyArg_ParseTuple( args, "z", &column )) {
         return NULL;
     }
 
-    // -----------------------------------------------------------------
-    //  Diagnostics
+    if( ! column ) {                          // Fields in database can have Null values.
+        return PyLong_FromLong( 0 );
+    }
 
-    #ifdef DEBUG
-        {
-            int i;
-            for( i = 0; (i < value_cnt); i++ ) {                          // for each token in value (the search value)
-                printf( "value_list: '%s'\n", value_list[i] );
-            }
+    match = match_column( self->value_list, self->value_cnt, column );
+    if( match < 0 ) {
+        return PyErr_NoMemory();
+    }
 
-            for( i = 0; (i < column_cnt); i++ ) {                          // for each token in value (the search value)
-                printf( "column_list: '%s'\n", column_list[i] );
-            }
-            printf( "\n" );
-        }
-    #endif
+    return PyLong_FromLong( match );
+}
 
-    // -----------------------------------------------------------------
-    //  Finally, approximate "MATCH( column ) AGAINST( value ) IN BOOLEAN MODE" from mysql.
-    //  Match in value in order given.
+// ---------------------------------------------------------------------
+//  matcher.match_many( strings ) - Match every string in a sequence, return bytes with
+//      one flag per string, 1 on match, else 0. None matches nothing.
+//  Strings are collected first with the GIL held, the tuple copy keeps them alive and
+//      unchanged, then all are matched with the GIL released.
 
-    int i;
-    int j;
-    int next_i = 0;
-    int match;
-    int matches = 0;
+static PyObject *
+matcher_match_many( MatcherObject *self, PyObject *args ) {
+    PyObject *seq;
+    PyObject *items;
+    PyObject *result = NULL;
+    const char **columns;
+    char *flags;
+    Py_ssize_t count;
+    Py_ssize_t i;
+    int out_of_memory = 0;
+
+    if( !PyArg_ParseTuple( args, "O", &seq )) {
+        return NULL;
+    }
 
-    for( j = 0; j < column_cnt; j++ ) {                         // for each token in column (the column value )
-        for( i = next_i; (i < value_cnt); i++ ) {               // for each token in value (the search value )
-            if( ! strcmp( value_list[i], column_list[j] )) {    // found word in column, stop looking for word
-                matches++;
-                next_i = i + 1;                                 // Start next iteration of value where left off in previous.
-                break;
+    items = PySequence_Tuple( seq );
+    if( items == NULL ) {
+        return NULL;
+    }
+
+    count = PyTuple_GET_SIZE( items );
+    columns = PyMem_Malloc( ( count ? count : 1 ) * sizeof( char * ) );
+    if( columns == NULL ) {
+        Py_DECREF( items );
+        return PyErr_NoMemory();
+    }
+
+    for( i = 0; i < count; i++ ) {
+        PyObject *item = PyTuple_GET_ITEM( items, i );
+
+        if( item == Py_None ) {
+            columns[i] = NULL;
+
+        } else if( PyUnicode_Check( item )) {
+            columns[i] = PyUnicode_AsUTF8( item );
+            if( columns[i] == NULL ) {
+                goto done;
             }
+
+        } else {
+            PyErr_Format( PyExc_TypeError, "match_many() expects str or None, got %s at %zd", Py_TYPE( item )->tp_name, i );
+            goto done;
         }
     }
 
-    /* ----------------------------------------- */
-    //  All values must match.
-
-    if( value_cnt == matches ) {
-        match = 1;
-    } else {
-        match = 0;
+    result = PyBytes_FromStringAndSize( NULL, count );
+    if( result == NULL ) {
+        goto done;
     }
+    flags = PyBytes_AS_STRING( result );
+
+    Py_BEGIN_ALLOW_THREADS
+    for( i = 0; i < count; i++ ) {
+        int match = columns[i] ? match_column( self->value_list, self->value_cnt, columns[i] ) : 0;
+        if( match < 0 ) {
+            out_of_memory = 1;
+            break;
+        }
+        flags[i] = match;
+    }
+    Py_END_ALLOW_THREADS
 
-    /* ----------------------------------------- */
+    if( out_of_memory ) {
+        Py_CLEAR( result );
+        PyErr_NoMemory();
+    }
 
-    return PyLong_FromLong( match );
+done:
+    PyMem_Free( columns );
+    Py_DECREF( items );
+    return result;
 }
 
-// ----------------------------------------------------------------------------------------   
+// ---------------------------------------------------------------------
 
-void do_exception( char * s ) {
-    PyErr_SetString(MatchError, s );
-}
+static PyMethodDef MatcherMethods[] = {
+    {"match", ( PyCFunction ) matcher_match, METH_VARARGS, "Return 1 if column matches the compiled value, else 0"},
+    {"match_many", ( PyCFunction ) matcher_match_many, METH_VARARGS, "Match a sequence of strings, return bytes with a 0/1 flag for each"},
+    {NULL, NULL, 0, NULL}        /* Sentinel */
+};
+
+static PyTypeObject MatcherType = {
+    PyVarObject_HEAD_INIT( NULL, 0 )
+    .tp_name = "fullword.Matcher",
+    .tp_doc = "Compiled fullword match value, see fullword.compile()",
+    .tp_basicsize = sizeof( MatcherObject ),
+    .tp_itemsize = 0,
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_dealloc = ( destructor ) matcher_dealloc,
+    .tp_repr = ( reprfunc ) matcher_repr,
+    .tp_methods = MatcherMethods,
+};
 
 // ----------------------------------------------------------------------------------------   
 //  Must cast fullword_match ( type of PyObject ) to PyCFunction below to suppress compiler warning.
@@ -255,6 +507,7 @@ void do_exception( char * s ) {
 
 static PyMethodDef FullWordMethods[] = {
     {"match", ( PyCFunction ) fullword_match, METH_VARARGS, "Execute a simpliflied equivalent of MySql MATCH( column ) AGAINST( value ) IN BOOLEAN MODE"},
+    {"compile", ( PyCFunction ) fullword_compile, METH_VARARGS, "Return a Matcher for value with match() and match_many() methods"},
     {NULL, NULL, 0, NULL}        /* Sentinel */
 };
 
@@ -277,10 +530,20 @@ PyInit_fullword(void)
 {
     PyObject *m;
 
+    if( PyType_Ready( &MatcherType ) < 0 )
+        return NULL;
+
     m = PyModule_Create( &fullwordmodule );
     if (m == NULL)
         return NULL;
 
+    Py_INCREF( &MatcherType );
+    if( PyModule_AddObject( m, "Matcher", ( PyObject * ) &MatcherType ) < 0 ) {
+        Py_DECREF( &MatcherType );
+        Py_DECREF( m );
+        return NULL;
+    }
+
     MatchError = PyErr_NewException( "match.error", NULL, NULL);
     Py_XINCREF(MatchError);
     if (PyModule_AddObject(m, "error", MatchError ) < 0) {
@@ -90,3 +90,38 @@ for words in test_words:
             print( f"  Data: {data}", file=sys.stderr  )
             print( f"  Words: {words}", file=sys.stderr  )
             sys.exit(1)
+
+# ------------------------------------------------------------------------
+#   WRW - Compiled matcher, match() and match_many() must agree with fullword.match().
+
+print( "Test: compiled matcher" )
+titles = test_titles + [ None ]
+
+for words in test_words:
+    matcher = fullword.compile( words )
+    expected = [ fullword.match( data, words ) if data else 0 for data in titles ]
+
+    if [ matcher.match( data ) for data in titles ] != expected:
+        print( f"ERROR: matcher.match() differs from fullword.match() for: {words}", file=sys.stderr )
+        sys.exit(1)
+
+    if list( matcher.match_many( titles )) != expected:
+        print( f"ERROR: matcher.match_many() differs from fullword.match() for: {words}", file=sys.stderr )
+        sys.exit(1)
+
+print( "   OK" )
+
+# ------------------------------------------------------------------------
+#   WRW - No more length or token limits. Long column and value match like any other.
+
+print( "Test: long column and value" )
+long_column = ' '.join( [ 'word%d' % i for i in range( 500 ) ] )
+
+if( not fullword.match( long_column, 'word1 word250 word499' ) or
+    fullword.match( long_column, 'word499 word1' ) or
+    not fullword.match( long_column, long_column ) or
+    not fullword.compile( 'word2 word3' ).match( long_column ) ):
+    print( f"ERROR: long column or value did not match as expected", file=sys.stderr )
+    sys.exit(1)
+
+print( "   OK" )
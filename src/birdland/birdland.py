@@ -776,12 +776,13 @@ def do_about():
 @click.option( "-V", "--very_verbose", is_flag=True,    help="Show events" )
 @click.option( "-c", "--confdir",                       help="Use alternate config directory" )
 @click.option( "-d", "--database",                      help="Use database sqlite or mysql, default sqlite", default='sqlite' )
+@click.option( "-f", "--fulltext", is_flag=True,        help="Search with Sqlite FTS5 index, see build_tables.py --fulltext" )
 @click.option( "-p", "--progress", is_flag=True,        help="Show initialization progress" )
 @click.option( "-l", "--log",      is_flag=True,        help="Capture logging data" )
 @click.option( "-r", "--record",                        help="Record user interactions" )
 @click.option( "-R", "--playback",                      help="Playback user interactions" )
 
-def do_main( verbose, very_verbose, confdir, database, progress, log, record, playback ):
+def do_main( verbose, very_verbose, confdir, database, fulltext, progress, log, record, playback ):
 
   # logging = True if log else False
     logging = bool( log )
@@ -790,6 +791,7 @@ def do_main( verbose, very_verbose, confdir, database, progress, log, record, pl
     #   A few exit and error functions defined inside main() for namespace reasons.
 
     def do_full_exit( code ):                                                           
+        fb_search.cancel_searches()
         fb.stop_audio_file()
         fb.close_youtube_file()
         pdf.close()
@@ -820,6 +822,36 @@ def do_main( verbose, very_verbose, confdir, database, progress, log, record, pl
         fb.log( text, value )
         do_show_recent_log()
 
+    # -----------------------------------------------------------------------
+    #   WRW - build_tables.py replaced the Sqlite database file, see fb.db_file_replaced().
+    #       Reopen and give the new connection to everything holding the old one.
+
+    def reopen_database():
+        nonlocal conn, c, dc
+
+        path = Path( conf.home_confdir, conf.sqlite_database )
+        try:
+            new_conn = sqlite3.connect( path )
+
+        except Exception as e:
+            (extype, value, traceback) = sys.exc_info()
+            print( f"ERROR on reopen of database, type: {extype}, value: {value}", file=sys.stderr )
+            return
+
+        conn.close()
+        conn = new_conn
+        c = conn.cursor()
+        dc = conn.cursor()
+        dc.row_factory = sqlite3.Row
+        conn.create_function('my_match_c', 2, fb.my_match_c )
+
+        fb.set_db_file( path )
+        fb.set_dc( dc )
+        for module in [ meta, sl, pagelist, diff, create, l2c, c2f, fb_search ]:
+            module.set_dc( dc )
+        fb_search.reopen_search_pool( path )
+        fb.log( 'Reopened database', path.as_posix() )
+
     # -----------------------------------------------------------------------
     #   Set up some global variables defining which database and search type to use.
 
@@ -827,12 +859,12 @@ def do_main( verbose, very_verbose, confdir, database, progress, log, record, pl
     if database == 'sqlite':
         MYSQL = False
         SQLITE = True
-        FULLTEXT = False     # True to include Sqlite fulltext index. Only meaningful if get it working better.
+        FULLTEXT = fulltext  # WRW - True to search with Sqlite FTS5 index built by build_tables.py --fulltext.
 
     elif database == 'mysql':
         MYSQL = True
         SQLITE = False
-        FULLTEXT = False     # True to include Sqlite fulltext index. Only meaningful if get it working better.
+        FULLTEXT = False     # MySql has its own FULLTEXT index.
 
     else:
         print( f"ERROR: Specified database '{database}' not supported." )
@@ -846,10 +878,10 @@ def do_main( verbose, very_verbose, confdir, database, progress, log, record, pl
 
     # ------------------------------------------------------------------------------------------------------
 
-    fb.set_driver( MYSQL, SQLITE, False )
-    conf.set_driver( MYSQL, SQLITE, False )
-    meta.set_driver( MYSQL, SQLITE, False )
-    fb_search.set_driver( MYSQL, SQLITE, False )
+    fb.set_driver( MYSQL, SQLITE, FULLTEXT )
+    conf.set_driver( MYSQL, SQLITE, FULLTEXT )
+    meta.set_driver( MYSQL, SQLITE, FULLTEXT )
+    fb_search.set_driver( MYSQL, SQLITE, FULLTEXT )
 
     conf.set_icon( BL_Icon )
     conf.set_classes( sg, fb )
@@ -1040,6 +1072,7 @@ def do_main( verbose, very_verbose, confdir, database, progress, log, record, pl
                 # conn.create_function('regexp', 2, fb.regexp)        # This worked but not well. Perhaps with a little more work?
                 # conn.create_function('my_match', 2, fb.my_match )   # This works great but is slower than LIKE.
                 conn.create_function('my_match_c', 2, fb.my_match_c )   # This works great and is fast.
+                fb.set_db_file( Path( conf.home_confdir, conf.sqlite_database ))
                 have_db = True
 
     # -----------------------------------------------
@@ -1239,6 +1272,11 @@ def do_main( verbose, very_verbose, confdir, database, progress, log, record, pl
 
     fb_search.set_elements( dc, Select_Limit, window, status_bar )
 
+    #   WRW - Searches run concurrently on a pool of read-only connections, Sqlite only.
+
+    if SQLITE:
+        fb_search.set_search_pool( Path( conf.home_confdir, conf.sqlite_database ) )
+
     # --------------------------------------------------------------
     #   WRW 19 Mar 2022 - Deal with birdland.desktop file.
 
@@ -1341,6 +1379,18 @@ def do_main( verbose, very_verbose, confdir, database, progress, log, record, pl
         if event in (sg.WINDOW_CLOSED, 'Exit'):      # WRW 5 June 2022 - changed from if/or to in
             do_full_exit(0)
 
+        # ------------------------------------------------------------------
+        #   WRW - A rebuild, in the background from the menu or run by hand, may have replaced
+        #       the database file. Check before anything uses it.
+
+        if fb.db_file_replaced():
+            reopen_database()
+        fb.check_sheet_offsets()                # Once per event, lookups below then use memory only.
+
+        if event in ( 'external-command-output', 'external-command-done' ):
+            fb.external_command_event( event, values )
+            continue
+
         # ------------------------------------------------------------------
 
         if logging:
@@ -1424,12 +1474,12 @@ def do_main( verbose, very_verbose, confdir, database, progress, log, record, pl
 
                 elif menu_event == 'menu-rebuild-all':
                     # fb.run_external_command( [ 'bl-build-tables', '--all', '-c', conf.confdir.as_posix(), '-d', fb.get_driver() ] )
-                    fb.run_external_command( [ './build_tables.py', '--all', '-c', conf.confdir.as_posix(), '-d', fb.get_driver() ] )
+                    fb.run_external_command_background( [ './build_tables.py', '--all', '-c', conf.confdir.as_posix(), '-d', fb.get_driver() ] + ( [ '--fulltext' ] if FULLTEXT else [] ) )
                     continue
 
                 elif menu_event == 'menu-rebuild-source-priority':
                     # fb.run_external_command( [ 'bl-build-tables', '--src_priority', '-c', conf.confdir.as_posix(), '-d', fb.get_driver() ] )
-                    fb.run_external_command( [ './build_tables.py', '--src_priority', '-c', conf.confdir.as_posix(), '-d', fb.get_driver() ] )
+                    fb.run_external_command_background( [ './build_tables.py', '--src_priority', '-c', conf.confdir.as_posix(), '-d', fb.get_driver() ] )
                     continue
 
                 elif menu_event == 'menu-rebuild-audio':
@@ -1439,22 +1489,22 @@ def do_main( verbose, very_verbose, confdir, database, progress, log, record, pl
                     t = conf.do_popup_ok_cancel( txt )
                     if t == 'OK':
                         # fb.run_external_command( [ 'bl-build-tables', '--scan_audio', '--audio_files', '-c', conf.confdir.as_posix(), '-d', fb.get_driver() ] )
-                        fb.run_external_command( [ './build_tables.py', '--scan_audio', '--audio_files', '-c', conf.confdir.as_posix(), '-d', fb.get_driver() ] )
+                        fb.run_external_command_background( [ './build_tables.py', '--scan_audio', '--audio_files', '-c', conf.confdir.as_posix(), '-d', fb.get_driver() ] + ( [ '--fulltext' ] if FULLTEXT else [] ) )
                     continue
 
                 elif menu_event == 'menu-rebuild-page-offset':
                     # fb.run_external_command( [ 'bl-build-tables', '--offset', '-c', conf.confdir.as_posix(), '-d', fb.get_driver() ] )
-                    fb.run_external_command( [ './build_tables.py', '--offset', '-c', conf.confdir.as_posix(), '-d', fb.get_driver() ] )
+                    fb.run_external_command_background( [ './build_tables.py', '--offset', '-c', conf.confdir.as_posix(), '-d', fb.get_driver() ] )
                     continue
 
                 elif menu_event == 'menu-rebuild-canon2file':
                     # fb.run_external_command( [ 'bl-build-tables', '--canon2file', '-c', conf.confdir.as_posix(), '-d', fb.get_driver() ] )
-                    fb.run_external_command( [ './build_tables.py', '--canon2file', '-c', conf.confdir.as_posix(), '-d', fb.get_driver() ] )
+                    fb.run_external_command_background( [ './build_tables.py', '--canon2file', '-c', conf.confdir.as_posix(), '-d', fb.get_driver() ] )
                     continue
 
                 elif menu_event == 'menu-convert-raw-sources':
                     # fb.run_external_command( [ 'bl-build-tables', '--convert_raw', '-c', conf.confdir.as_posix(), '-d', fb.get_driver() ] )
-                    fb.run_external_command( [ './build_tables.py', '--convert_raw', '-c', conf.confdir.as_posix(), '-d', fb.get_driver() ] )
+                    fb.run_external_command_background( [ './build_tables.py', '--convert_raw', '-c', conf.confdir.as_posix(), '-d', fb.get_driver() ] )
                     continue
 
                 # elif menu_event == 'menu-test-db-times':
@@ -23,9 +23,14 @@
 import os
 import sys
 import json
+import hashlib
+import tempfile
+import shutil
+import concurrent.futures
+import time
+import datetime
 import re
 import click
-import fitz
 from collections import OrderedDict
 from pathlib import Path
 import gzip
@@ -39,16 +44,96 @@ import fb_utils
 import fb_title_correction
 import fb_pdf
 import fb_metadata
+import fb_version
+
+try:
+    import resource             # WRW - Peak RSS for --profile, not on Windows.
+except ImportError:
+    resource = None
 
 # --------------------------------------------------------------------------
 
 Old_Dc = None
 
+#   WRW - Title to title_id map of titles_distinct, see get_title_ids().
+Title_Ids = None
+
+#   WRW - Rows inserted, updated or deleted by execute() and executemany(), for --profile.
+Rows_Written = 0
+
+#   WRW - SQL errors reported by execute(). The build_*() functions don't see them, a Sqlite
+#       build with any is not swapped in, see finish_build_db().
+Sql_Errors = 0
+
+#   WRW - Per-step records when --profile, see timed_step().
+Profile = None
+
+#   WRW - srcs of Music-Index now in the staging tables, None for all, False for nothing staged,
+#       see stage_music_index().
+Music_Index_Staged = False
+
 # --------------------------------------------------------------------------
 
 audio_file_extensions = [ ".mp3", ".fla", ".flac", ".FLAC", ".Mp3", ".MP3", ".mpc", ".ape", ".ogg", ".wav", ".aif" ]
 
 # ==========================================================================
+#   WRW - Map title to title_id in memory instead of a SELECT on titles_distinct for every
+#       title as fb.get_title_id_from_title() does. Built by build_titles_distinct() from the
+#       same enumerate() that assigns title_id there, read from titles_distinct in one SELECT
+#       only when that was not built in this run.
+
+def get_title_ids( dc ):
+    global Title_Ids
+
+    if Title_Ids is None:
+        txt = "SELECT title, title_id FROM titles_distinct"
+        execute( dc, txt )
+        Title_Ids = { row[ 'title' ] : row[ 'title_id' ] for row in dc.fetchall() }
+
+    return Title_Ids
+
+# --------------------------------------------------------------------------
+#   WRW - Sqlite builds go into a copy of the database next to it, renamed over it only when
+#       complete. A running birdland.py keeps reading the old one meanwhile and reopens when
+#       it sees the new file, see fb.db_file_replaced(). os.replace() is atomic on the same
+#       file system. On failure or any SQL error the copy is removed and the database left as it was.
+#       Only for runs with a step that writes tables, see 'writes_db' in do_main().
+
+def start_build_db( db_path ):
+    build_path = db_path.with_name( f'{db_path.name}.build-{os.getpid()}' )
+    build_path.unlink( missing_ok=True )
+
+    if db_path.is_file():
+        src = sqlite3.connect( db_path )
+        dst = sqlite3.connect( build_path )
+        src.backup( dst )                   # Consistent copy even while birdland has it open.
+        dst.close()
+        src.close()
+
+    return build_path
+
+def finish_build_db( db_path, build_path, rcode ):
+    if rcode or Sql_Errors:
+        build_path.unlink( missing_ok=True )
+        if Sql_Errors:
+            print( f"ERROR: Build failed with {Sql_Errors} SQL errors, {db_path} not changed", file=sys.stderr, flush=True  )
+        else:
+            print( f"ERROR: Build failed, {db_path} not changed", file=sys.stderr, flush=True  )
+        return
+
+    os.replace( build_path, db_path )
+
+# --------------------------------------------------------------------------
+#   WRW - Build-time settings for the bulk load, for this connection only. Everything in the
+#       database is rebuilt from the source files, rerun the build if it is interrupted.
+
+def set_build_pragmas( c ):
+    execute( c, "PRAGMA journal_mode = MEMORY" )
+    execute( c, "PRAGMA synchronous = OFF" )
+    execute( c, "PRAGMA cache_size = -65536" )        # 64 MB
+    execute( c, "PRAGMA temp_store = MEMORY" )
+
+# --------------------------------------------------------------------------
 
 def fix_query( query ):
     if SQLITE:
@@ -61,12 +146,17 @@ def fix_query( query ):
 #       where it was explicitly coded.
 
 def execute( cur, txt, data=None ):
+    global Rows_Written, Sql_Errors
+
     try:
         if data:
             cur.execute( txt, data )
         else:
             cur.execute( txt )
 
+        if cur.rowcount > 0:
+            Rows_Written += cur.rowcount
+
     except Exception as e:
         all_frames = inspect.stack()
         caller_frame = all_frames[1]
@@ -74,6 +164,7 @@ def execute( cur, txt, data=None ):
         caller_line = caller_frame[2]
         caller_name = caller_frame[3]
 
+        Sql_Errors += 1
         (extype, value, traceback) = sys.exc_info()
         print( f"ERROR on execute(), type: {extype}, value: {value}", file=sys.stderr, flush=True )
         print( f"  Txt: {txt}", file=sys.stderr, flush=True    )
@@ -81,6 +172,45 @@ def execute( cur, txt, data=None ):
             print( f"  Data: {data}", file=sys.stderr, flush=True   )
         print( f"  Called from: {caller_name}, line: {caller_line}", file=sys.stderr, flush=True  )
 
+# ---------------------------------------------------------------------------
+#   WRW - Bulk load. Tables are loaded from a list of rows with one executemany()
+#       per Bulk_Size rows instead of one execute() per row. All rows of a table go in
+#       in the same transaction, committed by the build_*() function, indexes are
+#       created after the load.
+#   A batch that fails is undone to its savepoint, Sqlite keeps the rows before the bad one,
+#       and loaded again one row at a time with execute(). As with the old per-row execute()
+#       only the bad rows are lost and execute() reports each of them.
+
+Bulk_Size = 10000
+
+def executemany( cur, txt, rows ):
+    global Rows_Written
+
+    for i in range( 0, len( rows ), Bulk_Size ):
+        batch = rows[ i : i + Bulk_Size ]
+        execute( cur, 'SAVEPOINT bulk' )
+        try:
+            cur.executemany( txt, batch )
+            if cur.rowcount > 0:
+                Rows_Written += cur.rowcount
+            execute( cur, 'RELEASE SAVEPOINT bulk' )
+
+        except Exception as e:
+            all_frames = inspect.stack()
+            caller_frame = all_frames[1]
+            caller_line = caller_frame[2]
+            caller_name = caller_frame[3]
+
+            (extype, value, traceback) = sys.exc_info()
+            print( f"ERROR on executemany(), type: {extype}, value: {value}", file=sys.stderr, flush=True )
+            print( f"  Rows: {i} to {i + len( batch ) - 1}, loading them one at a time", file=sys.stderr, flush=True   )
+            print( f"  Called from: {caller_name}, line: {caller_line}", file=sys.stderr, flush=True  )
+
+            execute( cur, 'ROLLBACK TO SAVEPOINT bulk' )
+            execute( cur, 'RELEASE SAVEPOINT bulk' )
+            for row in batch:
+                execute( cur, txt, row )
+
 # ==========================================================================
 
 def old_get_title_tag( file ):
@@ -317,10 +447,6 @@ def build_page_count( dc, c, conn ):
     txt = 'DROP TABLE IF EXISTS page_count;'
     execute( c, txt )
 
-    if FULLTEXT and SQLITE:
-        txt = 'DROP TABLE IF EXISTS audio_files_fts;'
-        execute( c, txt )
-
     if MYSQL:
         txt = """CREATE TABLE page_count (
             id INT UNSIGNED AUTO_INCREMENT,
@@ -341,16 +467,6 @@ def build_page_count( dc, c, conn ):
             """
         execute( c, txt )
 
-    if FULLTEXT and SQLITE:
-        txt = """CREATE VIRTUAL TABLE audio_files_fts USING fts5(
-            file,
-            page_count UNINDEXED,
-            content='page_count',
-            content_rowid='id'
-            )
-            """
-        execute( c, txt )
-
     # ----------------------------------------------------------------
 
     txt = "SELECT file FROM canonical2file ORDER BY file"
@@ -358,17 +474,22 @@ def build_page_count( dc, c, conn ):
     rows = dc.fetchall()
     root = conf.val( 'music_file_root' )
 
-    if rows:
-        for row in rows:                    # Build array of all titles
-            row[ 'file' ]
-            path = Path( root, row['file' ] )
-            doc = fitz.open( path )
+    #   WRW - Counted in parallel and cached by fb_pdf, only new or changed files are opened.
+    #       A file that can't be opened is reported there and left out here. Cache
+    #       entries of files no longer in canonical2file are dropped.
 
-            txt = "INSERT INTO page_count (file, page_count) VALUES( %s, %s )"
-            data = [ row[ 'file' ], doc.page_count ]
-            txt = fix_query( txt )      # Replaces %s with ? for SQLITE FULLTEXT
+    paths = [ str( Path( root, row[ 'file' ] )) for row in rows ]
+    counts = fb_pdf.get_page_counts( paths, prune=True )
 
-            execute( c, txt, data )
+    page_counts = []
+    for row, path in zip( rows, paths ):
+        if counts[ path ] is not None:
+            data = [ row[ 'file' ], counts[ path ] ]
+            page_counts.append( data )
+
+    txt = "INSERT INTO page_count (file, page_count) VALUES( %s, %s )"
+    txt = fix_query( txt )      # Replaces %s with ? for SQLITE FULLTEXT
+    executemany( c, txt, page_counts )
 
     if MYSQL:
         txt = 'ALTER TABLE page_count ADD FULLTEXT( file )'
@@ -378,21 +499,18 @@ def build_page_count( dc, c, conn ):
         txt = "CREATE INDEX page_count_index ON page_count( file )"
         execute( c, txt )
 
+    conn.commit()
     return 0
 
 # -----------------------------------------------------------------------
 #   WRW 19 Feb 2022 - Check and clean up '\x00' in fields before inserting into table.
 
-def build_audio_files( c ):
+def build_audio_files( c, conn ):
     print( "\nBuilding audio_files", file=sys.stderr, flush=True  )
 
     txt = 'DROP TABLE IF EXISTS audio_files;'
     execute( c, txt )
 
-    if FULLTEXT and SQLITE:
-        txt = 'DROP TABLE IF EXISTS audio_files_fts;'
-        execute( c, txt )
-
     if MYSQL:
         txt = """CREATE TABLE audio_files (
             id INT UNSIGNED AUTO_INCREMENT,
@@ -417,18 +535,6 @@ def build_audio_files( c ):
             """
         execute( c, txt )
 
-    if FULLTEXT and SQLITE:
-        txt = """CREATE VIRTUAL TABLE audio_files_fts USING fts5(
-            title,
-            artist,
-            album,
-            file UNINDEXED,
-            content='audio_files',
-            content_rowid='id'
-            )
-            """
-        execute( c, txt )
-
     # -----------------------------------------------------------------------
 
     # ifile = Path( conf.confdir, conf.v.audiofile_index )
@@ -437,6 +543,7 @@ def build_audio_files( c ):
         audio_data = json.load( ifd )
 
     audio_file_count = 0
+    rows = []
     for item in audio_data[ 'audio_files' ]:
         audio_file_count += 1
         title = item[ 'title' ]
@@ -449,18 +556,13 @@ def build_audio_files( c ):
         album = check_null( album )         # Don't check file, can't modify that from what found on disk.
 
         data = ( [ title, artist, album, file ] )
+        rows.append( data )
 
-        txt   = """INSERT INTO audio_files ( title, artist, album, file )
-                VALUES( %s, %s, %s, %s )
-                """
-        txt = fix_query( txt )      # Replaces %s with ? for SQLITE FULLTEXT
-        execute( c, txt, data )
-
-        if FULLTEXT and SQLITE:
-            txt   = """INSERT INTO audio_files_fts ( title, artist, album, file )
-                    VALUES( ?, ?, ?, ? )
-                    """
-            execute( c, txt, data )
+    txt   = """INSERT INTO audio_files ( title, artist, album, file )
+            VALUES( %s, %s, %s, %s )
+            """
+    txt = fix_query( txt )      # Replaces %s with ? for SQLITE FULLTEXT
+    executemany( c, txt, rows )
 
     # -----------------------------------------------------------------------
 
@@ -475,8 +577,12 @@ def build_audio_files( c ):
         txt = "CREATE INDEX audio_files_index ON audio_files( title, artist, album )"
         execute( c, txt )
 
+    if SQLITE:
+        build_fts( c, 'audio_files', [ 'title', 'artist', 'album' ] )
+
     print( f"   Audio files total: {audio_file_count}", file=sys.stderr, flush=True  )
 
+    conn.commit()
     return 0
 
 # -----------------------------------------------------------------------
@@ -538,14 +644,17 @@ def build_source_priority( c, conn ):
     execute( c, txt )
 
     priority = 1
+    rows = []
 
     for src in fb.Source_Priority:
         data = [ src, priority ]
-        txt = 'INSERT INTO src_priority ( src, priority ) VALUES( %s, %s )'
-        txt = fix_query( txt )
-        execute( c, txt, data )
+        rows.append( data )
         priority += 1
 
+    txt = 'INSERT INTO src_priority ( src, priority ) VALUES( %s, %s )'
+    txt = fix_query( txt )
+    executemany( c, txt, rows )
+
     if MYSQL:
         txt = "ALTER TABLE src_priority ADD INDEX( src )"
 
@@ -570,6 +679,7 @@ def build_canonicals( c, conn ):
         txt = """CREATE TABLE canonicals (
                 id MEDIUMINT UNSIGNED AUTO_INCREMENT,
                 canonical VARCHAR(255),
+                canonical_id MEDIUMINT UNSIGNED,
                 page_of_sheet_1 VARCHAR(255),
                 priority VARCHAR(255),
                 PRIMARY KEY(id) )
@@ -580,6 +690,7 @@ def build_canonicals( c, conn ):
         txt = """CREATE TABLE canonicals (
                 id MEDIUMINT AUTO_INCREMENT,
                 canonical VARCHAR(255),
+                canonical_id MEDIUMINT,
                 page_of_sheet_1 VARCHAR(255),
                 priority VARCHAR(255),
                 PRIMARY KEY(id) )
@@ -588,6 +699,8 @@ def build_canonicals( c, conn ):
 
     # ---------------------------------------------
 
+    rows = []
+    canonical_ids = {}
     with open( fb.Canonicals ) as fd:
         for line in fd:
             line = line.strip()
@@ -601,15 +714,28 @@ def build_canonicals( c, conn ):
 
                 page_of_sheet_1 = page_of_sheet_1.strip()
                 canonical = canonical.strip()
+                canonical_id = canonical_ids.setdefault( canonical, len( canonical_ids ) + 1 )
 
-                data = [ priority, page_of_sheet_1, canonical ]
-                txt = 'INSERT INTO canonicals ( priority, page_of_sheet_1, canonical ) VALUES( %s, %s, %s )'
-                txt = fix_query( txt )
+                data = [ priority, page_of_sheet_1, canonical, canonical_id ]
+                rows.append( data )
 
-                execute( c, txt, data )
+    txt = 'INSERT INTO canonicals ( priority, page_of_sheet_1, canonical, canonical_id ) VALUES( %s, %s, %s, %s )'
+    txt = fix_query( txt )
+    executemany( c, txt, rows )
 
     # ---------------------------------------------
 
+    if MYSQL:
+        txt = "ALTER TABLE canonicals ADD INDEX( canonical ), ADD INDEX( canonical_id )"
+        execute( c, txt )
+
+    if SQLITE:
+        txt = "CREATE INDEX canonicals_index ON canonicals( canonical, canonical_id )"
+        execute( c, txt )
+
+        txt = "CREATE INDEX canonicals_id_index ON canonicals( canonical_id, priority )"
+        execute( c, txt )
+
     conn.commit()
     return 0
 
@@ -627,6 +753,7 @@ def build_canonical2file( c, conn ):
         txt =  """CREATE TABLE canonical2file (
                 id MEDIUMINT UNSIGNED AUTO_INCREMENT,
                 canonical VARCHAR(255),
+                canonical_id MEDIUMINT UNSIGNED,
                 file VARCHAR(255),
                 PRIMARY KEY(id) )
                 ENGINE = MYISAM
@@ -636,6 +763,7 @@ def build_canonical2file( c, conn ):
         txt =  """CREATE TABLE canonical2file (
                 id MEDIUMINT AUTO_INCREMENT,
                 canonical VARCHAR(255),
+                canonical_id MEDIUMINT,
                 file VARCHAR(255),
                 PRIMARY KEY(id) )
                 """
@@ -644,6 +772,7 @@ def build_canonical2file( c, conn ):
     # ---------------------------------------------
 
     # for canonical2file in fb.Canonical2File.split('\n'):
+    rows = []
     for canonical2file in fb.Canonical2File:
         with open( canonical2file ) as fd:
             for line in fd:
@@ -653,19 +782,25 @@ def build_canonical2file( c, conn ):
                 file = file.strip()
                 if canonical and file:
                     data = ( canonical, file )
-                    txt = 'INSERT INTO canonical2file ( canonical, file ) VALUES( %s, %s )'
-                    txt = fix_query( txt )
-                    execute( c, txt, data )
+                    rows.append( data )
+
+    txt = 'INSERT INTO canonical2file ( canonical, file ) VALUES( %s, %s )'
+    txt = fix_query( txt )
+    executemany( c, txt, rows )
 
     # ----------------------
 
     if MYSQL:
-        txt = "ALTER TABLE canonical2file ADD INDEX( canonical ), ADD INDEX( file )"
+        txt = "ALTER TABLE canonical2file ADD INDEX( canonical ), ADD INDEX( file ), ADD INDEX( canonical_id )"
+        execute( c, txt )
 
     if SQLITE:
         txt = "CREATE INDEX canonical2file_index ON canonical2file( canonical, file )"
+        execute( c, txt )
+
+        txt = "CREATE INDEX canonical2file_id_index ON canonical2file( canonical_id, file )"
+        execute( c, txt )
 
-    execute( c, txt )
     conn.commit()
     return 0
 
@@ -678,15 +813,13 @@ def build_local2canonical( c, conn ):
     txt = 'DROP TABLE IF EXISTS local2canonical;'
     execute( c, txt )
 
-    if FULLTEXT and SQLITE:
-        txt = 'DROP TABLE IF EXISTS local2canonical_fts;'
-        execute( c, txt )
-
     if MYSQL:
         txt =  """CREATE TABLE local2canonical (
                canonical VARCHAR(255),
                src VARCHAR(255),
                local VARCHAR(255),
+               book_id MEDIUMINT UNSIGNED,
+               canonical_id MEDIUMINT UNSIGNED,
                id MEDIUMINT UNSIGNED AUTO_INCREMENT,
                PRIMARY KEY(id) )
                ENGINE = MYISAM
@@ -697,27 +830,23 @@ def build_local2canonical( c, conn ):
                canonical VARCHAR(255),
                src VARCHAR(255),
                local VARCHAR(255),
+               book_id MEDIUMINT,
+               canonical_id MEDIUMINT,
                id MEDIUMINT AUTO_INCREMENT,
                PRIMARY KEY(id) )
                """
 
     execute( c, txt )
 
-    if FULLTEXT and SQLITE:
-        txt = """CREATE VIRTUAL TABLE local2canonical_fts USING fts5(
-            canonical,
-            src UNINDEXED,
-            local UNINDEXED,
-            content='local2canonical',
-            content_rowid='id'
-        )
-        """
-        execute( c, txt )
+    rows = []
+    fb.traverse_sources( int_build_local2canonical, c=c, rows=rows )
 
-    fb.traverse_sources( int_build_local2canonical, c=c )
+    txt = 'INSERT INTO local2canonical ( src, local, canonical ) VALUES( %s, %s, %s )'
+    txt = fix_query( txt )
+    executemany( c, txt, rows )
 
     if MYSQL:
-        txt = "ALTER TABLE local2canonical ADD INDEX( src ), ADD INDEX( local ), ADD INDEX( canonical )"
+        txt = "ALTER TABLE local2canonical ADD INDEX( src ), ADD INDEX( local ), ADD INDEX( canonical ), ADD INDEX( book_id ), ADD INDEX( canonical_id )"
         execute( c, txt )
 
         txt = "ALTER TABLE local2canonical ADD FULLTEXT( canonical )"
@@ -727,13 +856,19 @@ def build_local2canonical( c, conn ):
         txt = "CREATE INDEX local2canonical_index ON local2canonical( src, local, canonical )"
         execute( c, txt )
 
+        txt = "CREATE INDEX local2canonical_id_index ON local2canonical( book_id, canonical_id, canonical )"
+        execute( c, txt )
+
+    if SQLITE:
+        build_fts( c, 'local2canonical', [ 'canonical' ] )
+
     conn.commit()
     return 0
 
 # --------------------------------------------------------------------------
 
 def int_build_local2canonical( src, **kwargs ):
-    c = kwargs[ 'c' ]
+    rows = kwargs[ 'rows' ]
 
     # ifile = os.path.join( "..", "Index-Sources", fb.get_source_from_src( src ), fb.Local2Canon )
     source = fb.get_source_from_src( src )
@@ -750,13 +885,7 @@ def int_build_local2canonical( src, **kwargs ):
 
             if local and canonical:
                 data = ( src, local, canonical )
-                txt = 'INSERT INTO local2canonical ( src, local, canonical ) VALUES( %s, %s, %s )'
-                txt = fix_query( txt )
-                execute( c, txt, data )
-
-                if FULLTEXT and SQLITE:
-                    txt = 'INSERT INTO local2canonical_fts ( src, local, canonical ) VALUES( ?, ?, ? )'
-                    execute( c, txt, data )
+                rows.append( data )
 
 # --------------------------------------------------------------------------
 #   Build title table from data in the Index.Json directory.
@@ -767,10 +896,6 @@ def build_titles( dc, c, conn ):
     txt = 'DROP TABLE IF EXISTS titles;'
     execute( c, txt )
 
-    if FULLTEXT and SQLITE:
-        txt = 'DROP TABLE IF EXISTS titles_fts;'
-        execute( c, txt )
-
     if MYSQL:
         #   WRW 4 June 2022 - Changed from MYISAM to INNODB to fix problem sending table to server
         #       that was related to UNIQUE(). OK with no UNIQUE(). OK with INNODB.
@@ -778,6 +903,7 @@ def build_titles( dc, c, conn ):
         txt = """CREATE TABLE titles (
                 src VARCHAR(255),
                 local VARCHAR(255),
+                book_id MEDIUMINT UNSIGNED,
                 title_id MEDIUMINT(8) UNSIGNED,
                 composer VARCHAR(255),
                 lyricist VARCHAR(255),
@@ -795,53 +921,82 @@ def build_titles( dc, c, conn ):
         txt = """CREATE TABLE titles (
                 src VARCHAR(255),
                 local VARCHAR(255),
+                book_id MEDIUMINT,
                 title_id MEDIUMINT(8),
                 composer VARCHAR(255),
                 lyricist VARCHAR(255),
                 sheet VARCHAR(10),
                 id MEDIUMINT AUTO_INCREMENT,
-                PRIMARY KEY(id),
-                UNIQUE( title_id, src, local )
+                PRIMARY KEY(id)
         )
         """
         execute( c, txt )
 
-        if FULLTEXT and SQLITE:
-            txt = """CREATE VIRTUAL TABLE titles_fts USING fts5(
-                src,
-                local,
-                title_id,
-                composer UNINDEXED,
-                lyricist UNINDEXED,
-                sheet UNINDEXED,
-                content='titles',
-                content_rowid='id'
-            )
-            """
-            execute( c, txt )
+    #   WRW - Rows come from the same pass over Music-Index as titles_distinct and raw_index
+    #       when built in the same run. title_id by a join on titles_distinct, NULL if not there.
 
-    fb.traverse_sources( build_titles_from_one_index_source, c=c, dc=dc )
+    if Music_Index_Staged is not None:
+        stage_music_index( c )
+
+    insert_titles_from_staging( c )
 
     if MYSQL:
-        txt = "ALTER TABLE titles ADD INDEX( title_id ), ADD INDEX( local ), ADD INDEX( src )"
+        txt = "ALTER TABLE titles ADD INDEX( title_id ), ADD INDEX( local ), ADD INDEX( src ), ADD INDEX( book_id )"
+        execute( c, txt )
+
+    #   WRW - The searches join on book_id now, not on local and src.
+
+    if SQLITE:
+        txt = "CREATE UNIQUE INDEX titles_unique_index ON titles( title_id, src, local )"
+        execute( c, txt )
+
+        txt = "CREATE INDEX titles_index ON titles( title_id, book_id )"
+        execute( c, txt )
+
+        txt = "CREATE INDEX titles_book_index ON titles( book_id, sheet )"
+        execute( c, txt )
 
     if SQLITE:
-        txt = "CREATE INDEX titles_index ON titles( title_id, local, src )"
+        build_credit_words( c )
+
+    if SQLITE:
+        build_fts( c, 'titles', [ 'composer', 'lyricist' ] )
 
-    execute( c, txt )
     conn.commit()
     return 0
 
 # --------------------------------------------------------------------------
 
-def build_titles_from_one_index_source( src, **kwargs ):
-    fb.get_music_index_data_by_src( src, proc_one_book, **kwargs )
+def insert_titles_from_staging( c ):
+    if MYSQL:
+        txt = """INSERT IGNORE INTO titles ( src, local, title_id, composer, lyricist, sheet )
+                 SELECT s.src, s.local, titles_distinct.title_id, s.composer, s.lyricist, s.sheet
+                 FROM titles_staging s
+                 LEFT JOIN titles_distinct ON titles_distinct.title = BINARY s.title
+                 ORDER BY s.id
+              """
+
+    #   WRW - For Sqlite the UNIQUE( title_id, src, local ) index is created after the load.
+    #       Drop the duplicates here instead of by INSERT OR IGNORE, first one wins as before.
+    #       A NULL in the key never conflicts in a UNIQUE index, keep those rows.
+
+    if SQLITE:
+        txt = """INSERT INTO titles ( src, local, title_id, composer, lyricist, sheet )
+                 SELECT s.src, s.local, titles_distinct.title_id, s.composer, s.lyricist, s.sheet
+                 FROM titles_staging s
+                 LEFT JOIN titles_distinct ON titles_distinct.title = s.title
+                 WHERE titles_distinct.title_id IS NULL
+                    OR s.rowid IN ( SELECT MIN( rowid ) FROM titles_staging GROUP BY title, src, local )
+                 ORDER BY s.rowid
+              """
+
+    execute( c, txt )
 
 # --------------------------------------------------------------------------
+#   WRW - Titles rows of one book for stage_music_index(), with title, not title_id.
 
 def proc_one_book( src, data, file, **kwargs ):
-    c = kwargs[ 'c' ]
-    dc = kwargs[ 'dc' ]
+    rows = kwargs[ 'title_rows' ]
     local = data[ 'local' ]
     source = data[ 'source' ]
     contents = data[ 'contents' ]
@@ -855,7 +1010,6 @@ def proc_one_book( src, data, file, **kwargs ):
 
     for content in contents:
         title = content[ 'title' ]
-        title_id = fb.get_title_id_from_title( dc, title )
 
         sheet = content[ 'sheet' ] if not content[ 'sheet' ] == '-' else None
 
@@ -867,7 +1021,7 @@ def proc_one_book( src, data, file, **kwargs ):
         if lyricist:
             lyricist = lyricist.strip()
 
-        proc_one_book_int( c, src, local, title_id, composer, lyricist, sheet )
+        proc_one_book_int( rows, src, local, title, composer, lyricist, sheet )
 
         if sheet:
             sheet = sheet.strip()
@@ -884,16 +1038,13 @@ def proc_one_book( src, data, file, **kwargs ):
         prior_sheet = sheet
         prior_title = title
 
-    title_id = fb.get_title_id_from_title( dc, '_TitleFirst' )
-    proc_one_book_int( c, src, local, title_id, None, None, str(sheet_min) )
+    proc_one_book_int( rows, src, local, '_TitleFirst', None, None, str(sheet_min) )
 
     # page_mid = int( (page_min + page_max)/2)
 
-    # title_id = fb.get_title_id_from_title( dc, '_Test-Title-Mid' )
-    # proc_one_book_int( c, src, local, title_id, None, None, str(sheet_mid) )
+    # proc_one_book_int( rows, src, local, '_Test-Title-Mid', None, None, str(sheet_mid) )
 
-    title_id = fb.get_title_id_from_title( dc, '_TitleLast' )
-    proc_one_book_int( c, src, local, title_id, None, None, str(sheet_max) )
+    proc_one_book_int( rows, src, local, '_TitleLast', None, None, str(sheet_max) )
 
     # pages=sorted( pages )
     # print( f"src: {src}, local: {local}" )
@@ -902,23 +1053,12 @@ def proc_one_book( src, data, file, **kwargs ):
 
 # ----------------------------------------------------------------------------------
 #   Buffalo contains some duplicate data, same title, different call number I think. 
-#       INSERT IGNORE to resolve that.
-
-def proc_one_book_int( c, src, local, title_id, composer, lyricist, sheet ):
-
-        data = ( src, local, title_id, composer, lyricist, sheet )
-
-        if MYSQL:
-            txt = 'INSERT IGNORE INTO titles ( src, local, title_id, composer, lyricist, sheet ) VALUES( %s, %s, %s, %s, %s, %s )'
-
-        if SQLITE:
-            txt = 'INSERT OR IGNORE INTO titles ( src, local, title_id, composer, lyricist, sheet ) VALUES( ?, ?, ?, ?, ?, ? )'
+#       INSERT IGNORE to resolve that, see build_titles().
 
-        execute( c, txt, data )
+def proc_one_book_int( rows, src, local, title, composer, lyricist, sheet ):
 
-        if FULLTEXT and SQLITE:
-            txt = 'INSERT OR IGNORE INTO titles_fts ( src, local, title_id, composer, lyricist, sheet ) VALUES( ?, ?, ?, ?, ?, ? )'
-            execute( c, txt, data )
+        data = ( src, local, title, composer, lyricist, sheet )
+        rows.append( data )
 
 # ----------------------------------------------------------------------------------
 #   Build titles_distinct table from data in the Index.Json directory.
@@ -928,12 +1068,10 @@ def proc_one_book_int( c, src, local, title_id, composer, lyricist, sheet ):
 #       No! Doing it the same way for both, working from titles_distinct
 
 def build_titles_distinct( c, conn ):
+    global Title_Ids
     print( "\nBuilding titles_distinct", file=sys.stderr, flush=True  )
 
-    titles_distinct = set()
-    raw_index = []
-
-    fb.traverse_sources( build_titles_distinct_from_one_index_source, c=c, titles_distinct = titles_distinct, raw_index = raw_index )     # Builds titles_distinct set()
+    titles_distinct = stage_music_index( c )        # WRW - Builds titles_distinct set() and staging tables.
 
     txt = 'DROP TABLE IF EXISTS raw_index;'
     execute( c, txt )
@@ -941,13 +1079,6 @@ def build_titles_distinct( c, conn ):
     txt = 'DROP TABLE IF EXISTS titles_distinct;'
     execute( c, txt )
 
-    if FULLTEXT and SQLITE:
-        txt = 'DROP TABLE IF EXISTS titles_distinct_fts;'
-        execute( c, txt )
-
-        txt = 'DROP TABLE IF EXISTS raw_index_fts;'
-        execute( c, txt )
-
     if MYSQL:
         txt = """CREATE TABLE titles_distinct (
             title VARCHAR(255),
@@ -962,6 +1093,7 @@ def build_titles_distinct( c, conn ):
             title_id MEDIUMINT UNSIGNED,
             src VARCHAR(255),
             local VARCHAR(255),
+            book_id MEDIUMINT UNSIGNED,
             file VARCHAR(255),
             line VARCHAR(255),
             id MEDIUMINT AUTO_INCREMENT,
@@ -982,6 +1114,7 @@ def build_titles_distinct( c, conn ):
         txt = """CREATE TABLE raw_index (
                 src VARCHAR(255),
                 local VARCHAR(255),
+                book_id MEDIUMINT,
                 file VARCHAR(255),
                 line VARCHAR(255),
                 title_id INTEGER,
@@ -991,43 +1124,17 @@ def build_titles_distinct( c, conn ):
         """
         execute( c, txt )
 
-    if FULLTEXT and SQLITE:
-        txt = """CREATE VIRTUAL TABLE titles_distinct_fts USING fts5(
-            title,
-            title_id,
-            content='titles_distinct',
-            content_rowid='title_id'
-        )
-        """
-        execute( c, txt )
-
-        txt = """CREATE VIRTUAL TABLE raw_index_fts USING fts5(
-            title_id,
-            local,
-            src,
-            file,
-            content='raw_index',
-            content_rowid='id'
-        )
-        """
-        execute( c, txt )
-
 
     # --------------------------------------------------------------
     #   Build titles_distinct table directly from titles_distinct set instead
     #       of from an intermediate table. Inserting title_id here, remove AUTO INCREMENT in CREATE.
 
-    for title_id, title in enumerate( sorted( titles_distinct )):
-
-        data = ( title, title_id )
+    Title_Ids = { title : title_id for title_id, title in enumerate( sorted( titles_distinct )) }
+    rows = [ ( title, title_id ) for title, title_id in Title_Ids.items() ]
 
-        txt = 'INSERT INTO titles_distinct ( title, title_id ) VALUES( %s, %s )'
-        txt = fix_query( txt )
-        execute( c, txt, data )
-
-        if FULLTEXT and SQLITE:
-            txt = 'INSERT INTO titles_distinct_fts ( title, title_id ) VALUES( ?, ? )'
-            execute( c, txt, data )
+    txt = 'INSERT INTO titles_distinct ( title, title_id ) VALUES( %s, %s )'
+    txt = fix_query( txt )
+    executemany( c, txt, rows )
 
     # --------------------------------------------------------------
     #   Add index here as using titles_distinct in get_title_id_from_title(), which is used by
@@ -1037,6 +1144,8 @@ def build_titles_distinct( c, conn ):
     #   WRW 4 June 2022 - Realized I have no FULLTEXT index on title in titles_distinct for MySql.
     #       add_indexes() must have been vestigal. Probably pulled all from that and put inline.
     #       Made a difference - eliminated noticeable latency.
+    #   WRW - build_titles() now joins on titles_distinct and build_title2youtube() uses the
+    #       in-memory get_title_ids(), the index is still needed by the searches.
 
     if MYSQL:
         txt = "ALTER TABLE titles_distinct ADD INDEX( title ), ADD INDEX( title_id )"
@@ -1049,26 +1158,29 @@ def build_titles_distinct( c, conn ):
         txt = "CREATE INDEX titles_distinct_index ON titles_distinct( title, title_id )"
         execute( c, txt )
 
-    # --------------------------------------------------------------
-    #   WRW 1 Apr 2022 - Build raw_index table after add indexes because of the inner SELECT
+    if SQLITE:
+        build_fts( c, 'titles_distinct', [ 'title' ] )
 
-    for item in raw_index:
+    # --------------------------------------------------------------
 
-        data = ( item[ 'src' ], item[ 'local' ], item[ 'file' ], item[ 'line' ], item[ 'title' ]  )
+    if SQLITE:
+        build_title_words( c, titles_distinct )
+        build_title_trigrams( c, titles_distinct )
 
-        txt = 'INSERT INTO raw_index( src, local, file, line, title_id ) VALUES( %s, %s, %s, %s, (SELECT title_id from titles_distinct WHERE title = %s ) )'
-        txt = fix_query( txt )
+    # --------------------------------------------------------------
+    #   WRW 1 Apr 2022 - Build raw_index table after add indexes because of the inner SELECT
+    #   WRW - Now one INSERT from the staging table joined on titles_distinct.
 
-        execute( c, txt, data )
+    insert_raw_index_from_staging( c )
 
     # --------------------------------------------------------------
 
     if MYSQL:
-        txt = "ALTER TABLE raw_index ADD INDEX( src ), ADD INDEX( title_id ), ADD INDEX( local )"
+        txt = "ALTER TABLE raw_index ADD INDEX( src ), ADD INDEX( title_id ), ADD INDEX( local ), ADD INDEX( book_id )"
         execute( c, txt )
 
     if SQLITE:
-        txt = "CREATE INDEX raw_index_index ON raw_index( src, local, title_id )"
+        txt = "CREATE INDEX raw_index_index ON raw_index( book_id, title_id )"
         execute( c, txt )
 
     # --------------------------------------------------------------
@@ -1077,9 +1189,102 @@ def build_titles_distinct( c, conn ):
     return 0
 
 # --------------------------------------------------------------------------
+#   WRW - NULL title_id for a title not in titles_distinct, as the inner SELECT gave.
 
-def build_titles_distinct_from_one_index_source ( src, **kwargs ):
-    fb.get_music_index_data_by_src( src, proc_one_book_for_titles_distinct, **kwargs )
+def insert_raw_index_from_staging( c ):
+    if MYSQL:
+        join = "LEFT JOIN titles_distinct ON titles_distinct.title = BINARY s.title"
+        order = "s.id"
+
+    if SQLITE:
+        join = "LEFT JOIN titles_distinct ON titles_distinct.title = s.title"
+        order = "s.rowid"
+
+    txt = f"""INSERT INTO raw_index( src, local, file, line, title_id )
+              SELECT s.src, s.local, s.file, s.line, titles_distinct.title_id
+              FROM raw_index_staging s
+              {join}
+              ORDER BY {order}
+           """
+    execute( c, txt )
+
+# --------------------------------------------------------------------------
+#   WRW - One pass over Music-Index for titles_distinct, raw_index and titles. Each book is
+#       read once and its rows go into the temporary staging tables in Bulk_Size batches,
+#       only the set of distinct titles is kept in memory. title_id is known only after
+#       all titles are seen, raw_index and titles get it by a join on titles_distinct.
+#   Staging tables belong to this connection and disappear when it is closed.
+#   With 'srcs' stage only those for an --incremental update.
+
+def stage_music_index( c, srcs=None ):
+    global Music_Index_Staged
+
+    for table in [ 'raw_index_staging', 'titles_staging' ]:
+        txt = f'DROP TEMPORARY TABLE IF EXISTS {table}' if MYSQL else f'DROP TABLE IF EXISTS temp.{table}'
+        execute( c, txt )
+
+    if MYSQL:
+        txt = """CREATE TEMPORARY TABLE raw_index_staging (
+                src VARCHAR(255), local VARCHAR(255), file VARCHAR(255), line VARCHAR(255), title VARCHAR(255),
+                id INT UNSIGNED AUTO_INCREMENT, PRIMARY KEY(id) )
+                CHARACTER SET 'utf8mb4'
+        """
+        execute( c, txt )
+
+        txt = """CREATE TEMPORARY TABLE titles_staging (
+                src VARCHAR(255), local VARCHAR(255), title VARCHAR(255),
+                composer VARCHAR(255), lyricist VARCHAR(255), sheet VARCHAR(10),
+                id INT UNSIGNED AUTO_INCREMENT, PRIMARY KEY(id) )
+                CHARACTER SET 'utf8mb4'
+        """
+        execute( c, txt )
+
+    if SQLITE:
+        txt = "CREATE TEMP TABLE raw_index_staging ( src, local, file, line, title )"
+        execute( c, txt )
+
+        txt = "CREATE TEMP TABLE titles_staging ( src, local, title, composer, lyricist, sheet )"
+        execute( c, txt )
+
+    titles_distinct = set()
+    raw_rows = []
+    title_rows = []
+
+    kwargs = dict( c=c, titles_distinct=titles_distinct, raw_index=raw_rows, title_rows=title_rows )
+    if srcs is None:
+        fb.traverse_sources( stage_one_index_source, **kwargs )
+    else:
+        for src in srcs:
+            stage_one_index_source( src, **kwargs )
+
+    flush_staging( c, raw_rows, title_rows )
+
+    Music_Index_Staged = srcs
+    return titles_distinct
+
+# --------------------------------------------------------------------------
+
+def flush_staging( c, raw_rows, title_rows ):
+    txt = 'INSERT INTO raw_index_staging ( src, local, file, line, title ) VALUES( %s, %s, %s, %s, %s )'
+    executemany( c, fix_query( txt ), raw_rows )
+
+    txt = 'INSERT INTO titles_staging ( src, local, title, composer, lyricist, sheet ) VALUES( %s, %s, %s, %s, %s, %s )'
+    executemany( c, fix_query( txt ), title_rows )
+
+    raw_rows.clear()
+    title_rows.clear()
+
+# --------------------------------------------------------------------------
+
+def stage_one_index_source( src, **kwargs ):
+    fb.get_music_index_data_by_src( src, stage_one_book, **kwargs )
+
+def stage_one_book( src, data, file, **kwargs ):
+    proc_one_book_for_titles_distinct( src, data, file, **kwargs )
+    proc_one_book( src, data, file, **kwargs )
+
+    if len( kwargs[ 'raw_index' ] ) >= Bulk_Size or len( kwargs[ 'title_rows' ] ) >= Bulk_Size:
+        flush_staging( kwargs[ 'c' ], kwargs[ 'raw_index' ], kwargs[ 'title_rows' ] )
 
 # --------------------------------------------------------------------------
 #   Add each title to titles_distinct set().
@@ -1114,11 +1319,134 @@ def proc_one_book_for_titles_distinct ( src, data, file, **kwargs ):
         else:
             print( f"WARNING: 'line' not found on line {line+1} of {file}", file=sys.stderr, flush=True  )
 
-        raw_index.append( {'title' : title, 'src' : src, 'local' : local, 'file' : file, 'line' : line } )
+        raw_index.append( ( src, local, file, line, title ) )
 
     titles_distinct.add( "_TitleFirst"  )
     titles_distinct.add( "_TitleLast"  )
 
+# ----------------------------------------------------------------------------------
+#   WRW - FTS5 index on 'columns' of 'table' for the Sqlite search with --fulltext, see
+#       fb_utils.get_fulltext(). Contentless, the FTS5 table holds only the index, keyed
+#       by rowid of 'table'. Populated in one INSERT ... SELECT after the table is complete.
+#   Indexes fb_utils.fuzzy_key() of each column, the words of the fullword module, so the FTS5
+#       rows are never fewer than my_match_c() accepts. See fb_utils.Fts_Tokenize.
+#   Without --fulltext just drop it, an index left from an earlier build would be stale.
+
+def build_fts( c, table, columns ):
+
+    txt = f'DROP TABLE IF EXISTS {table}_fts;'
+    execute( c, txt )
+
+    if not FULLTEXT:
+        return
+
+    txt = f"""CREATE VIRTUAL TABLE {table}_fts USING fts5(
+            {', '.join( columns )},
+            content='',
+            tokenize = "{fb_utils.Fts_Tokenize}"
+            )
+    """
+    execute( c, txt )
+
+    c.connection.create_function( 'fuzzy_key', 1, lambda s: None if s is None else fb_utils.fuzzy_key( str( s ) ), deterministic=True )
+
+    txt = f"""INSERT INTO {table}_fts( rowid, {', '.join( columns )} )
+             SELECT rowid, {', '.join( [ f'fuzzy_key( {x} )' for x in columns ] )} FROM {table}
+          """
+    execute( c, txt )
+
+# ----------------------------------------------------------------------------------
+#   WRW - Word (posting list) index for title search. One row for each distinct word in each
+#       title, split with the same rules as the fullword module. fb_utils.get_fulltext() intersects
+#       the rows for each search word so my_match_c() only sees titles containing all the words.
+#   Only used by the Sqlite my_match_c() search, MySql has its own FULLTEXT index.
+#   title_id here must agree with enumerate() in build_titles_distinct().
+
+def build_title_words( c, titles_distinct ):
+
+    txt = 'DROP TABLE IF EXISTS title_words;'
+    execute( c, txt )
+
+    txt = """CREATE TABLE title_words (
+            word VARCHAR(255),
+            title_id INTEGER
+            )
+    """
+    execute( c, txt )
+
+    rows = []
+    for title_id, title in enumerate( sorted( titles_distinct )):
+        for word in set( fb_utils.fullword_tokens( title ) ):
+            rows.append( ( word, title_id ) )
+
+    txt = 'INSERT INTO title_words ( word, title_id ) VALUES( ?, ? )'
+    executemany( c, txt, rows )
+
+    txt = "CREATE INDEX title_words_index ON title_words( word, title_id )"
+    execute( c, txt )
+
+# ----------------------------------------------------------------------------------
+#   WRW - Trigram index for the typo-tolerant title search, used when a title search finds
+#       nothing. fb_search counts trigrams shared with the search title to get candidates
+#       and ranks those by edit distance. Sqlite only, like title_words.
+#   title_id here must agree with enumerate() in build_titles_distinct().
+
+def build_title_trigrams( c, titles_distinct ):
+
+    txt = 'DROP TABLE IF EXISTS title_trigrams;'
+    execute( c, txt )
+
+    txt = """CREATE TABLE title_trigrams (
+            trigram VARCHAR(3),
+            title_id INTEGER
+            )
+    """
+    execute( c, txt )
+
+    rows = []
+    for title_id, title in enumerate( sorted( titles_distinct )):
+        for trigram in fb_utils.title_trigrams( title ):
+            rows.append( ( trigram, title_id ) )
+
+    txt = 'INSERT INTO title_trigrams ( trigram, title_id ) VALUES( ?, ? )'
+    executemany( c, txt, rows )
+
+    txt = "CREATE INDEX title_trigrams_index ON title_trigrams( trigram, title_id )"
+    execute( c, txt )
+
+# ----------------------------------------------------------------------------------
+#   WRW - Same idea for composer and lyricist in titles. These are not distinct so index
+#       the distinct names and match on the name itself in the search query.
+
+def build_credit_words( c ):
+
+    txt = 'DROP TABLE IF EXISTS credit_words;'
+    execute( c, txt )
+
+    txt = """CREATE TABLE credit_words (
+            col VARCHAR(20),
+            word VARCHAR(255),
+            name VARCHAR(255)
+            )
+    """
+    execute( c, txt )
+
+    rows = []
+    for col in [ 'composer', 'lyricist' ]:
+        txt = f"SELECT DISTINCT {col} FROM titles WHERE {col} IS NOT NULL"
+        execute( c, txt )
+        names = [ row[0] for row in c.fetchall() ]
+
+        for name in names:
+            for word in set( fb_utils.fullword_tokens( name ) ):
+                rows.append( ( col, word, name ) )
+
+    txt = 'INSERT INTO credit_words ( col, word, name ) VALUES( ?, ?, ? )'
+    executemany( c, txt, rows )
+
+    txt = "CREATE INDEX credit_words_index ON credit_words( col, word, name )"
+    execute( c, txt )
+
 # ----------------------------------------------------------------------------------
 
 def build_title2youtube( dc, c, conn, show_found, show_not_found ):
@@ -1127,10 +1455,6 @@ def build_title2youtube( dc, c, conn, show_found, show_not_found ):
     txt = 'DROP TABLE IF EXISTS title2youtube;'
     execute( c, txt )
 
-    if FULLTEXT and SQLITE:
-        txt = 'DROP TABLE IF EXISTS title2youtube_fts;'
-        execute( c, txt )
-
     if MYSQL:
         txt = """CREATE TABLE title2youtube(
                 title_id MEDIUMINT(8) UNSIGNED,
@@ -1153,20 +1477,9 @@ def build_title2youtube( dc, c, conn, show_found, show_not_found ):
             """
     execute( c, txt )
 
-    if FULLTEXT and SQLITE:
-        txt = """CREATE VIRTUAL TABLE title2youtube_fts USING fts5(
-            title,
-            ytitle UNINDEXED,
-            title_id UNINDEXED,
-            duration UNINDEXED,
-            yt_id UNINDEXED,
-            content='title2youtube',
-            content_rowid='id'
-        )
-        """
-        execute( c, txt )
-
     count_titles_total = count_titles_found = count_titles_not_found = 0
+    rows = []
+    title_ids = get_title_ids( dc )
 
     with gzip.open( conf.val( 'youtube_index'), 'rt') as ifd:
         data = json.load( ifd )
@@ -1176,7 +1489,7 @@ def build_title2youtube( dc, c, conn, show_found, show_not_found ):
             title = content[ 'title' ]
             links = content[ 'links' ]
 
-            title_id = fb.get_title_id_from_title( dc, title )
+            title_id = title_ids.get( title )
 
             if title_id:
                 if show_found:
@@ -1192,20 +1505,17 @@ def build_title2youtube( dc, c, conn, show_found, show_not_found ):
 
                     yt_id = link[ 'id' ]
                     data = ( title_id, ytitle, duration, yt_id )
-
-                    txt = 'INSERT INTO title2youtube ( title_id, ytitle, duration, yt_id ) VALUES( %s, %s, %s, %s )'
-                    txt = fix_query( txt )
-                    execute( c, txt, data )
-
-                    if FULLTEXT and SQLITE:
-                        txt = 'INSERT INTO title2youtube_fts ( title_id, ytitle, duration, yt_id ) VALUES( ?, ?, ?, ? )'
-                        execute( c, txt, data )
+                    rows.append( data )
 
             else:
                 count_titles_not_found += 1
                 if show_not_found:
                     print( title, file=sys.stderr, flush=True  )
 
+    txt = 'INSERT INTO title2youtube ( title_id, ytitle, duration, yt_id ) VALUES( %s, %s, %s, %s )'
+    txt = fix_query( txt )
+    executemany( c, txt, rows )
+
     # ----------------------
 
     if MYSQL:
@@ -1243,6 +1553,7 @@ def build_sheet_offsets( c, conn ):
                 id MEDIUMINT UNSIGNED AUTO_INCREMENT,
                 src VARCHAR(255),
                 local VARCHAR(255),
+                book_id MEDIUMINT UNSIGNED,
                 sheet_start SMALLINT,
                 sheet_offset SMALLINT,
                 offset_id MEDIUMINT UNSIGNED,
@@ -1255,6 +1566,7 @@ def build_sheet_offsets( c, conn ):
                 id MEDIUMINT AUTO_INCREMENT,
                 src VARCHAR(255),
                 local VARCHAR(255),
+                book_id MEDIUMINT,
                 sheet_start SMALLINT,
                 sheet_offset SMALLINT,
                 offset_id MEDIUMINT,
@@ -1262,14 +1574,23 @@ def build_sheet_offsets( c, conn ):
             """
     execute( c, txt )
 
-    fb.traverse_sources( int_build_sheet_offsets, c=c )
+    rows = []
+    fb.traverse_sources( int_build_sheet_offsets, c=c, rows=rows )
+
+    txt = 'INSERT INTO sheet_offsets ( src, local, sheet_start, sheet_offset, offset_id ) VALUES( %s, %s, %s, %s, %s )'
+    txt = fix_query( txt )
+    executemany( c, txt, rows )
 
     if MYSQL:
-        txt = "ALTER TABLE sheet_offsets ADD INDEX( src ), ADD INDEX( local ), ADD INDEX( sheet_start)"
+        txt = "ALTER TABLE sheet_offsets ADD INDEX( src ), ADD INDEX( local ), ADD INDEX( sheet_start), ADD INDEX( book_id, offset_id )"
+        execute( c, txt )
+
     if SQLITE:
         txt = "CREATE INDEX sheet_offsets_index ON sheet_offsets( src, local, sheet_start )"
+        execute( c, txt )
 
-    execute( c, txt )
+        txt = "CREATE INDEX sheet_offsets_id_index ON sheet_offsets( book_id, offset_id, sheet_start, sheet_offset )"
+        execute( c, txt )
 
     conn.commit()
     return 0
@@ -1281,7 +1602,7 @@ def build_sheet_offsets( c, conn ):
 #    where page >= sheet_start limit 10;
 
 def int_build_sheet_offsets( src, **kwargs ):
-    c = kwargs[ 'c' ]
+    rows = kwargs[ 'rows' ]
 
     print( f"   {src} {fb.get_source_from_src( src )}", file=sys.stderr, flush=True  )
     source = fb.get_source_from_src( src )
@@ -1309,38 +1630,108 @@ def int_build_sheet_offsets( src, **kwargs ):
                 sheet_offset = int( mo.group(2).strip() )
 
                 data = ( src, local, sheet_start, sheet_offset, offset_id )
-                txt = 'INSERT INTO sheet_offsets ( src, local, sheet_start, sheet_offset, offset_id ) VALUES( %s, %s, %s, %s, %s )'
-                txt = fix_query( txt )
-                execute( c, txt, data )
+                rows.append( data )
                 offset_id += 1
 
 # --------------------------------------------------------------------------
-#   os.walk( folder ) returns generator that returns list of folders and list of files
-#       in 'folder'.
+#   WRW - Integer keys for the joins in place of src, local and canonical strings.
+#       books has one row for each src and local in any of Book_Tables, book_id in order
+#       of src and local. Built after all of them, then their book_id and canonical_id
+#       columns are set here. canonical_id is set by build_canonicals(), one per canonical
+#       name, a canonical not in canonicals gets NULL. The string columns stay for the
+#       lookups by name.
 
-def old_listfiles( folder ):
-    for root, folders, files in os.walk(folder):
-        for file in files:
-            yield (root, file)
-            # yield os.path.join(root, file)
-
-# -----------------------------------------------------------------------
+Book_Tables = [ 'titles', 'raw_index', 'local2canonical', 'sheet_offsets' ]
+Canonical_Tables = [ 'local2canonical', 'canonical2file' ]
 
-def build_music_files( c, conn ):
-    print( "\nBuilding music_files", file=sys.stderr, flush=True  )
+def build_books( c, conn ):
+    print( "\nBuilding books", file=sys.stderr, flush=True  )
 
-    txt = 'DROP TABLE IF EXISTS music_files;'
+    txt = 'DROP TABLE IF EXISTS books;'
     execute( c, txt )
 
-    if FULLTEXT and SQLITE:
-        txt = 'DROP TABLE IF EXISTS music_files_fts;'
-        execute( c, txt )
-
     if MYSQL:
-        txt = """CREATE TABLE music_files(
-                rpath VARCHAR(255),
-                file VARCHAR(255),
-                fb_flag CHAR(1),
+        txt = """CREATE TABLE books (
+                book_id MEDIUMINT UNSIGNED AUTO_INCREMENT,
+                src VARCHAR(255),
+                local VARCHAR(255),
+                PRIMARY KEY( book_id ),
+                UNIQUE( src, local ) )
+                ENGINE = MYISAM
+                CHARACTER SET 'utf8mb4'
+              """
+    if SQLITE:
+        txt = """CREATE TABLE books (
+                book_id INTEGER PRIMARY KEY,
+                src VARCHAR(255),
+                local VARCHAR(255) )
+              """
+    execute( c, txt )
+
+    tables = [ table for table in Book_Tables if table_exists( c, table ) ]
+
+    if tables:
+        union = " UNION ".join( [ f"SELECT src, local FROM {table}" for table in tables ] )
+        txt = f"INSERT INTO books ( src, local ) SELECT src, local FROM ( {union} ) AS sub ORDER BY src, local"
+        execute( c, txt )
+
+    if SQLITE:
+        txt = "CREATE UNIQUE INDEX books_index ON books( src, local )"
+        execute( c, txt )
+
+    for table in tables:
+        if MYSQL:
+            txt = f"""UPDATE {table}
+                      JOIN books ON books.src = {table}.src AND books.local = {table}.local
+                      SET {table}.book_id = books.book_id
+                   """
+        if SQLITE:
+            txt = f"""UPDATE {table} SET book_id =
+                      ( SELECT book_id FROM books WHERE books.src = {table}.src AND books.local = {table}.local )
+                   """
+        execute( c, txt )
+
+    for table in Canonical_Tables:
+        if not table_exists( c, table ) or not table_exists( c, 'canonicals' ):
+            continue
+
+        if MYSQL:
+            txt = f"""UPDATE {table}
+                      JOIN canonicals ON canonicals.canonical = {table}.canonical
+                      SET {table}.canonical_id = canonicals.canonical_id
+                   """
+        if SQLITE:
+            txt = f"""UPDATE {table} SET canonical_id =
+                      ( SELECT canonical_id FROM canonicals WHERE canonicals.canonical = {table}.canonical LIMIT 1 )
+                   """
+        execute( c, txt )
+
+    conn.commit()
+    return 0
+
+# --------------------------------------------------------------------------
+#   os.walk( folder ) returns generator that returns list of folders and list of files
+#       in 'folder'.
+
+def old_listfiles( folder ):
+    for root, folders, files in os.walk(folder):
+        for file in files:
+            yield (root, file)
+            # yield os.path.join(root, file)
+
+# -----------------------------------------------------------------------
+
+def build_music_files( c, conn ):
+    print( "\nBuilding music_files", file=sys.stderr, flush=True  )
+
+    txt = 'DROP TABLE IF EXISTS music_files;'
+    execute( c, txt )
+
+    if MYSQL:
+        txt = """CREATE TABLE music_files(
+                rpath VARCHAR(255),
+                file VARCHAR(255),
+                fb_flag CHAR(1),
                 id MEDIUMINT UNSIGNED AUTO_INCREMENT,
                 PRIMARY KEY(id) )
                 ENGINE = MYISAM
@@ -1356,19 +1747,9 @@ def build_music_files( c, conn ):
             """
     execute( c, txt )
 
-    if FULLTEXT and SQLITE:
-        txt = """CREATE VIRTUAL TABLE music_files_fts USING fts5(
-            rpath,
-            file,
-            fb_flag,
-            content='music_files',
-            content_rowid='id'
-        )
-        """
-        execute( c, txt )
-
     file_count = 0
     file_count_by_ext = {}
+    rows = []
 
     # ------------------------------------------------------------------------
     #   WRW 2 Mar 2022 - Recode this using Path() and add fakebook_folder flag.
@@ -1388,23 +1769,24 @@ def build_music_files( c, conn ):
         for file in Path( root, folder ).glob( '**/*.[pP][dD][fF]' ):
             rpath = file.relative_to( root ).parent.as_posix()
             data = (rpath, file.name, fb_flag )
-            txt = 'INSERT INTO music_files ( rpath, file, fb_flag ) VALUES( %s, %s, %s )'
-            txt = fix_query( txt )
-            execute( c, txt, data )
-
-            if FULLTEXT and SQLITE:
-                txt = 'INSERT INTO music_files_fts ( rpath, file, fb_flag ) VALUES( ?, ?, ? )'
-                execute( c, txt, data )
+            rows.append( data )
 
             file_count += 1
             file_count_by_ext[ file.suffix ] = file_count_by_ext.setdefault( file.suffix, 0 ) + 1
 
+    txt = 'INSERT INTO music_files ( rpath, file, fb_flag ) VALUES( %s, %s, %s )'
+    txt = fix_query( txt )
+    executemany( c, txt, rows )
+
     # ----------------------
 
     if MYSQL:
         txt = "ALTER TABLE music_files ADD FULLTEXT( rpath ), ADD FULLTEXT( file )"
         execute( c, txt )
 
+    if SQLITE:
+        build_fts( c, 'music_files', [ 'rpath', 'file' ] )
+
     # ----------------------
 
     print( f"   Music files total: {file_count}", file=sys.stderr, flush=True  )
@@ -1422,10 +1804,6 @@ def build_midi_files( c, conn ):
     txt = 'DROP TABLE IF EXISTS midi_files;'
     execute( c, txt )
 
-    if FULLTEXT and SQLITE:
-        txt = 'DROP TABLE IF EXISTS midi_files_fts;'
-        execute( c, txt )
-
     if MYSQL:
         txt = """CREATE TABLE midi_files(
                 rpath VARCHAR(255),
@@ -1445,17 +1823,8 @@ def build_midi_files( c, conn ):
             """
     execute( c, txt )
 
-    if FULLTEXT and SQLITE:
-        txt = """CREATE VIRTUAL TABLE midi_files_fts USING fts5(
-            rpath,
-            file,
-            content='midi_files',
-            content_rowid='id'
-        )
-        """
-        execute( c, txt )
-
     file_count = 0
+    rows = []
 
     for folder in fb.Midi_Folders:
         path = Path( fb.Midi_File_Root, folder ).as_posix()
@@ -1475,24 +1844,25 @@ def build_midi_files( c, conn ):
                 # print( f"    rpath: {rpath}\n    File: {file}" )
 
                 data = (rpath, file)
-                txt = 'INSERT INTO midi_files ( rpath, file ) VALUES( %s, %s )'
-                txt = fix_query( txt )
-                execute( c, txt, data )
-
-                if FULLTEXT and SQLITE:
-                    txt = 'INSERT INTO midi_files_fts ( rpath, file ) VALUES( ?, ? )'
-                    execute( c, txt, data )
+                rows.append( data )
 
                 file_count += 1
 
             # ---------------------------------------------------------
 
+    txt = 'INSERT INTO midi_files ( rpath, file ) VALUES( %s, %s )'
+    txt = fix_query( txt )
+    executemany( c, txt, rows )
+
     print( f"   Midi files total: {file_count}", file=sys.stderr, flush=True  )
 
     if MYSQL:
         txt = "ALTER TABLE midi_files ADD FULLTEXT( rpath ), ADD FULLTEXT( file )"
         execute( c, txt )
 
+    if SQLITE:
+        build_fts( c, 'midi_files', [ 'rpath', 'file' ] )
+
     conn.commit()
     return 0
 
@@ -1505,10 +1875,6 @@ def build_chordpro_files( c, conn ):
     txt = 'DROP TABLE IF EXISTS chordpro_files;'
     execute( c, txt )
 
-    if FULLTEXT and SQLITE:
-        txt = 'DROP TABLE IF EXISTS chordpro_files_fts;'
-        execute( c, txt )
-
     if MYSQL:
         txt = """CREATE TABLE chordpro_files(
                 title VARCHAR(255),
@@ -1530,18 +1896,8 @@ def build_chordpro_files( c, conn ):
             """
     execute( c, txt )
 
-    if FULLTEXT and SQLITE:
-        txt = """CREATE VIRTUAL TABLE chordpro_files_fts USING fts5(
-            title,
-            artist,
-            file,
-            content='chordpro_files',
-            content_rowid='id'
-        )
-        """
-        execute( c, txt )
-
     file_count = 0
+    rows = []
 
     for folder in conf.val( 'chordpro_folders' ):
         path = Path( conf.val( 'chordpro_file_root' ), folder ).as_posix()
@@ -1572,24 +1928,25 @@ def build_chordpro_files( c, conn ):
 
                 if title or artist:                           # Some zero len
                     data = (title, artist, rfile)
-                    txt = 'INSERT INTO chordpro_files ( title, artist, file ) VALUES( %s, %s, %s )'
-                    txt = fix_query( txt )
-                    execute( c, txt, data )
-
-                    if FULLTEXT and SQLITE:
-                        txt = 'INSERT INTO chordpro_files_fts ( title, artist, file ) VALUES( ?, ?, ? )'
-                        execute( c, txt, data )
+                    rows.append( data )
 
                     file_count += 1
 
             # ---------------------------------------------------------
 
+    txt = 'INSERT INTO chordpro_files ( title, artist, file ) VALUES( %s, %s, %s )'
+    txt = fix_query( txt )
+    executemany( c, txt, rows )
+
     print( f"   Chordpro files total: {file_count}", file=sys.stderr, flush=True  )
 
     if MYSQL:
         txt = "ALTER TABLE chordpro_files ADD FULLTEXT( title ), ADD FULLTEXT( file )"
         execute( c, txt )
 
+    if SQLITE:
+        build_fts( c, 'chordpro_files', [ 'title', 'artist' ] )
+
     conn.commit()
     return 0
 
@@ -1602,10 +1959,6 @@ def build_jjazz_files( c, conn ):
     txt = 'DROP TABLE IF EXISTS jjazz_files;'
     execute( c, txt )
 
-    if FULLTEXT and SQLITE:
-        txt = 'DROP TABLE IF EXISTS jjazz_files_fts;'
-        execute( c, txt )
-
     if MYSQL:
         txt = """CREATE TABLE jjazz_files(
                 title VARCHAR(255),
@@ -1625,17 +1978,8 @@ def build_jjazz_files( c, conn ):
             """
     execute( c, txt )
 
-    if FULLTEXT and SQLITE:
-        txt = """CREATE VIRTUAL TABLE jjazz_files_fts USING fts5(
-            title,
-            file,
-            content='jjazz_files',
-            content_rowid='id'
-        )
-        """
-        execute( c, txt )
-
     file_count = 0
+    rows = []
 
     for folder in conf.val( 'jjazz_folders' ):
         path = Path( conf.val( 'jjazz_file_root' ), folder ).as_posix()
@@ -1662,24 +2006,25 @@ def build_jjazz_files( c, conn ):
 
                 if title:                               # Some zero len
                     data = (title, rfile)
-                    txt = 'INSERT INTO jjazz_files ( title, file ) VALUES( %s, %s )'
-                    txt = fix_query( txt )
-                    execute( c, txt, data )
-
-                    if FULLTEXT and SQLITE:
-                        txt = 'INSERT INTO jjazz_files_fts ( title, file ) VALUES( ?, ? )'
-                        execute( c, txt, data )
+                    rows.append( data )
 
                     file_count += 1
 
             # ---------------------------------------------------------
 
+    txt = 'INSERT INTO jjazz_files ( title, file ) VALUES( %s, %s )'
+    txt = fix_query( txt )
+    executemany( c, txt, rows )
+
     print( f"   JJazzLab files total: {file_count}", file=sys.stderr, flush=True  )
 
     if MYSQL:
         txt = "ALTER TABLE jjazz_files ADD FULLTEXT( title ), ADD FULLTEXT( file )"
         execute( c, txt )
 
+    if SQLITE:
+        build_fts( c, 'jjazz_files', [ 'title' ] )
+
     conn.commit()
     return 0
 
@@ -1699,7 +2044,13 @@ def build_jjazz_files( c, conn ):
 #   WRW 13 March 2022 - Set PYTHONPATH so source-specific do_*.py scripts can find the modules here.
 #   Removed conf.set_cwd( f"{os.getcwd()}/../../bin" ) in do_*.py files.
 
-def convert_raw_source():
+#   WRW - Each converter writes only the Music-Index files of its own src, run up to 'jobs'
+#       of them at once, default number of CPUs. The converters run in their own folder
+#       through cwd, no chdir here. Output of each is shown together when it finishes,
+#       each line prefixed with its src, then the time and exit status of all of them.
+#       Returns the number of converters that failed.
+
+def convert_raw_source( jobs=None ):
 
     # if conf.Package_Type == 'PyInstaller' or conf.Package_Type == 'Nuitka':
     #     print( "WARNING: 'Process Index Sources' is not supported from a bundled installation.", file=sys.stderr() )
@@ -1709,43 +2060,73 @@ def convert_raw_source():
 
     os.environ[ 'PYTHONPATH' ] = Path( __file__ ).parent.resolve().as_posix()
 
+    converters = []
     sources = conf.get_sources()
     for source in sources:
         folder = conf.val( 'folder', source )
-        print( folder )
-
         src = conf.val( 'src', source )                                                             
         command = conf.val( 'command', source )
         path = Path( folder )
 
-        if path.is_dir():
-            print( f"Processing: {path.name}", flush=True )
-            os.chdir( path )
-            if( os.access( command, os.X_OK) ):
-                full_command = [ command, '--src', src ]
+        if not path.is_dir():
+            print( f"ERROR-DEV: unexpected path {path} in convert_raw_source()" )
+            return 1
+            # sys.exit(1)
 
-                #   WRW 15 Mar 2022 - Replaced run with popen so can capture output when running as package.
-                #   popen = subprocess.run( full_command, text=True )
+        if not os.access( Path( path, command ), os.X_OK ):
+            print( f"ERROR-DEV: command {command} not found or not executable in convert_raw_source()" )
+            return 1
+            # sys.exit(1)
 
-                extcmd_popen = subprocess.Popen( full_command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True )
-                for line in extcmd_popen.stdout:
-                    print( line, end='', flush=True )
+        converters.append( ( source, src, path, [ command, '--src', src ] ) )
 
-                extcmd_popen.stdout.close()
-                rcode = extcmd_popen.wait()
-                print( '' )
+    jobs = max( 1, min( jobs or os.cpu_count() or 1, len( converters ) ))
+    print( f"Processing {len( converters )} index sources, {jobs} at a time", flush=True )
 
-            else:
-                print( f"ERROR-DEV: command {command} not found or not executable in convert_raw_source()" )
-                return 1
-                # sys.exit(1)
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor( max_workers=jobs ) as executor:
+        futures = [ executor.submit( run_converter, *converter ) for converter in converters ]
 
-        else:
-            print( f"ERROR-DEV: unexpected path {path} in convert_raw_source()" )
-            return 1
-            # sys.exit(1)
+        for future in concurrent.futures.as_completed( futures ):
+            source, src, rcode, elapsed, lines = future.result()
+            results[ source ] = ( src, rcode, elapsed )
 
-    return 0
+            print( f"Processing: {source}", flush=True )
+            for line in lines:
+                print( f"[{src}] {line}", end='' if line.endswith( '\n' ) else '\n' )
+            print( '', flush=True )
+
+    print( f"Index sources:" )
+    print( f"   {'Source':<16} {'Src':<4} {'Seconds':>8} {'Exit':>5}" )
+    for source, src, path, command in converters:
+        src, rcode, elapsed = results[ source ]
+        print( f"   {source:<16} {src:<4} {elapsed:>8.2f} {rcode:>5}" )
+    print( '', flush=True )
+
+    return len( [ x for x in results.values() if x[1] != 0 ] )
+
+# --------------------------------------------------------------------------
+#   WRW 15 Mar 2022 - Replaced run with popen so can capture output when running as package.
+#   WRW - Runs in a thread of convert_raw_source(), output kept until the converter is done.
+
+def run_converter( source, src, path, command ):
+    start = time.perf_counter()
+    lines = []
+
+    try:
+        extcmd_popen = subprocess.Popen( command, cwd=path, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True )
+        for line in extcmd_popen.stdout:
+            lines.append( line )
+
+        extcmd_popen.stdout.close()
+        rcode = extcmd_popen.wait()
+
+    except Exception as e:
+        (extype, value, traceback) = sys.exc_info()
+        lines.append( f"ERROR running {' '.join( command )} in {path}, type: {extype}, value: {value}\n" )
+        rcode = -1
+
+    return source, src, rcode, time.perf_counter() - start, lines
 
 # --------------------------------------------------------------------------
 #   WRW 2 Apr 2022 - Found a lot of typos in the raw index. Make a table to harmonize them.
@@ -1871,6 +2252,615 @@ def do_extract_audio( conn ):
     conn.close()
     sys.exit(0)         # Ok, special case, never used from birdland.py
 
+# ==========================================================================
+#   WRW - Incremental rebuild, build_tables.py --incremental.
+#   Each build step records a fingerprint of every input it read in the build_manifest table.
+#       --incremental compares those with the inputs now and runs only the steps with a
+#       changed input, in the same order as --all. Steps keyed by src (sheet offsets,
+#       local2canon, Music-Index) replace only the rows of the changed srcs. A step
+#       rebuilt in full also rebuilds the steps listed 'after' it, e.g. new title_ids
+#       in titles_distinct require new titles and title2youtube.
+#   The folder scans (midi, chordpro, jjazz, music_files) are fingerprinted by their
+#       configuration only, scanning the folders to check them would cost as much
+#       as building them. Run those options explicitly after adding files.
+
+def file_fingerprint( *paths ):
+    h = hashlib.sha1()
+    for path in paths:
+        try:
+            with open( path, 'rb' ) as fd:
+                h.update( fd.read() )
+        except OSError:
+            h.update( b'missing' )
+    return h.hexdigest()
+
+def value_fingerprint( value ):
+    return hashlib.sha1( repr( value ).encode() ).hexdigest()
+
+#   WRW - With --fulltext also the form of the FTS5 tables, see build_fts(). Change Fts_Form
+#       when it indexes differently so --incremental rebuilds tables from older builds.
+
+Fts_Form = 'fuzzy_key'
+
+def fulltext_fingerprint():
+    return value_fingerprint( Fts_Form if FULLTEXT else FULLTEXT )
+
+# --------------------------------------------------------------------------
+
+def inputs_per_src( kind, get_path ):
+    inputs = {}
+    for src in fb.get_srcs_from_index():
+        inputs[ f'{kind}:{src}' ] = file_fingerprint( get_path( src ) )
+    return inputs
+
+def sheet_offsets_path( src ):
+    source = fb.get_source_from_src( src )
+    return Path( conf.get_source_path( source ), conf.val( 'sheetoffsets', source ))
+
+def local2canon_path( src ):
+    return conf.val( 'local2canon', fb.get_source_from_src( src ) )
+
+def inputs_music_index():
+    inputs = { 'fulltext' : fulltext_fingerprint() }
+    for src in fb.get_srcs_from_index():
+        inputs[ f'music_index:{src}' ] = fb.music_index.get_fingerprint( src )     # Hashes from the manifest, files read only when changed.
+    return inputs
+
+#   WRW - title_id is the position of the title in sorted titles_distinct, the same titles
+#       give the same title_ids.
+
+def titles_distinct_fingerprint( c ):
+    if not table_exists( c, 'titles_distinct' ):
+        return 'missing'
+    execute( c, 'SELECT title FROM titles_distinct ORDER BY title_id' )
+    return value_fingerprint( [ row[0] for row in c.fetchall() ] )
+
+#   WRW - Size and mtime of the PDF files, the same key as the page count cache in fb_pdf.
+
+def pdf_files_fingerprint( c ):
+    if not table_exists( c, 'canonical2file' ):
+        return 'missing'
+
+    execute( c, 'SELECT file FROM canonical2file ORDER BY file' )
+    stats = []
+    for row in c.fetchall():
+        try:
+            st = os.stat( Path( conf.val( 'music_file_root' ), row[0] ))
+            stats.append( ( row[0], st.st_size, st.st_mtime_ns ) )
+        except OSError:
+            stats.append( ( row[0], None ) )
+    return value_fingerprint( stats )
+
+#   WRW - books is rebuilt after a per-src update of any table it keys, seen in their manifest.
+
+Books_After = [ 'offset', 'local2canon', 'canonical', 'canon2file', 'titles_distinct', 'titles' ]
+
+def steps_fingerprint( c, steps ):
+    manifest = load_manifest( c )
+    return value_fingerprint( [ sorted( manifest.get( step, {} ).items() ) for step in steps ] )
+
+def inputs_fulltext_and( value ):
+    return { 'fulltext' : fulltext_fingerprint(), 'config' : value_fingerprint( value ) }
+
+# --------------------------------------------------------------------------
+#   WRW - Step name is the command-line option that builds it. Order is the order of --all.
+#   inputs: fingerprints of everything the step reads.
+#   tables: rebuild in full if any is missing.
+#   after:  rebuild in full if any of these was rebuilt in full in this run.
+#   update: replace rows of changed srcs only, when all changed inputs are per src, 'kind:src'.
+#   check:  update is possible only when this is true, else rebuild in full.
+#   fts:    only rebuild these FTS5 tables when nothing but --fulltext changed.
+#   last:   build in the real database after all others, after the merge with --parallel.
+
+Build_Steps = OrderedDict( [
+    ( 'src_priority', {
+        'build'  : lambda dc, c, conn: build_source_priority( c, conn ),
+        'inputs' : lambda c: { 'config' : value_fingerprint( fb.Source_Priority ) },
+        'tables' : [ 'src_priority' ],
+    }),
+    ( 'midi', {
+        'build'  : lambda dc, c, conn: build_midi_files( c, conn ),
+        'inputs' : lambda c: inputs_fulltext_and( ( fb.Midi_File_Root, fb.Midi_Folders ) ),
+        'tables' : [ 'midi_files' ],
+        'fts'    : [ ( 'midi_files', [ 'rpath', 'file' ] ) ],
+    }),
+    ( 'chordpro', {
+        'build'  : lambda dc, c, conn: build_chordpro_files( c, conn ),
+        'inputs' : lambda c: inputs_fulltext_and( ( conf.val( 'chordpro_file_root' ), conf.val( 'chordpro_folders' ) ) ),
+        'tables' : [ 'chordpro_files' ],
+        'fts'    : [ ( 'chordpro_files', [ 'title', 'artist' ] ) ],
+    }),
+    ( 'jjazz', {
+        'build'  : lambda dc, c, conn: build_jjazz_files( c, conn ),
+        'inputs' : lambda c: inputs_fulltext_and( ( conf.val( 'jjazz_file_root' ), conf.val( 'jjazz_folders' ) ) ),
+        'tables' : [ 'jjazz_files' ],
+        'fts'    : [ ( 'jjazz_files', [ 'title' ] ) ],
+    }),
+    ( 'music_files', {
+        'build'  : lambda dc, c, conn: build_music_files( c, conn ),
+        'inputs' : lambda c: inputs_fulltext_and( ( conf.v.music_file_root, conf.v.music_file_folders, conf.v.c2f_editable_music_folders ) ),
+        'tables' : [ 'music_files' ],
+        'fts'    : [ ( 'music_files', [ 'rpath', 'file' ] ) ],
+    }),
+    ( 'offset', {
+        'build'  : lambda dc, c, conn: build_sheet_offsets( c, conn ),
+        'inputs' : lambda c: inputs_per_src( 'sheet_offsets', sheet_offsets_path ),
+        'tables' : [ 'sheet_offsets' ],
+        'update' : lambda dc, c, conn, srcs: update_sheet_offsets( c, conn, srcs ),
+    }),
+    ( 'local2canon', {
+        'build'  : lambda dc, c, conn: build_local2canonical( c, conn ),
+        'inputs' : lambda c: { **inputs_per_src( 'local2canon', local2canon_path ), 'fulltext' : fulltext_fingerprint() },
+        'tables' : [ 'local2canonical' ],
+        'update' : lambda dc, c, conn, srcs: update_local2canonical( c, conn, srcs ),
+        'fts'    : [ ( 'local2canonical', [ 'canonical' ] ) ],
+    }),
+    ( 'canonical', {
+        'build'  : lambda dc, c, conn: build_canonicals( c, conn ),
+        'inputs' : lambda c: { 'canonicals' : file_fingerprint( fb.Canonicals ) },
+        'tables' : [ 'canonicals' ],
+    }),
+    ( 'canon2file', {
+        'build'  : lambda dc, c, conn: build_canonical2file( c, conn ),
+        'inputs' : lambda c: { 'canonical2file' : file_fingerprint( *fb.Canonical2File ) },
+        'tables' : [ 'canonical2file' ],
+    }),
+    ( 'page_count', {
+        'build'  : lambda dc, c, conn: build_page_count( dc, c, conn ),
+        'inputs' : lambda c: { 'canonical2file' : file_fingerprint( *fb.Canonical2File ),
+                               'config' : value_fingerprint( conf.val( 'music_file_root' ) ),
+                               'pdf_files' : pdf_files_fingerprint( c ) },
+        'tables' : [ 'page_count' ],
+        'after'  : [ 'canon2file' ],
+    }),
+    ( 'titles_distinct', {
+        'build'  : lambda dc, c, conn: build_titles_distinct( c, conn ),
+        'inputs' : lambda c: inputs_music_index(),
+        'tables' : [ 'titles_distinct', 'raw_index' ],
+        'update' : lambda dc, c, conn, srcs: update_raw_index( c, conn, srcs ),
+        'check'  : lambda c, srcs: titles_distinct_unchanged( c, srcs ),
+        'fts'    : [ ( 'titles_distinct', [ 'title' ] ) ],
+    }),
+    ( 'titles', {
+        'build'  : lambda dc, c, conn: build_titles( dc, c, conn ),
+        'inputs' : lambda c: { **inputs_music_index(), 'titles_distinct' : titles_distinct_fingerprint( c ) },
+        'tables' : [ 'titles' ],
+        'after'  : [ 'titles_distinct' ],
+        'update' : lambda dc, c, conn, srcs: update_titles( c, conn, srcs ),
+        'fts'    : [ ( 'titles', [ 'composer', 'lyricist' ] ) ],
+    }),
+    ( 'title2youtube', {
+        'build'  : lambda dc, c, conn: build_title2youtube( dc, c, conn, False, False ),
+        'inputs' : lambda c: { 'youtube_index' : file_fingerprint( conf.val( 'youtube_index' ) ),
+                               'titles_distinct' : titles_distinct_fingerprint( c ) },
+        'tables' : [ 'title2youtube' ],
+        'after'  : [ 'titles_distinct' ],
+    }),
+    ( 'audio_files', {
+        'build'  : lambda dc, c, conn: build_audio_files( c, conn ),
+        'inputs' : lambda c: inputs_fulltext_and( file_fingerprint( conf.val( 'audiofile_index' ) ) ),
+        'tables' : [ 'audio_files' ],
+        'fts'    : [ ( 'audio_files', [ 'title', 'artist', 'album' ] ) ],
+    }),
+    ( 'books', {
+        'build'  : lambda dc, c, conn: build_books( c, conn ),
+        'inputs' : lambda c: { 'steps' : steps_fingerprint( c, Books_After ) },
+        'tables' : [ 'books' ],
+        'after'  : Books_After,
+        'last'   : True,
+    }),
+] )
+
+# --------------------------------------------------------------------------
+#   WRW - Build one step in full and record its inputs. Used by --all, the options for
+#       single tables, and --incremental.
+
+def run_step( step, dc, c, conn ):
+    spec = Build_Steps[ step ]
+    rcode = timed_step( step, 'build', lambda: spec[ 'build' ]( dc, c, conn ) )
+    if not rcode:
+        save_manifest( c, conn, step, spec[ 'inputs' ]( c ) )
+    return rcode
+
+# --------------------------------------------------------------------------
+#   WRW - build_tables.py --profile FILE. Wall and CPU time, rows written and peak RSS of each
+#       step, written to FILE as JSON and shown as a table at the end. CPU includes child
+#       processes that finished, e.g. the page count pool. Peak RSS is of the process so far,
+#       it never goes down. Steps of --parallel run in the workers and report from there.
+
+def timed_step( step, mode, func ):
+    if Profile is None:
+        return func()
+
+    rows = Rows_Written
+    wall = time.perf_counter()
+    cpu = cpu_time()
+
+    rcode = func()
+
+    wall = time.perf_counter() - wall
+    rows = Rows_Written - rows
+    Profile.append( {
+        'step' :            step,
+        'mode' :            mode,
+        'wall' :            round( wall, 4 ),
+        'cpu' :             round( cpu_time() - cpu, 4 ),
+        'rows' :            rows,
+        'rows_per_sec' :    round( rows / wall ) if wall > 0 else None,
+        'peak_rss_kb' :     peak_rss_kb(),
+        'pid' :             os.getpid(),
+        'rcode' :           rcode,
+    } )
+    return rcode
+
+def cpu_time():
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+def peak_rss_kb():
+    if not resource:
+        return None
+    rss = max( resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss, resource.getrusage( resource.RUSAGE_CHILDREN ).ru_maxrss )
+    return rss // 1024 if sys.platform == 'darwin' else rss       # Bytes on macOS, KB elsewhere.
+
+#   WRW - A 'merge' of --parallel copies rows the workers already counted in their 'build'
+#       records, shown for each step but left out of the total.
+
+def write_profile( file, database, wall ):
+    report = {
+        'version' :     fb_version.Version,
+        'date' :        datetime.datetime.now().isoformat( timespec='seconds' ),
+        'database' :    database,
+        'argv' :        sys.argv[1:],
+        'wall' :        round( wall, 4 ),
+        'cpu' :         round( cpu_time(), 4 ),
+        'rows' :        sum( x[ 'rows' ] for x in Profile if x[ 'mode' ] != 'merge' ),
+        'peak_rss_kb' : peak_rss_kb(),
+        'steps' :       Profile,
+    }
+
+    try:
+        with open( file, 'w' ) as ofd:
+            json.dump( report, ofd, indent=2 )
+
+    except Exception as e:
+        (extype, value, traceback) = sys.exc_info()
+        print( f"ERROR on write of profile {file}, type: {extype}, value: {value}", file=sys.stderr )
+
+    print( f"\nBuild profile, written to {file}", file=sys.stderr )
+    print( f"   {'Step':<16} {'Mode':<7} {'Wall s':>8} {'CPU s':>8} {'Rows':>9} {'Rows/s':>10} {'Peak RSS MB':>12}", file=sys.stderr )
+    for x in Profile:
+        rps = x[ 'rows_per_sec' ] if x[ 'rows_per_sec' ] is not None else '-'
+        rss = f"{x[ 'peak_rss_kb' ] / 1024:.1f}" if x[ 'peak_rss_kb' ] is not None else '-'
+        print( f"   {x['step']:<16} {x['mode']:<7} {x['wall']:>8.3f} {x['cpu']:>8.3f} {x['rows']:>9} {rps:>10} {rss:>12}", file=sys.stderr )
+    print( f"   {'Total':<16} {'':<7} {report['wall']:>8.3f} {report['cpu']:>8.3f} {report['rows']:>9}", file=sys.stderr, flush=True )
+
+# --------------------------------------------------------------------------
+
+def build_step_fts( c, step ):
+    for table, columns in Build_Steps[ step ].get( 'fts', [] ):
+        build_fts( c, table, columns )
+    return 0
+
+# --------------------------------------------------------------------------
+
+def create_manifest( c ):
+    if MYSQL:
+        txt = """CREATE TABLE IF NOT EXISTS build_manifest (
+                step VARCHAR(255),
+                input VARCHAR(255),
+                fingerprint VARCHAR(255) )
+                ENGINE = MYISAM
+                CHARACTER SET 'utf8mb4'
+              """
+    if SQLITE:
+        txt = """CREATE TABLE IF NOT EXISTS build_manifest (
+                step VARCHAR(255),
+                input VARCHAR(255),
+                fingerprint VARCHAR(255) )
+              """
+    execute( c, txt )
+
+def save_manifest( c, conn, step, inputs ):
+    create_manifest( c )
+    txt = fix_query( 'DELETE FROM build_manifest WHERE step = %s' )
+    execute( c, txt, [ step ] )
+
+    txt = fix_query( 'INSERT INTO build_manifest ( step, input, fingerprint ) VALUES( %s, %s, %s )' )
+    executemany( c, txt, [ ( step, input, fingerprint ) for input, fingerprint in inputs.items() ] )
+    conn.commit()
+
+def load_manifest( c ):
+    create_manifest( c )
+    manifest = {}
+    execute( c, 'SELECT step, input, fingerprint FROM build_manifest' )
+    for step, input, fingerprint in c.fetchall():
+        manifest.setdefault( step, {} )[ input ] = fingerprint
+    return manifest
+
+def table_exists( c, table ):
+    if MYSQL:
+        execute( c, 'SHOW TABLES LIKE %s', [ table ] )
+    if SQLITE:
+        execute( c, "SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?", [ table ] )
+    return bool( c.fetchall() )
+
+# --------------------------------------------------------------------------
+
+def do_incremental( dc, c, conn ):
+    print( "\nIncremental build", file=sys.stderr, flush=True  )
+
+    manifest = load_manifest( c )
+    rebuilt = set()
+    rcode = 0
+
+    for step, spec in Build_Steps.items():
+        inputs = spec[ 'inputs' ]( c )
+        old = manifest.get( step )
+
+        if old is None or not all( table_exists( c, table ) for table in spec[ 'tables' ] ) or rebuilt & set( spec.get( 'after', [] ) ):
+            rcode += run_step( step, dc, c, conn )
+            rebuilt.add( step )
+            continue
+
+        changed = { input for input in set( inputs ) | set( old ) if inputs.get( input ) != old.get( input ) }
+
+        if not changed:
+            print( f"   {step}: up to date", file=sys.stderr, flush=True  )
+
+        elif changed == { 'fulltext' } and 'fts' in spec:
+            print( f"   {step}: FTS5 index only", file=sys.stderr, flush=True  )
+            timed_step( step, 'fts', lambda: build_step_fts( c, step ) )
+            save_manifest( c, conn, step, inputs )
+
+        elif 'update' in spec and all( ':' in input for input in changed ):
+            srcs = sorted( input.split( ':', 1 )[1] for input in changed )
+
+            if 'check' in spec and not spec[ 'check' ]( c, srcs ):
+                rcode += run_step( step, dc, c, conn )
+                rebuilt.add( step )
+                continue
+
+            print( f"   {step}: updating {', '.join( srcs )}", file=sys.stderr, flush=True  )
+            res = timed_step( step, 'update', lambda: spec[ 'update' ]( dc, c, conn, srcs ) )
+            if not res:
+                save_manifest( c, conn, step, inputs )
+            rcode += res
+
+        else:
+            rcode += run_step( step, dc, c, conn )
+            rebuilt.add( step )
+
+    return rcode
+
+# --------------------------------------------------------------------------
+#   WRW - Per-src replacements for do_incremental(). A src no longer in Music-Index
+#       only has its rows deleted.
+
+def delete_srcs( c, table, srcs ):
+    txt = fix_query( f'DELETE FROM {table} WHERE src = %s' )
+    executemany( c, txt, [ ( src, ) for src in srcs ] )
+
+def update_sheet_offsets( c, conn, srcs ):
+    delete_srcs( c, 'sheet_offsets', srcs )
+
+    rows = []
+    for src in set( srcs ) & set( fb.get_srcs_from_index() ):
+        int_build_sheet_offsets( src, c=c, rows=rows )
+
+    txt = 'INSERT INTO sheet_offsets ( src, local, sheet_start, sheet_offset, offset_id ) VALUES( %s, %s, %s, %s, %s )'
+    txt = fix_query( txt )
+    executemany( c, txt, rows )
+
+    conn.commit()
+    return 0
+
+def update_local2canonical( c, conn, srcs ):
+    delete_srcs( c, 'local2canonical', srcs )
+
+    rows = []
+    for src in set( srcs ) & set( fb.get_srcs_from_index() ):
+        int_build_local2canonical( src, c=c, rows=rows )
+
+    txt = 'INSERT INTO local2canonical ( src, local, canonical ) VALUES( %s, %s, %s )'
+    txt = fix_query( txt )
+    executemany( c, txt, rows )
+
+    if SQLITE:
+        build_fts( c, 'local2canonical', [ 'canonical' ] )
+
+    conn.commit()
+    return 0
+
+# --------------------------------------------------------------------------
+#   WRW - Any title added to or gone from titles_distinct changes all title_ids. Only when the titles of the changed srcs
+#       together with those of the others give the same titles_distinct can the
+#       rows of the changed srcs just be replaced.
+
+def titles_distinct_unchanged( c, srcs ):
+    titles_distinct = stage_music_index( c, srcs )
+    titles_distinct |= { '_TitleFirst', '_TitleLast' }
+
+    txt = """SELECT DISTINCT raw_index.src, titles_distinct.title
+             FROM raw_index
+             JOIN titles_distinct USING( title_id )
+          """
+    execute( c, txt )
+    changed = set( srcs )
+    titles_distinct |= { title for src, title in c.fetchall() if src not in changed }
+
+    execute( c, 'SELECT title FROM titles_distinct' )
+    return titles_distinct == { row[0] for row in c.fetchall() }
+
+def update_raw_index( c, conn, srcs ):
+    if Music_Index_Staged != srcs:
+        stage_music_index( c, srcs )
+
+    delete_srcs( c, 'raw_index', srcs )
+    insert_raw_index_from_staging( c )
+    conn.commit()
+    return 0
+
+def update_titles( c, conn, srcs ):
+    if Music_Index_Staged != srcs:
+        stage_music_index( c, srcs )
+
+    delete_srcs( c, 'titles', srcs )
+    insert_titles_from_staging( c )
+
+    if SQLITE:
+        build_credit_words( c )
+
+    if SQLITE:
+        build_fts( c, 'titles', [ 'composer', 'lyricist' ] )
+
+    conn.commit()
+    return 0
+
+# ==========================================================================
+#   WRW - Parallel build, build_tables.py --all --parallel, Sqlite only.
+#   Steps joined by 'after' in Build_Steps form one group and run in order in one worker,
+#       e.g. titles after titles_distinct, they read the tables built before them. Each
+#       group builds into its own staging database file in a worker process. The tables
+#       and indexes are then copied into the real database through ATTACH, in the
+#       order of Build_Steps, and the FTS5 tables built there. Steps marked 'last' are
+#       built there after that.
+
+def step_groups():
+    group_of = {}
+    for step, spec in Build_Steps.items():
+        if spec.get( 'last' ):
+            continue
+        group = [ step ]
+        for before in spec.get( 'after', [] ):
+            group = group_of[ before ] + [ x for x in group if x not in group_of[ before ] ]
+        for x in group:
+            group_of[ x ] = group
+
+    groups = []
+    for step in group_of:
+        if group_of[ step ] not in groups:
+            groups.append( group_of[ step ] )
+    return groups
+
+# --------------------------------------------------------------------------
+#   WRW - Runs in a worker process. Configuration already checked by do_main() in the parent.
+#       FTS5 tables are built after the merge, not here.
+
+def build_staging( confdir, steps, path, profile ):
+    global fb, conf, MYSQL, SQLITE, FULLTEXT, Profile, Sql_Errors
+
+    MYSQL = False
+    SQLITE = True
+    FULLTEXT = False
+
+    fb = fb_utils.FB()
+    fb.set_driver( MYSQL, SQLITE, False )
+    conf = fb_config.Config()
+    conf.set_driver( MYSQL, SQLITE, False )
+
+    os.chdir( os.path.dirname(os.path.realpath(__file__)))
+
+    conf.get_config( confdir )
+    conf.set_class_variables()
+    fb.set_classes( conf )
+    fb.set_class_config()
+    fb_pdf.set_page_count_cache( Path( conf.home_confdir, conf.page_count_cache_file ))
+
+    conn = sqlite3.connect( path )
+    c = conn.cursor()
+    dc = conn.cursor()
+    dc.row_factory = sqlite3.Row
+    fb.set_dc( dc )
+    set_build_pragmas( c )
+
+    Profile = [] if profile else None
+    Sql_Errors = 0                          # Worker process may be reused for another group.
+
+    rcode = 0
+    for step in steps:
+        rcode += timed_step( step, 'build', lambda: Build_Steps[ step ][ 'build' ]( dc, c, conn ) )
+
+    conn.commit()
+    conn.close()
+    return rcode, Sql_Errors, Profile
+
+# --------------------------------------------------------------------------
+#   WRW - Copy all tables of the staging database into the main one with their indexes.
+#       FTS5 tables and their shadow tables are skipped, build_fts() makes them after.
+
+def merge_staging( c, conn, path ):
+    execute( c, "ATTACH DATABASE ? AS staging", [ str( path ) ] )
+
+    execute( c, "SELECT type, name, sql FROM staging.sqlite_master WHERE sql IS NOT NULL" )
+    items = c.fetchall()
+
+    tables = [ ( name, sql ) for type, name, sql in items if type == 'table' and not re.search( '_fts($|_)', name ) ]
+    indexes = [ sql for type, name, sql in items if type == 'index' and not re.search( '_fts($|_)', name ) ]
+
+    for name, sql in tables:
+        execute( c, f"DROP TABLE IF EXISTS main.{name}" )
+        execute( c, sql )
+        execute( c, f"INSERT INTO main.{name} SELECT * FROM staging.{name} ORDER BY rowid" )
+
+    for sql in indexes:
+        execute( c, sql )
+
+    conn.commit()
+    execute( c, "DETACH DATABASE staging" )
+
+# --------------------------------------------------------------------------
+
+def do_parallel( dc, c, conn, confdir, jobs=None ):
+    global Sql_Errors
+
+    groups = step_groups()
+    workers = min( len( groups ), jobs or os.cpu_count() or 1 )
+    print( f"\nParallel build, {len( groups )} groups in {workers} workers", file=sys.stderr, flush=True  )
+
+    tmpdir = tempfile.mkdtemp( prefix='birdland-build-' )
+    paths = [ Path( tmpdir, f'staging-{i}.db' ) for i in range( len( groups ) ) ]
+    rcode = 0
+
+    try:
+        with concurrent.futures.ProcessPoolExecutor( max_workers=workers ) as executor:
+            futures = [ executor.submit( build_staging, confdir, group, path, Profile is not None ) for group, path in zip( groups, paths ) ]
+
+            for group, future in zip( groups, futures ):
+                try:
+                    res, errors, profile = future.result()
+                    rcode += res
+                    Sql_Errors += errors
+                    if profile:
+                        Profile.extend( profile )
+
+                except Exception as e:
+                    (extype, value, traceback) = sys.exc_info()
+                    print( f"ERROR building {', '.join( group )}, type: {extype}, value: {value}", file=sys.stderr )
+                    rcode += 1
+
+        if rcode or Sql_Errors:
+            return rcode
+
+        for group, path in zip( groups, paths ):
+            timed_step( ', '.join( group ), 'merge', lambda: merge_staging( c, conn, path ) )
+
+        for group in groups:
+            for step in group:
+                if SQLITE and Build_Steps[ step ].get( 'fts' ):
+                    timed_step( step, 'fts', lambda: build_step_fts( c, step ) )
+                save_manifest( c, conn, step, Build_Steps[ step ][ 'inputs' ]( c ) )
+
+        for step, spec in Build_Steps.items():
+            if spec.get( 'last' ):
+                rcode += run_step( step, dc, c, conn )
+
+    finally:
+        shutil.rmtree( tmpdir, ignore_errors=True )
+
+    conn.commit()
+    return rcode
+
 # --------------------------------------------------------------------------
 #   Move into function to keep c and dc local, not global, to be sure not depending on global.
 #   Must pull create and index out of primary functions and into build_sheet_offsets()
@@ -1882,6 +2872,11 @@ def do_extract_audio( conn ):
 @click.option( "-c", "--confdir",               help="Use alternate config directory" )
 @click.option( "-a", "--all", is_flag=True, help="Build tables marked with *, does not scan audio" )
 @click.option( "-d", "--database",      help="Use database sqlite or mysql, default sqlite", default='sqlite' )
+@click.option( "--fulltext", is_flag=True, help="Include Sqlite FTS5 index for birdland.py --fulltext" )
+@click.option( "--incremental", is_flag=True, help="Build tables marked with * only where inputs changed since last build" )
+@click.option( "--parallel", is_flag=True, help="With --all build independent tables in parallel, sqlite only" )
+@click.option( "--profile", help="Write timings of each build step as JSON to this file, summary to stderr" )
+@click.option( "--jobs", type=int, help="Run at most this many at once with --convert_raw and --parallel, default number of CPUs" )
 
 @click.option( "--convert_raw", is_flag=True, help="Convert raw index source files" )
 
@@ -1900,6 +2895,7 @@ def do_extract_audio( conn ):
 @click.option( "--audio_files", is_flag=True, help="* Build audio_files from json table." )
 @click.option( "--the_corrections", is_flag=True, help="Build 'The' title corrections file" )
 @click.option( "--title2youtube", is_flag=True, help="Build title2youtube table from data obtained by get-youtube-links.py" )
+@click.option( "--books", is_flag=True, help="* Build books table and integer keys, also after any table it keys" )
 
 @click.option( "--scan_audio", is_flag=True, help="Build json table from audio file scan. *** Avoid, may take a long time." )
 
@@ -1912,10 +2908,12 @@ def do_extract_audio( conn ):
 def do_main( all, database, offset, canonical, midi, canon2file, local2canon, title2youtube,
              src_priority, music_files, titles_distinct, titles,
              scan_audio, audio_files, confdir, convert_raw, corrections, the_corrections, fail,
-             jjazz, chordpro, page_count
+             jjazz, chordpro, page_count, fulltext, incremental, parallel, profile, books, jobs
             ):
 
-    global fb, conf
+    global fb, conf, Sql_Errors
+
+    Sql_Errors = 0              # aux_main() may call do_main() more than once.
 
     # ---------------------------------------------------------------
     #   Now support both databases. Select by command-line option, not config-file option
@@ -1924,12 +2922,12 @@ def do_main( all, database, offset, canonical, midi, canon2file, local2canon, ti
     if database == 'sqlite':
         MYSQL = False
         SQLITE = True
-        FULLTEXT = False     # True to include Sqlite fulltext index. Only meaningful if get it working better.
+        FULLTEXT = fulltext  # WRW - True to include Sqlite FTS5 index, birdland.py must be run with --fulltext to use it.
 
     elif database == 'mysql':
         MYSQL = True
         SQLITE = False
-        FULLTEXT = False     # True to include Sqlite fulltext index. Only meaningful if get it working better.
+        FULLTEXT = False     # MySql has its own FULLTEXT index.
 
     else:
         print( f"ERROR: Specified database '{database}' not supported.", file=sys.stderr )
@@ -1969,6 +2967,7 @@ def do_main( all, database, offset, canonical, midi, canon2file, local2canon, ti
     conf.set_class_variables()      # WRW 6 Mar 2022 - Now have to do this explicitly
     fb.set_classes( conf )
     fb.set_class_config()
+    fb_pdf.set_page_count_cache( Path( conf.home_confdir, conf.page_count_cache_file ))
 
     results, success = conf.check_hostname_config()
     if not success:
@@ -2001,7 +3000,18 @@ def do_main( all, database, offset, canonical, midi, canon2file, local2canon, ti
             # sys.exit(1)
 
     # ---------------------------------------------------------------
-    global Old_Dc
+    global Old_Dc, Title_Ids, Music_Index_Staged, Profile
+
+    Title_Ids = None            # WRW - May be left from an earlier call from birdland, see aux_main().
+    Music_Index_Staged = False
+    Profile = [] if profile else None
+    start_time = time.perf_counter()
+
+    #   WRW - Only these write tables. Other runs, e.g. --convert_raw alone, use the database
+    #       as it is, no build copy and no replace.
+
+    writes_db = all or incremental or books or any( ( audio_files, music_files, src_priority, offset, midi, chordpro, jjazz, canonical,
+                                                      canon2file, local2canon, titles_distinct, titles, page_count, title2youtube ) )
 
     if MYSQL:
         import MySQLdb
@@ -2011,12 +3021,17 @@ def do_main( all, database, offset, canonical, midi, canon2file, local2canon, ti
         Old_Dc = fb.set_dc( dc )
 
     elif SQLITE:
-        conn = sqlite3.connect( Path( conf.home_confdir, conf.sqlite_database ))     # Note: always in home_confdir
+        db_path = Path( conf.home_confdir, conf.sqlite_database )        # Note: always in home_confdir
+        build_path = start_build_db( db_path ) if writes_db else None
+        conn = sqlite3.connect( build_path or db_path )
         c = conn.cursor()
         dc = conn.cursor()
         dc.row_factory = sqlite3.Row
         Old_Dc = fb.set_dc( dc )
 
+        if build_path:
+            set_build_pragmas( c )
+
     else:
         print( "ERROR: No database type specified", file=sys.stderr, flush=True  )
         return 1
@@ -2024,87 +3039,95 @@ def do_main( all, database, offset, canonical, midi, canon2file, local2canon, ti
 
     # ---------------------------------------------------------------
     #   WRW 22 Mar 2022 - Add rcode so can see it in calling program.
+    #   WRW - rcode is of the table steps and decides if the build copy replaces the database,
+    #       aux_rcode of the converters and the audio scan only goes into the exit code.
 
     rcode = 0
+    aux_rcode = 0
 
     # ---------------------------------
     #   Run all the Index-Source/do_*.py files      # Do before all, titles_distinct and titles so can do in one call.
 
     if convert_raw:
-        rcode += convert_raw_source()
+        aux_rcode += timed_step( 'convert_raw', 'run', lambda: convert_raw_source( jobs ) )
 
     # ---------------------------------
 
-    if all:
-        rcode += build_source_priority( c, conn )
-        rcode += build_midi_files( c, conn )                                                                    
-        rcode += build_chordpro_files( c, conn )
-        rcode += build_jjazz_files( c, conn )
-        rcode += build_music_files( c, conn )
-        rcode += build_sheet_offsets( c, conn )
-        rcode += build_local2canonical( c, conn )
-        rcode += build_canonicals( c, conn )
-        rcode += build_canonical2file( c, conn )
-        rcode += build_page_count( dc, c, conn )
-        rcode += build_titles_distinct( c, conn )
-        rcode += build_titles( dc, c, conn )                     # After build_titles_distinct()
-        rcode += build_title2youtube( dc, c, conn, False, False )       # dc, Ifile, show_found, show_not_found
-        rcode += build_audio_files( c )
+    #   WRW - Build_Steps is in the order of the original calls here, build_titles() after
+    #       build_titles_distinct().
+
+    if all and parallel and MYSQL:
+        print( "WARNING: --parallel is for sqlite only, building in sequence", file=sys.stderr, flush=True  )
+
+    if all and parallel and SQLITE:
+        rcode += do_parallel( dc, c, conn, confdir, jobs )
+
+    elif all:
+        for step in Build_Steps:
+            rcode += run_step( step, dc, c, conn )
+
+    elif incremental:
+        rcode += do_incremental( dc, c, conn )
 
     # ---------------------------------
 
     if scan_audio:                          # This takes a long time. Use sparingly. Keep separate from --all.
-        rcode += do_scan_audio_files()      # Keep above build_audio_files() so can do both in one invocation.
+        aux_rcode += timed_step( 'scan_audio', 'run', do_scan_audio_files )    # Keep above build_audio_files() so can do both in one invocation.
 
     # ---------------------------------
 
     if audio_files:
-        rcode += build_audio_files( c )
+        rcode += run_step( 'audio_files', dc, c, conn )
 
     if music_files:
-        rcode += build_music_files( c, conn )
+        rcode += run_step( 'music_files', dc, c, conn )
 
     if src_priority:
-        rcode += build_source_priority( c, conn )
+        rcode += run_step( 'src_priority', dc, c, conn )
 
     if offset:
-        rcode += build_sheet_offsets( c, conn )         # Does its own create and indexes.
+        rcode += run_step( 'offset', dc, c, conn )      # Does its own create and indexes.
 
     if midi:
-        rcode += build_midi_files( c, conn )         # Does its own create and indexes.
+        rcode += run_step( 'midi', dc, c, conn )        # Does its own create and indexes.
 
     if chordpro:
-        rcode += build_chordpro_files( c, conn )      # Does its own create and indexes.
+        rcode += run_step( 'chordpro', dc, c, conn )    # Does its own create and indexes.
 
     if jjazz:
-        rcode += build_jjazz_files( c, conn )         # Does its own create and indexes.
+        rcode += run_step( 'jjazz', dc, c, conn )       # Does its own create and indexes.
 
     if canonical:
-        rcode += build_canonicals( c, conn )
+        rcode += run_step( 'canonical', dc, c, conn )
 
     if canon2file:
-        rcode += build_canonical2file( c, conn )
+        rcode += run_step( 'canon2file', dc, c, conn )
 
     if local2canon:
-        rcode += build_local2canonical( c, conn )
+        rcode += run_step( 'local2canon', dc, c, conn )
 
     if titles_distinct:
-        rcode += build_titles_distinct( c, conn )
+        rcode += run_step( 'titles_distinct', dc, c, conn )
 
     if corrections:
-        rcode += build_corrections_file( dc, conn )
+        rcode += timed_step( 'corrections', 'build', lambda: build_corrections_file( dc, conn ) )
 
     if the_corrections:
-        rcode += build_the_corrections_file( dc, conn )
+        rcode += timed_step( 'the_corrections', 'build', lambda: build_the_corrections_file( dc, conn ) )
 
     if titles:
-        rcode += build_titles( dc, c, conn )
+        rcode += run_step( 'titles', dc, c, conn )
 
     if page_count:
-        rcode += build_page_count( dc, c, conn )
+        rcode += run_step( 'page_count', dc, c, conn )
 
     if title2youtube:
-        rcode += build_title2youtube( dc, c, conn, False, False )       # dc, Ifile, show_found, show_not_found
+        rcode += run_step( 'title2youtube', dc, c, conn )
+
+    #   WRW - A table rebuilt here alone has no integer keys until books is built again.
+
+    if books or any( ( offset, canonical, canon2file, local2canon, titles_distinct, titles ) ):
+        rcode += run_step( 'books', dc, c, conn )
 
     # ---------------------------------
     #   This always reads from MySql DB. Needed during transition from MySql to Sqlite to extract audio_files
@@ -2116,16 +3139,30 @@ def do_main( all, database, offset, canonical, midi, canon2file, local2canon, ti
     # ---------------------------------
 
     if fail:
-        return 1
+        if SQLITE:
+            conn.close()
+            if build_path:
+                finish_build_db( db_path, build_path, 1 )
+        if profile:
+            write_profile( profile, database, time.perf_counter() - start_time )
+        click.get_current_context().exit( 1 )
 
     # ---------------------------------
 
     conn.commit()
     conn.close()
 
+    if SQLITE and build_path:
+        finish_build_db( db_path, build_path, rcode )
+
+    if profile:
+        write_profile( profile, database, time.perf_counter() - start_time )
+
     # ---------------------------------
+    #   WRW - Through exit() so it is also the exit status from the command line, click ignores
+    #       the return value there. aux_main() still gets it as the value of do_main().
 
-    return rcode
+    click.get_current_context().exit( rcode + aux_rcode + ( 1 if Sql_Errors else 0 ))
 
 # --------------------------------------------------------------------------
 #   WRW 22 Mar 2022 - Include 'standalone_mode=False' in call to do_main() to prevent
@@ -56,14 +56,15 @@ def inspect_data_for_one_title( data ):
     #   Title may appear in more than one canonical. Only check for match in the indexes for one canonical at a time.
     #   First group by canonical.                                                                          
 
-    for item in data:
+    pages = fb.get_pages_from_sheets( [ ( item['sheet'], item['src'], item['local'] ) for item in data ] )
+
+    for item, page in zip( data, pages ):
         title =     item[ 'title' ]
         canonical = item['canonical']
         sheet =     item['sheet']
         src =       item['src']
         local =     item['local']
       # file =      item['file']
-        page =      fb.get_page_from_sheet( sheet, src, local )
 
         canonicals.add( canonical )
 
@@ -153,12 +154,14 @@ def inspect_data_for_one_title( data ):
 
 def check_pages( dc, all, canon ):
 
+    k = fb.book_keys()
+
     if all:
-        query = """
-            SELECT title, titles.src, local, sheet, canonical /*, file */
+        query = f"""
+            SELECT title, titles.src, titles.local, sheet, canonical /*, file */
             FROM titles
             JOIN titles_distinct USING( title_id )
-            JOIN local2canonical USING( local, src )
+            JOIN local2canonical {k['book_using']}
             /* JOIN canonical2file USING( canonical ) */
             ORDER BY title
         """
@@ -166,21 +169,21 @@ def check_pages( dc, all, canon ):
 
     elif canon:
         if MYSQL:
-            query = """
-                SELECT title, titles.src, local, sheet, canonical /*, file */
+            query = f"""
+                SELECT title, titles.src, titles.local, sheet, canonical /*, file */
                 FROM titles
                 JOIN titles_distinct USING( title_id )
-                JOIN local2canonical USING( local, src )
+                JOIN local2canonical {k['book_using']}
                 /* JOIN canonical2file USING( canonical ) */
                 WHERE canonical = %s
                 ORDER BY title
             """
         if SQLITE:
-            query = """
-                SELECT title, titles.src, local, sheet, canonical /*, file */
+            query = f"""
+                SELECT title, titles.src, titles.local, sheet, canonical /*, file */
                 FROM titles
                 JOIN titles_distinct USING( title_id )
-                JOIN local2canonical USING( local, src )
+                JOIN local2canonical {k['book_using']}
                 /* JOIN canonical2file USING( canonical ) */
                 WHERE canonical = ?
                 ORDER BY title
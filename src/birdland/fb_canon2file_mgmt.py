@@ -25,6 +25,9 @@ class C2F():
 
     # -----------------------------------
 
+    def set_dc( self, dc ):
+        self.dc = dc
+
     def set_elements( self, dc, canonical_table, link_table, find ):
         self.dc = dc
         self.canonical_table = canonical_table
@@ -246,6 +246,8 @@ class Config():
       # self.audiofile_index_file = 'Audio-Index.json.gz'
         self.audiofile_index_file = f"{self.hostname}-Audio-Index.json.gz"
         self.setlist_file = 'setlist.json'                                                                                                    
+        self.page_count_cache_file = 'Page-Count-Cache.json'        # WRW - See fb_pdf.get_page_counts()
+        self.music_index_manifest_file = 'Music-Index-Manifest.json'    # WRW - See fb_music_index.MusicIndex
         self.canonical2file = 'Canonical2File.txt'
       # self.canonical2file = f"{self.hostname}-Canonical2File.txt"
         self.example_canonical2file = 'Example-Canonical2File.txt'
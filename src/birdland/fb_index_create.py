@@ -405,6 +405,10 @@ class Create():
         self.window = window
 
     # --------------------------------------------------------------
+
+    def set_dc( self, dc ):
+        self.dc = dc
+
     # def set_elements( self, dc, canonical, title, sheet, page, graph, canonical_table, main_frame, review_frame, review_table ):
     # def set_elements( self, dc, title, sheet, page, graph, canonical_table, main_frame, review_frame, review_table ):
 
@@ -34,6 +34,9 @@ class Diff():
         self.pdf_window = None
         self.pdf_figure = None
 
+    def set_dc( self, dc ):
+        self.dc = dc
+
     def set_elements( self, dc, info_canon, table, canon_table, display_pdf ):
         self.dc = dc
         self.index_diff_info_canonical = info_canon
@@ -401,10 +404,11 @@ the next time the raw index is processed."""
                 titles = {}                         # All titles from all srcs covering canonical
                 self.scatter_by_src = {}            # WRW 4 Apr 2022 - collecting data for scatter plot.
 
-                for row in data:                    # Put is dict indexed by title.
+                pages = self.fb.get_pages_from_sheets( [ ( row[ 'sheet' ], row[ 'src' ], row[ 'local'] ) for row in data ] )  # Applies sheet offset to get page from sheet
+
+                for row, page in zip( data, pages ):       # Put is dict indexed by title.
                     titles.setdefault( row['title'], [] ).append( row )
                     self.src_list.add( row['src'] )
-                    page = self.fb.get_page_from_sheet( row[ 'sheet' ], row[ 'src' ], row[ 'local'] )        # Applies sheet offset to get page from sheet
 
                     self.scatter_by_src.setdefault( row['src'], [] ).append( { 'page' : page, 'sheet' : row['sheet'] } )
 
@@ -713,6 +717,11 @@ the next time the raw index is processed."""
                         return
 
                     page_count = self.pdf.get_page_count( fullpath )
+                    if page_count is None:
+                        t = f"ERROR: Can't open PDF file {fullpath.as_posix()} to get page count"
+                        self.conf.do_popup( t )
+                        return True
+
                     self.show_offset_graph( src, local, page_count )
                     return True
 
@@ -812,12 +821,13 @@ the next time the raw index is processed."""
         #       Page numbers should all be the same for a given title and canonical. If they are
         #       not it is because of mismatch in the index from different srcs.
 
-        for item in data:
+        all_pages = self.fb.get_pages_from_sheets( [ ( item['sheet'], item['src'], item['local'] ) for item in data ] )   # Applies sheet offset to get page from sheet
+
+        for item, page in zip( data, all_pages ):
             title = title
             sheet = item['sheet']
             src =   item['src']
             local = item['local']
-            page =  self.fb.get_page_from_sheet( sheet, src, local )        # Applies sheet offset to get page from sheet
     
             if not page:
                 print( f"ERROR-DEV: get_page_from_sheet() returned None, title: '{title}', sheet: '{sheet}', src: '{src}', local: '{local}', skipping.", file=sys.stderr )
@@ -0,0 +1,274 @@
+#!/usr/bin/python
+# ---------------------------------------------------------------------------------------
+#   fb_index_pack.py
+
+#   WRW - Compact packed form of Music-Index, one file per src, <src>.pack, made from the
+#   <src>-*.json.gz files written by FB.save(). Loading it is one zlib.decompress() and a
+#   split of the string table, no JSON parse. Records are read with struct.iter_unpack()
+#   straight from the buffer and yielded as tuples, no dict per record.
+
+#   File:   Magic, then zlib compressed:
+#       Header:     strings length, layouts length, book count, record count
+#       Strings:    UTF-8, separated by NUL. Index 0 is None and stands for a missing value.
+#       Layouts:    JSON list of the key lists of the content items, in their original order,
+#                   so a book converts back to exactly the same JSON.
+#       Books:      file name, local, source, first record, record count
+#       Records:    layout, title, sheet, composer, lyricist, file, line
+
+#   Lossless: pack_src() packs only what it can give back unchanged and raises ValueError
+#       otherwise, book_data() returns the same dict json.load() gave for the .json.gz.
+
+#   Usage:  fb_index_pack.py --convert         Write <src>.pack for all srcs in Music-Index
+#           fb_index_pack.py --check           Compare all <src>.pack with their .json.gz files
+#           fb_index_pack.py --bench           Load time and size of both forms
+# ---------------------------------------------------------------------------------------
+
+import os
+import sys
+import gzip
+import json
+import zlib
+import struct
+import time
+import click
+from pathlib import Path
+
+import fb_config
+
+# ---------------------------------------------------------------------------------------
+
+Magic = b'BIRDLAND-INDEX-PACK-1\n'
+Header = struct.Struct( '<IIII' )
+Book = struct.Struct( '<IIIII' )
+Record = struct.Struct( '<HIIIIIi' )
+
+Fields = [ 'title', 'sheet', 'composer', 'lyricist', 'file' ]      # String fields of Record, 'line' is int.
+Book_Keys = [ 'local', 'source', 'contents' ]
+
+# ---------------------------------------------------------------------------------------
+#   WRW - Index files of 'src' as in FB.get_music_index_data_by_src(), sorted here.
+#       Match through the '-', 'src' alone would also take the files of any src it is a prefix of.
+
+def index_files( music_index_dir, src ):
+    return sorted( Path( music_index_dir ).glob( f"{src}-*.json.gz" ) )
+
+def index_srcs( music_index_dir ):
+    return sorted( { path.name.split( '-', 1 )[0] for path in Path( music_index_dir ).glob( '*.json.gz' ) } )
+
+def pack_path( music_index_dir, src ):
+    return Path( music_index_dir, f"{src}.pack" )
+
+# ---------------------------------------------------------------------------------------
+
+def pack_src( music_index_dir, src, ofile=None ):
+    strings = { None : 0 }
+    layouts = {}
+    books = []
+    records = []
+
+    def string( value ):
+        if value is not None and ( not isinstance( value, str ) or '\0' in value ):
+            raise ValueError( f"can't pack value {value!r}" )
+        return strings.setdefault( value, len( strings ) )
+
+    for path in index_files( music_index_dir, src ):
+        with gzip.open( path, 'rt' ) as ifd:
+            data = json.load( ifd )
+
+        if list( data ) != Book_Keys:
+            raise ValueError( f"unexpected keys {list( data )} in {path}" )
+
+        first = len( records )
+        for content in data[ 'contents' ]:
+            keys = tuple( content )
+            if not set( keys ) <= set( Fields + [ 'line' ] ):
+                raise ValueError( f"unexpected keys {keys} in {path}" )
+
+            line = content.get( 'line', 0 )
+            if type( line ) is not int:
+                raise ValueError( f"can't pack line {line!r} in {path}" )
+
+            layout = layouts.setdefault( keys, len( layouts ) )
+            records.append( Record.pack( layout, *[ string( content.get( field ) ) for field in Fields ], line ) )
+
+        books.append( Book.pack( string( path.name ), string( data[ 'local' ] ), string( data[ 'source' ] ), first, len( records ) - first ) )
+
+    text = '\0'.join( [ '' ] + list( strings )[1:] ).encode( 'utf-8' )
+    layout_text = json.dumps( [ list( keys ) for keys in layouts ] ).encode( 'utf-8' )
+
+    body = Header.pack( len( text ), len( layout_text ), len( books ), len( records ) ) + text + layout_text + b''.join( books ) + b''.join( records )
+
+    ofile = ofile or pack_path( music_index_dir, src )
+    tfile = Path( f"{ofile}.tmp" )
+    with open( tfile, 'wb' ) as ofd:
+        ofd.write( Magic )
+        ofd.write( zlib.compress( body, 9 ) )
+    os.replace( tfile, ofile )
+
+    return len( books ), len( records )
+
+# ---------------------------------------------------------------------------------------
+#   WRW - One loaded <src>.pack. Read only after __init__(), safe to share between threads.
+
+class IndexPack():
+
+    def __init__( self, path ):
+        with open( path, 'rb' ) as ifd:
+            magic = ifd.read( len( Magic ) )
+            if magic != Magic:
+                raise ValueError( f"{path} is not an index pack" )
+            body = zlib.decompress( ifd.read() )
+
+        text_len, layout_len, book_count, record_count = Header.unpack_from( body )
+        pos = Header.size
+
+        self.strings = body[ pos : pos + text_len ].decode( 'utf-8' ).split( '\0' )
+        self.strings[0] = None
+        pos += text_len
+
+        self.layouts = [ tuple( keys ) for keys in json.loads( body[ pos : pos + layout_len ] ) ]
+        pos += layout_len
+
+        s = self.strings
+        self.books = [ ( s[ name ], s[ local ], s[ source ], first, count )
+                       for name, local, source, first, count in Book.iter_unpack( body[ pos : pos + book_count * Book.size ] ) ]
+        pos += book_count * Book.size
+
+        self.records = memoryview( body )[ pos : pos + record_count * Record.size ]
+
+    # -----------------------------------------------------------------------------------
+    #   ( title, sheet, composer, lyricist, file, line ) of all records or of book 'n'.
+    #       None for a value that is None or missing.
+
+    def iter_records( self, n=None ):
+        if n is None:
+            records = self.records
+        else:
+            first, count = self.books[ n ][ 3: ]
+            records = self.records[ first * Record.size : ( first + count ) * Record.size ]
+
+        s = self.strings
+        for layout, title, sheet, composer, lyricist, file, line in Record.iter_unpack( records ):
+            yield s[ title ], s[ sheet ], s[ composer ], s[ lyricist ], s[ file ], line
+
+    # -----------------------------------------------------------------------------------
+    #   The dict json.load() gives for the .json.gz of book 'n', for callers that want that.
+
+    def book_data( self, n ):
+        name, local, source, first, count = self.books[ n ]
+        s = self.strings
+        contents = []
+        for layout, *values, line in Record.iter_unpack( self.records[ first * Record.size : ( first + count ) * Record.size ] ):
+            item = dict( zip( Fields, [ s[ x ] for x in values ] ), line=line )
+            contents.append( { key : item[ key ] for key in self.layouts[ layout ] } )
+
+        return { 'local' : local, 'source' : source, 'contents' : contents }
+
+# ---------------------------------------------------------------------------------------
+#   WRW - Packs and .json.gz files must give the same books, same order of keys too.
+
+def check_src( music_index_dir, src ):
+    path = pack_path( music_index_dir, src )
+    if not path.exists():
+        return f"{src}: no {path.name}"
+
+    pack = IndexPack( path )
+    paths = index_files( music_index_dir, src )
+
+    if [ path.name for path in paths ] != [ book[0] for book in pack.books ]:
+        return f"{src}: books differ"
+
+    for n, path in enumerate( paths ):
+        with gzip.open( path, 'rt' ) as ifd:
+            data = json.load( ifd )
+        if json.dumps( data ) != json.dumps( pack.book_data( n ) ):
+            return f"{src}: {path.name} differs"
+
+    return None
+
+# ---------------------------------------------------------------------------------------
+
+def run_bench( music_index_dir, srcs, count ):
+    json_size = sum( path.stat().st_size for src in srcs for path in index_files( music_index_dir, src ) )
+    pack_size = sum( pack_path( music_index_dir, src ).stat().st_size for src in srcs )
+
+    start = time.perf_counter()
+    for i in range( count ):
+        json_records = 0
+        for src in srcs:
+            for path in index_files( music_index_dir, src ):
+                with gzip.open( path, 'rt' ) as ifd:
+                    data = json.load( ifd )
+                for content in data[ 'contents' ]:
+                    json_records += 1
+    json_time = ( time.perf_counter() - start ) / count
+
+    start = time.perf_counter()
+    for i in range( count ):
+        pack_records = 0
+        for src in srcs:
+            pack = IndexPack( pack_path( music_index_dir, src ) )
+            for record in pack.iter_records():
+                pack_records += 1
+    pack_time = ( time.perf_counter() - start ) / count
+
+    print( f"{'Form':<10} {'Records':>9} {'Bytes':>10} {'Load ms':>9}" )
+    print( f"{'json.gz':<10} {json_records:>9} {json_size:>10} {json_time * 1000:>9.1f}" )
+    print( f"{'pack':<10} {pack_records:>9} {pack_size:>10} {pack_time * 1000:>9.1f}" )
+    print( f"Size {pack_size / json_size:.2f}x, load {json_time / pack_time:.1f}x faster" )
+
+# ---------------------------------------------------------------------------------------
+
+@click.command()
+@click.option( "-c", "--confdir",                       help="Use alternate config directory" )
+@click.option( "-d", "--dir",                           help="Music-Index directory, default from config" )
+@click.option( "-s", "--src", multiple=True,            help="Only this src, may be repeated" )
+@click.option( "--convert", is_flag=True,               help="Write <src>.pack from <src>-*.json.gz" )
+@click.option( "--check", is_flag=True,                 help="Compare <src>.pack with <src>-*.json.gz" )
+@click.option( "--bench", is_flag=True,                 help="Show load time and size of both forms" )
+@click.option( "-n", "--count", default=3,              help="Repeat count for --bench" )
+
+def do_main( confdir, dir, src, convert, check, bench, count ):
+    if not dir:
+        conf = fb_config.Config()
+        conf.set_driver( False, True, False )
+        conf.get_config( confdir )
+        conf.set_class_variables()
+        dir = conf.val( 'music_index_dir' )
+
+    srcs = list( src ) or index_srcs( dir )
+    rcode = 0
+
+    if convert:
+        for src in srcs:
+            try:
+                books, records = pack_src( dir, src )
+                print( f"{src}: {books} books, {records} records" )
+
+            except Exception as e:
+                (extype, value, traceback) = sys.exc_info()
+                print( f"ERROR packing {src}, type: {extype}, value: {value}", file=sys.stderr )
+                rcode = 1
+
+    if check:
+        for src in srcs:
+            res = check_src( dir, src )
+            if res:
+                print( f"ERROR: {res}", file=sys.stderr )
+                rcode = 1
+        print( f"Checked {len( srcs )} srcs" )
+
+    if bench:
+        missing = [ src for src in srcs if not pack_path( dir, src ).exists() ]
+        if missing:
+            print( f"ERROR: No pack for {', '.join( missing )}, run with --convert first", file=sys.stderr )
+            rcode = 1
+        else:
+            run_bench( dir, srcs, count )
+
+    sys.exit( rcode )
+
+if __name__ == '__main__':
+    do_main()
+
+# ---------------------------------------------------------------------------------------
@@ -13,6 +13,9 @@ class PageList():
         self.src = None
         self.local = None
 
+    def set_dc( self, dc ):
+        self.dc = dc
+
     def set_elements( self, dc, table, src_table, local_table, info_src, info_local, info_canonical, info_file, display_pdf, info_page_count ):
         self.dc = dc
         self.index_mgmt_table = table
@@ -134,6 +137,11 @@ class PageList():
                                 return True
 
                             self.page_count = self.pdf.get_page_count( fullpath )
+                            if self.page_count is None:
+                                self.index_mgmt_info_page_count.update( value = '' )
+                                t = f"ERROR: Can't open PDF file {fullpath.as_posix()} to get page count"
+                                self.conf.do_popup( t )
+                                return True
 
                             self.index_mgmt_info_page_count.update( value = self.page_count )
                             show_data = True
@@ -168,15 +176,19 @@ class PageList():
                     #   Remember that page is numeric in DB so can do comparisons on it.
                     #   WRW 28 Apr 2022 - Switch to using page, not spage, for fb_utils calls below.
 
+                    #   WRW - Offsets and sheets of all pages with one batch call each.
+
+                    pages = [ ( page, self.src, self.local ) for page in range( 1, self.page_count + 1) ]
+                    offsets = self.fb.get_sheet_offsets_from_pages( pages )
+                    sheets = self.fb.get_sheets_from_pages( pages )
+
                     data = []
-                    for page in range( 1, self.page_count + 1):
+                    for ( page, src, local ), offset, sheet in zip( pages, offsets, sheets ):
                         spage = str( page )
 
                       # offset = self.fb.get_sheet_offset_from_page( spage, self.src, self.local )
-                        offset = self.fb.get_sheet_offset_from_page( page, self.src, self.local )
-
                       # sheet = str( self.fb.get_sheet_from_page( spage, self.src, self.local ) )
-                        sheet = str( self.fb.get_sheet_from_page( page, self.src, self.local ) )
+                        sheet = str( sheet )
 
                         if sheet and sheet in items_by_sheet:
                             items = items_by_sheet[ sheet ]
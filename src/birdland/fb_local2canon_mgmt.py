@@ -24,6 +24,9 @@ class L2C():
 
     # -----------------------------------
 
+    def set_dc( self, dc ):
+        self.dc = dc
+
     def set_elements( self, dc, canonical_table, local_table, src_combo, find ):
         self.dc = dc
         self.canonical_table = canonical_table
@@ -224,9 +227,10 @@ row in the 'Local Name / Linked Canonical Name' table.\n"""
 
             # ----------------------------
             limit = 25          # For sample display
+            k = self.fb.book_keys()
 
-            txt = """SELECT title, sheet FROM titles JOIN titles_distinct USING( title_id ) WHERE
-                  src=%s AND local = %s ORDER BY sheet +0 LIMIT %s
+            txt = f"""SELECT title, sheet FROM titles JOIN titles_distinct USING( title_id ) {k['books_join']} WHERE
+                  {k['books']}src=%s AND {k['books']}local = %s ORDER BY sheet +0 LIMIT %s
                   """
             txt = fb_utils.fix_query( txt )
 
@@ -247,8 +251,8 @@ row in the 'Local Name / Linked Canonical Name' table.\n"""
                         print( f"   {self.src} / {selected_local}", file=sys.stderr )
 
             # ----------------------------
-            txt = """SELECT COUNT(*) cnt FROM titles JOIN titles_distinct USING( title_id ) WHERE
-                  src=%s AND local = %s                           
+            txt = f"""SELECT COUNT(*) cnt FROM titles JOIN titles_distinct USING( title_id ) {k['books_join']} WHERE
+                  {k['books']}src=%s AND {k['books']}local = %s                           
                   """
             txt = fb_utils.fix_query( txt )
             data = [ self.src, selected_local ]
@@ -272,8 +276,8 @@ row in the 'Local Name / Linked Canonical Name' table.\n"""
                 for slocal in slocals:
                     slocal = slocal[0]      # get_locals_from_src() returns list of lists for earlier need updating table.
 
-                    txt = """SELECT title, sheet FROM titles JOIN titles_distinct USING( title_id ) WHERE
-                          src=%s AND local = %s ORDER BY sheet +0 LIMIT %s
+                    txt = f"""SELECT title, sheet FROM titles JOIN titles_distinct USING( title_id ) {k['books_join']} WHERE
+                          {k['books']}src=%s AND {k['books']}local = %s ORDER BY sheet +0 LIMIT %s
                           """
                     txt = fb_utils.fix_query( txt )
 
@@ -7,6 +7,7 @@
 import os
 
 #   Form of row in database_tables: [ label, table, query ]
+#   Queries are formatted with fb.book_keys().
 
 database_tables = [                                     # for show stats.
     [ "All Music Files", "music_files", None ],
@@ -14,7 +15,7 @@ database_tables = [                                     # for show stats.
         """SELECT COUNT(*) cnt
            FROM (
                 SELECT COUNT(*) FROM titles
-                JOIN local2canonical USING( local, src )
+                JOIN local2canonical {book_using}
                 GROUP BY canonical
            ) AS sub
         """
@@ -181,10 +182,13 @@ def db_stats( dc, fb ):
   # res.append( [ sg.Text( 'Overall Statistics:', font=("Helvetica", 10, 'bold'), justification='right') , ''] )
     res.append( ['Overall Statistics:', ''] )
 
+    k = fb.book_keys()
     for label, table, query in database_tables:
 
         if not query:
             query = f'SELECT COUNT(*) cnt FROM {table}'
+        else:
+            query = query.format( **k )
 
         dc.execute( query )
         rows = dc.fetchall()
@@ -202,13 +206,14 @@ def title_count_canon_src( dc, fb ):
     res.append( [ '', '' ] )
     res.append( ['Title Count by Src and Canonical for Indexed Music Files:', '' ] )
 
-    query = """SELECT COUNT(*) cnt, title, src, local, canonical, file            
+    k = fb.book_keys()
+    query = f"""SELECT COUNT(*) cnt, title, titles.src, titles.local, canonical, file            
                FROM titles 
                JOIN titles_distinct USING( title_id )
-               JOIN local2canonical USING( src, local )
+               JOIN local2canonical {k['book_using']}
                JOIN canonical2file USING( canonical )
-               GROUP BY canonical, src
-               ORDER BY canonical, src
+               GROUP BY canonical, titles.src
+               ORDER BY canonical, titles.src
             """
 
     dc.execute( query )
@@ -232,13 +237,14 @@ def title_count_src( dc, fb ):
     res.append( [ '', '' ] )
     res.append( ['Title Count by Src for Indexed Music Files:', ''] )
 
-    query = """SELECT COUNT(*) cnt, title, src, local, canonical, file            
+    k = fb.book_keys()
+    query = f"""SELECT COUNT(*) cnt, title, titles.src, titles.local, canonical, file            
                FROM titles 
                JOIN titles_distinct USING( title_id )
-               JOIN local2canonical USING( src, local )
+               JOIN local2canonical {k['book_using']}
                JOIN canonical2file USING( canonical )
-               GROUP BY src
-               ORDER BY src
+               GROUP BY titles.src
+               ORDER BY titles.src
     """
     dc.execute( query )
     rows = dc.fetchall()
@@ -264,15 +270,16 @@ def title_coverage_by_canonical( dc, fb ):
     res.append( ['    Coverage can be less than 100% because of front and back matter, photos, etc.', ''] )
     res.append( ['    Coverage can be in the mid-range because of partial src coverage.', ''] )
 
-    query = """SELECT 1.0 * COUNT(*) / page_count AS coverage, title, src, local, canonical, file, page_count, priority
+    k = fb.book_keys()
+    query = f"""SELECT 1.0 * COUNT(*) / page_count AS coverage, title, titles.src, titles.local, canonical, file, page_count, priority
                FROM titles
                JOIN titles_distinct USING( title_id )
-               JOIN local2canonical USING( src, local )
+               JOIN local2canonical {k['book_using']}
                JOIN canonical2file USING( canonical )
                JOIN page_count USING( file )
-               JOIN src_priority USING( src )
-               GROUP BY canonical, src
-               ORDER BY canonical, src
+               JOIN src_priority ON src_priority.src = titles.src
+               GROUP BY canonical, titles.src
+               ORDER BY canonical, titles.src
             """
 
     dc.execute( query )
@@ -438,24 +438,14 @@ class Meta():
             data.append( title )
 
         if SQLITE:
-            if FULLTEXT:
-                query = f"""
-                    SELECT rpath, file
-                    FROM midi_files_fts
-                    WHERE file MATCH ?
-                    ORDER BY rank
-                """
-                data.append( title )
-
-            else:
-                w, d = self.fb.get_fulltext( "file", title )
-                query = f"""
-                    SELECT rpath, file
-                    FROM midi_files    
-                    WHERE {w}
-                    ORDER BY file
-                """
-                data.extend( d )
+            w, d = self.fb.get_fulltext( "midi_files.file", title )
+            query = f"""
+                SELECT rpath, file
+                FROM midi_files    
+                WHERE {w}
+                ORDER BY file
+            """
+            data.extend( d )
 
         # parts = title.split()
         # t = [ f'+{x}' for x in parts if len(x) >= 4]
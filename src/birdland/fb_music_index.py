@@ -0,0 +1,190 @@
+#!/usr/bin/python
+# ---------------------------------------------------------------------------------------
+#   fb_music_index.py
+
+#   WRW - Reader for the Music-Index directory, <src>-<book>.json.gz files written by FB.save().
+#   Files are opened by absolute path, no chdir, so it can be used from worker threads.
+#   Backed by a manifest of one entry per book: src, local, path, record count and sha1 of
+#   the file. The manifest is saved as JSON, normally in the home config directory, and on
+#   refresh() only files with a new size or mtime are read again.
+
+#   Books are loaded one at a time as they are iterated, never all of them at once.
+#   One MusicIndex may be shared by threads: refresh() is under a lock and replaces the
+#   entry list as a whole, readers work on the list they got.
+# ---------------------------------------------------------------------------------------
+
+import os
+import sys
+import gzip
+import json
+import hashlib
+import threading
+import collections
+from pathlib import Path
+
+# ---------------------------------------------------------------------------------------
+
+Entry = collections.namedtuple( 'Entry', [ 'src', 'local', 'path', 'records', 'hash', 'size', 'mtime_ns' ] )
+
+Manifest_Version = 1
+
+# ---------------------------------------------------------------------------------------
+
+class MusicIndex():
+
+    def __init__( self, music_index_dir, manifest_file=None ):
+        self.music_index_dir = Path( music_index_dir ).resolve()
+        self.manifest_file = Path( manifest_file ) if manifest_file else None
+        self.lock = threading.Lock()
+        self.entries = None
+        self.by_src = {}
+        self.stamp = None
+
+    # -----------------------------------------------------------------------------------
+    #   WRW - Scan the directory, only stat() for unchanged files. Cheap when nothing
+    #       changed, called by every accessor so a converter run is seen at once.
+
+    def refresh( self ):
+        with self.lock:
+            try:
+                files = sorted( [ ( x.name, x.stat() ) for x in os.scandir( self.music_index_dir ) if x.name.endswith( '.json.gz' ) ] )
+
+            except OSError as e:
+                (extype, value, traceback) = sys.exc_info()
+                print( f"ERROR reading Music-Index directory {self.music_index_dir}, type: {extype}, value: {value}", file=sys.stderr )
+                files = []
+
+            stamp = [ ( name, st.st_size, st.st_mtime_ns ) for name, st in files ]
+            if stamp == self.stamp:
+                return
+
+            old = { entry.path.name : entry for entry in ( self.entries if self.entries is not None else self.load_manifest() ) }
+
+            entries = []
+            changed = False
+            for name, size, mtime_ns in stamp:
+                entry = old.get( name )
+                if not entry or entry.size != size or entry.mtime_ns != mtime_ns:
+                    entry = self.read_entry( Path( self.music_index_dir, name ), size, mtime_ns )
+                    changed = True
+                if entry:
+                    entries.append( entry )
+
+            by_src = collections.OrderedDict()
+            for entry in entries:
+                by_src.setdefault( entry.src, [] ).append( entry )
+
+            self.entries = entries
+            self.by_src = by_src
+            self.stamp = stamp
+
+            if changed or len( entries ) != len( old ):
+                self.save_manifest()
+
+    # -----------------------------------------------------------------------------------
+
+    def read_entry( self, path, size, mtime_ns ):
+        try:
+            raw = path.read_bytes()
+            data = json.loads( gzip.decompress( raw ) )
+
+        except Exception as e:
+            (extype, value, traceback) = sys.exc_info()
+            print( f"ERROR reading Music-Index file {path}, type: {extype}, value: {value}", file=sys.stderr )
+            return None
+
+        src = path.name.split( '-', 1 )[0]
+        return Entry( src, data[ 'local' ], path, len( data[ 'contents' ] ), hashlib.sha1( raw ).hexdigest(), size, mtime_ns )
+
+    # -----------------------------------------------------------------------------------
+
+    def load_manifest( self ):
+        if not self.manifest_file:
+            return []
+
+        try:
+            with open( self.manifest_file ) as ifd:
+                manifest = json.load( ifd )
+
+            if manifest.get( 'version' ) != Manifest_Version or manifest.get( 'dir' ) != self.music_index_dir.as_posix():
+                return []
+
+            return [ Entry( x[ 'src' ], x[ 'local' ], Path( self.music_index_dir, x[ 'file' ] ), x[ 'records' ], x[ 'hash' ], x[ 'size' ], x[ 'mtime_ns' ] )
+                     for x in manifest[ 'books' ] ]
+
+        except FileNotFoundError:
+            return []
+
+        except Exception as e:
+            (extype, value, traceback) = sys.exc_info()
+            print( f"WARNING: Ignoring Music-Index manifest {self.manifest_file}, type: {extype}, value: {value}", file=sys.stderr )
+            return []
+
+    #   WRW - Written to a temp file and renamed, other processes may read it at the same time.
+
+    def save_manifest( self ):
+        if not self.manifest_file:
+            return
+
+        manifest = {
+            'version' : Manifest_Version,
+            'dir' :     self.music_index_dir.as_posix(),
+            'books' :   [ { 'src' : x.src, 'local' : x.local, 'file' : x.path.name, 'records' : x.records,
+                            'hash' : x.hash, 'size' : x.size, 'mtime_ns' : x.mtime_ns } for x in self.entries ],
+        }
+
+        tfile = Path( f"{self.manifest_file}.{os.getpid()}.{threading.get_ident()}.tmp" )
+        try:
+            with open( tfile, 'w' ) as ofd:
+                json.dump( manifest, ofd )
+            os.replace( tfile, self.manifest_file )
+
+        except Exception as e:
+            (extype, value, traceback) = sys.exc_info()
+            print( f"WARNING: Can't save Music-Index manifest {self.manifest_file}, type: {extype}, value: {value}", file=sys.stderr )
+            try:
+                tfile.unlink()
+            except OSError:
+                pass
+
+    # -----------------------------------------------------------------------------------
+
+    def get_srcs( self ):
+        self.refresh()
+        return list( self.by_src )
+
+    def get_entries( self, src=None ):
+        self.refresh()
+        if src is None:
+            return list( self.entries )
+        return list( self.by_src.get( src, [] ) )
+
+    # -----------------------------------------------------------------------------------
+    #   sha1 over file names and hashes of the books of 'src', as build_tables.py used to
+    #       compute from the files themselves.
+
+    def get_fingerprint( self, src ):
+        h = hashlib.sha1( repr( [ ( entry.path.name, entry.hash ) for entry in self.get_entries( src ) ] ).encode() )
+        return h.hexdigest()
+
+    # -----------------------------------------------------------------------------------
+
+    def load( self, entry ):
+        with gzip.open( entry.path, 'rt' ) as ifd:
+            return json.load( ifd )
+
+    #   ( entry, data ) of each book of 'src', all srcs if None, loaded as reached.
+
+    def iter_books( self, src=None, load=None ):
+        load = load or self.load
+        for entry in self.get_entries( src ):
+            yield entry, load( entry )
+
+    #   ( entry, content ) of each item of each book.
+
+    def iter_contents( self, src=None ):
+        for entry, data in self.iter_books( src ):
+            for content in data[ 'contents' ]:
+                yield entry, content
+
+# ---------------------------------------------------------------------------------------
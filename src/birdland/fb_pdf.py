@@ -34,11 +34,131 @@
 
 import os
 import sys
+import json
 import subprocess
 import shutil
+import threading
+import concurrent.futures
 import fitz
 from pathlib import Path
 
+# ---------------------------------------------------------------------------------------
+#   WRW - Page counts of PDF files, cached in a file in the configuration directory across
+#       runs and shared by build_tables.py (page_count table) and PDF.get_page_count().
+#       Entry is valid while the file size and mtime are unchanged, only new or changed
+#       files are opened. get_page_counts() opens those in a process pool.
+
+Page_Count_Cache_File = None
+Page_Count_Cache = None                 # { path : [ size, mtime_ns, page_count ] }
+Page_Count_Lock = threading.Lock()
+
+def set_page_count_cache( path ):
+    global Page_Count_Cache_File, Page_Count_Cache
+    Page_Count_Cache_File = Path( path )
+    Page_Count_Cache = None
+
+def load_page_count_cache():
+    global Page_Count_Cache
+
+    if Page_Count_Cache is None:
+        Page_Count_Cache = {}
+        if Page_Count_Cache_File and Page_Count_Cache_File.is_file():
+            try:
+                with open( Page_Count_Cache_File ) as fd:
+                    Page_Count_Cache = json.load( fd )
+
+            except Exception as e:
+                (extype, value, traceback) = sys.exc_info()
+                print( f"ERROR on read of {Page_Count_Cache_File}, type: {extype}, value: {value}", file=sys.stderr )
+
+    return Page_Count_Cache
+
+def save_page_count_cache():
+    if not Page_Count_Cache_File:
+        return
+
+    tmp = Page_Count_Cache_File.with_name( f'{Page_Count_Cache_File.name}.{os.getpid()}' )
+    try:
+        with open( tmp, 'w' ) as fd:
+            json.dump( Page_Count_Cache, fd )
+        os.replace( tmp, Page_Count_Cache_File )           # Another program may be writing it, too.
+
+    except Exception as e:
+        (extype, value, traceback) = sys.exc_info()
+        print( f"ERROR on write of {Page_Count_Cache_File}, type: {extype}, value: {value}", file=sys.stderr )
+
+# ---------------------------------------------------------------------------------------
+
+def count_pages( path ):
+    try:
+        doc = fitz.open( path )
+        page_count = doc.page_count
+        doc.close()
+        return page_count
+
+    except Exception as e:
+        (extype, value, traceback) = sys.exc_info()
+        print( f"ERROR on open of {path}, type: {extype}, value: {value}", file=sys.stderr, flush=True )
+        return None
+
+# ---------------------------------------------------------------------------------------
+#   Returns { path : page_count } for each of 'paths', page_count None for a file that
+#       can't be opened.
+#   With 'prune', 'paths' is all files in use, build_page_count() in build_tables.py. Entries
+#       for other files, e.g. deleted ones, are dropped from the cache.
+
+def get_page_counts( paths, prune=False ):
+    with Page_Count_Lock:
+        cache = load_page_count_cache()
+        page_counts = {}
+        changed = {}
+
+        stale = []
+        if prune:
+            keys = set( [ str( path ) for path in paths ] )
+            stale = [ key for key in cache if key not in keys ]
+            for key in stale:
+                del cache[ key ]
+
+        for path in paths:
+            key = str( path )
+            try:
+                st = os.stat( path )
+            except OSError:
+                page_counts[ key ] = None
+                continue
+
+            entry = cache.get( key )
+            if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+                page_counts[ key ] = entry[2]
+            else:
+                changed[ key ] = ( st.st_size, st.st_mtime_ns )
+
+        if not changed:
+            if stale:
+                save_page_count_cache()
+            return page_counts
+
+        files = list( changed )
+        workers = min( len( files ), os.cpu_count() or 1 )
+
+        if workers > 1:
+            with concurrent.futures.ProcessPoolExecutor( max_workers=workers ) as executor:
+                counts = list( executor.map( count_pages, files, chunksize=max( 1, len( files ) // ( workers * 4 ) ) ))
+        else:
+            counts = [ count_pages( file ) for file in files ]
+
+        for key, page_count in zip( files, counts ):
+            page_counts[ key ] = page_count
+            if page_count is not None:
+                cache[ key ] = [ *changed[ key ], page_count ]
+
+        save_page_count_cache()
+        return page_counts
+
+def get_page_count( path ):
+    return get_page_counts( [ path ] )[ str( path ) ]
+
 # ---------------------------------------------------------------------------------------
 
 class PDF():
@@ -101,6 +221,7 @@ class PDF():
         self.UseExternalMusicViewer =   self.conf.val( 'use_external_music_viewer' )
         self.ExternalMusicViewer    =   self.conf.val( 'external_music_viewer' )
         self.MusicFileRoot          =   self.conf.val( 'music_file_root' )
+        set_page_count_cache( Path( self.conf.home_confdir, self.conf.page_count_cache_file ))
 
     # --------------------------------------------------------------
     def set_window( self, window ):      # PySimpleGui window
@@ -296,10 +417,7 @@ class PDF():
     #   WRW 1 Feb 2022 - Need page count before PDF displayed. Here it is self contained.
 
     def get_page_count( self, file ):
-        doc = fitz.open( file )
-        page_count = doc.page_count
-        doc.close()
-        return page_count
+        return get_page_count( file )
 
     # --------------------------------------------------------------
     #   Get zoom factor from current graph size, not saved graph size, and page size.
@@ -9,16 +9,32 @@
 
 # -----------------------------------------------------------------------
 
-from collections import defaultdict
+import sys
+import queue
+import sqlite3
+from pathlib import Path
+import string
+import Levenshtein
+from collections import defaultdict, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import fb_utils
 
 # -----------------------------------------------------------------------
+#   WRW - Window_Count True to get the total count of matching rows from the search itself
+#       with 'COUNT(*) OVER ()' instead of repeating the WHERE in a separate 'SELECT COUNT(*)'.
+#       Sqlite has window functions since 3.25. Keep the second query for MySql, older
+#       servers don't have them.
 
 def set_driver( t1, t2, t3 ):
-    global MYSQL, SQLITE, FULLTEXT
+    global MYSQL, SQLITE, FULLTEXT, Window_Count, Count_Col
     MYSQL = t1
     SQLITE = t2
     FULLTEXT = t3
 
+    Window_Count = SQLITE and sqlite3.sqlite_version_info >= (3, 25, 0)
+    Count_Col = ", COUNT(*) OVER () AS cnt" if Window_Count else ""
+
 # -----------------------------------------------------------------------
 
 def set_classes( aconf, afb ):
@@ -41,6 +57,10 @@ def set_elements( tdc, tSelect_Limit, twindow, tstatus_bar ):
     global status_bar
     status_bar = tstatus_bar
 
+def set_dc( tdc ):
+    global dc
+    dc = tdc
+
 # -----------------------------------------------------------------------
 #   Add a plus sign in front of each word in val.
 
@@ -66,6 +86,24 @@ def nested_dict(n, type):           # Small enough to just duplicate in a couple
     else:
         return defaultdict(lambda: nested_dict(n-1, type))
 
+# ---------------------------------------------------------------------------
+#   WRW - Run search query and return rows and total count of matching rows.
+#       With Window_Count the count comes back in the 'cnt' column of every row, otherwise
+#       run count_query with the same WHERE. count_query is only executed in that case.
+
+def fetch_with_count( dc, query, count_query, data ):
+    dc.execute( fix_query( query ), data )
+    rows = dc.fetchall()
+
+    if Window_Count:
+        count = rows[0][ 'cnt' ] if rows else 0
+
+    else:
+        dc.execute( fix_query( count_query ), data )
+        count = dc.fetchone()[ 'cnt' ]
+
+    return rows, count
+
 # ---------------------------------------------------------------------------
 #   Select one of each canonical by src priority
 #   This, and the following, are now clean and simple. Not always so. It took quite
@@ -143,8 +181,21 @@ def strip_priority_data( data ):
     return res
 
 # -----------------------------------------------------------------------
+#   WRW - Page from sheet in the search query itself, same as fb.get_page_from_sheet() but
+#       without one SELECT per result row. Formatted with fb.book_keys().
+
+Page_Col = """( SELECT titles.sheet + sheet_offsets.sheet_offset
+                FROM sheet_offsets
+                WHERE {offsets_titles}
+                AND titles.sheet >= sheet_offsets.sheet_start
+                ORDER BY sheet_offsets.offset_id DESC
+                LIMIT 1 ) AS page"""
+
+# -----------------------------------------------------------------------
+
+#   WRW - title_ids, when given, replaces title with a list of title_id from do_query_fuzzy_title_ids().
 
-def do_query_music_file_index_with_join( dc, title, composer, lyricist, album, artist, src, canonical ):
+def do_query_music_file_index_with_join( dc, title, composer, lyricist, album, artist, src, canonical, title_ids=None ):
 
     # window.set_cursor( "clock" )      # looks terrible. With my own FULLTEXT don't need any 'busy' indicator.
     # window.refresh()
@@ -157,20 +208,19 @@ def do_query_music_file_index_with_join( dc, title, composer, lyricist, album, a
     # query = "SET PROFILING = 1"
     # dc.execute( query )
 
-    if title:
+    if title_ids:
+        wheres.append( f"titles_distinct.title_id IN ( {', '.join( [ '%s' ] * len( title_ids ))} )" )
+        data.extend( title_ids )
+
+    elif title:
         if MYSQL:
             wheres.append( "MATCH( titles_distinct.title ) AGAINST( %s IN BOOLEAN MODE )" )
             data.append( title )
 
         if SQLITE:
-            if FULLTEXT:
-                wheres.append( f"""titles_distinct_fts.title MATCH ?""" )
-                data.append( title )
-
-            else:
-                w, d = fb.get_fulltext( "titles_distinct.title", title )
-                wheres.append( w )
-                data.extend( d )
+            w, d = fb.get_fulltext( "titles_distinct.title", title )
+            wheres.append( w )
+            data.extend( d )
 
     if composer:
         if MYSQL:
@@ -178,13 +228,9 @@ def do_query_music_file_index_with_join( dc, title, composer, lyricist, album, a
             data.append( composer )
 
         if SQLITE:
-            if FULLTEXT:
-                wheres.append( f"""composer MATCH ?""" )
-                data.append( composer )
-            else:
-                w, d = fb.get_fulltext( "composer", composer )
-                wheres.append( w )
-                data.extend( d )
+            w, d = fb.get_fulltext( "titles.composer", composer )
+            wheres.append( w )
+            data.extend( d )
 
     if lyricist:
         if MYSQL:
@@ -192,13 +238,9 @@ def do_query_music_file_index_with_join( dc, title, composer, lyricist, album, a
             data.append( lyricist )
 
         if SQLITE:
-            if FULLTEXT:
-                wheres.append( f"""lyricist MATCH ?""" )
-                data.append( lyricist )
-            else:
-                w, d = fb.get_fulltext( "lyricist", lyricist )
-                wheres.append( w )
-                data.extend( d )
+            w, d = fb.get_fulltext( "titles.lyricist", lyricist )
+            wheres.append( w )
+            data.extend( d )
 
     if src:
         if MYSQL:
@@ -206,26 +248,18 @@ def do_query_music_file_index_with_join( dc, title, composer, lyricist, album, a
             data.append( src )
 
         if SQLITE:
-            if FULLTEXT:
-                wheres.append( f"""titles.src MATCH ?""" )
-                data.append( src )
-            else:
-                w, d = fb.get_fulltext( "titles.src", src )
-                wheres.append( w )
-                data.extend( d )
+            w, d = fb.get_fulltext( "titles.src", src )
+            wheres.append( w )
+            data.extend( d )
 
     if canonical:
         if MYSQL:
             wheres.append( "MATCH( local2canonical.canonical ) AGAINST( %s IN BOOLEAN MODE )" )
             data.append( canonical )
         if SQLITE:
-            if FULLTEXT:
-                wheres.append( f"""local2canonical.canonical MATCH ?""" )
-                data.append( canonical )
-            else:
-                w, d = fb.get_fulltext( "local2canonical.canonical", canonical )
-                wheres.append( w )
-                data.extend( d )
+            w, d = fb.get_fulltext( "local2canonical.canonical", canonical )
+            wheres.append( w )
+            data.extend( d )
 
     if album:
         if MYSQL:
@@ -236,17 +270,11 @@ def do_query_music_file_index_with_join( dc, title, composer, lyricist, album, a
             data.append( album )
 
         if SQLITE:
-            if FULLTEXT:
-                wheres.append( """titles_distinct.title IN
-                    ( SELECT title FROM audio_files
-                      WHERE album MATCH ? ) """ )
-                data.append( album )
-            else:
-                w, d = fb.get_fulltext( "album", album )
-                wheres.append( f"""titles_distinct.title IN
-                                   ( SELECT title FROM audio_files WHERE {w} )
-                                """ )
-                data.extend( d )
+            w, d = fb.get_fulltext( "audio_files.album", album )
+            wheres.append( f"""titles_distinct.title IN
+                               ( SELECT title FROM audio_files WHERE {w} )
+                            """ )
+            data.extend( d )
 
     if artist:
         if MYSQL:
@@ -257,17 +285,11 @@ def do_query_music_file_index_with_join( dc, title, composer, lyricist, album, a
             data.append( artist )
 
         if SQLITE:
-            if FULLTEXT:
-                wheres.append( """titles_distinct.title IN
-                    ( SELECT title FROM audio_files
-                      WHERE artist MATCH ? ) """ )
-                data.append( album )
-            else:
-                w, d = fb.get_fulltext( "artist", artist )
-                wheres.append( f"""titles_distinct.title IN
-                                   ( SELECT title FROM audio_files WHERE {w} )
-                                """ )
-                data.extend( d )
+            w, d = fb.get_fulltext( "audio_files.artist", artist )
+            wheres.append( f"""titles_distinct.title IN
+                               ( SELECT title FROM audio_files WHERE {w} )
+                            """ )
+            data.extend( d )
 
 
     # -----------------------------------------------------------------------
@@ -277,27 +299,35 @@ def do_query_music_file_index_with_join( dc, title, composer, lyricist, album, a
     if len( data ):
         where_clauses = "WHERE " + " AND ".join( wheres )
 
+        #   WRW - Joins on the integer keys from the books step of build_tables.py, on src/local and
+        #       canonical for a database built before it, see fb.book_keys().
+
+        k = fb.book_keys()
+        page_col = Page_Col.format( **k )
+        canonicals_join = f"JOIN canonicals ON {k['canonicals_l2c']}"
+
         # local2canonical_join = 'JOIN local2canonical USING( local, src )'
-        local2canonical_join = 'JOIN local2canonical ON (local2canonical.local = titles.local AND local2canonical.src = titles.src)'
+        # local2canonical_join = 'JOIN local2canonical ON (local2canonical.local = titles.local AND local2canonical.src = titles.src)'
+        local2canonical_join = f"JOIN local2canonical ON {k['titles_l2c']}"
 
         if conf.val( 'include_titles_missing_file' ):
             # canonical2file_join = 'LEFT JOIN canonical2file USING( canonical )'
-            canonical2file_join = 'LEFT JOIN canonical2file ON canonical2file.canonical = canonicals.canonical'
+            canonical2file_join = f"LEFT JOIN canonical2file ON {k['c2f_canonicals']}"
         else:
             # canonical2file_join = 'JOIN canonical2file USING( canonical )'
-            canonical2file_join = 'JOIN canonical2file ON canonical2file.canonical = canonicals.canonical'
+            canonical2file_join = f"JOIN canonical2file ON {k['c2f_canonicals']}"
 
         # ---------------------------------------------------------------------------
         if MYSQL:
             query = f"""
                 SELECT titles_distinct.title, titles.composer, titles.sheet, titles.src, titles.local,
-                local2canonical.canonical, canonical2file.file,
+                local2canonical.canonical, canonical2file.file, {page_col},
                 src_priority.priority AS src_priority, canonicals.priority AS canonical_priority /* WRW 9 Apr 2022 - added */
                 FROM titles_distinct
                 JOIN titles USING( title_id )
                 JOIN src_priority ON src_priority.src = titles.src                      /* WRW 9 Apr 2022 - added */
                 {local2canonical_join}
-                JOIN canonicals ON canonicals.canonical = local2canonical.canonical     /* WRW 9 Apr 2022 - added */
+                {canonicals_join}                                                       /* WRW 9 Apr 2022 - added */
                 {canonical2file_join}
                 {where_clauses}
                 ORDER BY titles_distinct.title, local2canonical.canonical, titles.src   
@@ -313,41 +343,39 @@ def do_query_music_file_index_with_join( dc, title, composer, lyricist, album, a
         #   order of JOIN to resolve.
 
         if SQLITE:
-            if FULLTEXT:
-                query = f"""
-                    SELECT titles_distinct_fts.title,
-                    titles.composer, titles.sheet, titles.src, titles.local,
-                    local2canonical.canonical, canonical2file.file,
-                    src_priority.priority AS src_priority, canonicals.priority AS canonical_priority /* WRW 9 Apr 2022 - added */
-                    FROM titles_distinct_fts
-                    JOIN titles USING( title_id )
-                    JOIN src_priority ON src_priority.src = titles.src                      /* WRW 9 Apr 2022 - added */
-                    {local2canonical_join}
-                    JOIN canonicals ON canonicals.canonical = local2canonical.canonical     /* WRW 9 Apr 2022 - added */
-                    {canonical2file_join}
-                    {where_clauses}
-                    ORDER BY rank
-                    LIMIT {Select_Limit}
-                """
-
-            else:
-                query = f"""
-                    SELECT titles_distinct.title,
-                    titles.composer, titles.sheet, titles.src, titles.local,
-                    local2canonical.canonical, canonical2file.file,
-                    src_priority.priority AS src_priority, canonicals.priority AS canonical_priority    /* WRW 9 Apr 2022 - added */
-                    FROM titles_distinct
-                    JOIN titles USING( title_id )
-                    JOIN src_priority ON src_priority.src = titles.src                      /* WRW 9 Apr 2022 - added */
-                    {local2canonical_join}
-                    JOIN canonicals ON canonicals.canonical = local2canonical.canonical     /* WRW 9 Apr 2022 - added */
-                    {canonical2file_join}
-                    {where_clauses}
-                    ORDER BY titles_distinct.title, local2canonical.canonical, titles.src   
-                    LIMIT {Select_Limit}
-                """
-
-        query = fix_query( query )      # Replace %s with ? for SQLITE
+            query = f"""
+                SELECT titles_distinct.title,
+                titles.composer, titles.sheet, titles.src, titles.local,
+                local2canonical.canonical, canonical2file.file, {page_col},
+                src_priority.priority AS src_priority, canonicals.priority AS canonical_priority    /* WRW 9 Apr 2022 - added */
+                {Count_Col}
+                FROM titles_distinct
+                JOIN titles USING( title_id )
+                JOIN src_priority ON src_priority.src = titles.src                      /* WRW 9 Apr 2022 - added */
+                {local2canonical_join}
+                {canonicals_join}                                                       /* WRW 9 Apr 2022 - added */
+                {canonical2file_join}
+                {where_clauses}
+                ORDER BY titles_distinct.title, local2canonical.canonical, titles.src   
+                LIMIT {Select_Limit}
+            """
+
+        if MYSQL:
+            count_query = f"""
+                SELECT count(*) cnt
+                FROM titles_distinct
+                JOIN titles USING( title_id )
+                {local2canonical_join}
+                {where_clauses}
+            """
+        if SQLITE:
+            count_query = f"""
+                SELECT count(*) cnt
+                FROM titles_distinct
+                JOIN titles USING( title_id )
+                {local2canonical_join}
+                {where_clauses}
+            """
 
         if False:
             print( "Query", query )
@@ -356,8 +384,7 @@ def do_query_music_file_index_with_join( dc, title, composer, lyricist, album, a
         # ---------------------------------------------------------------------
         #   WRW 10 Apr 2022 - switch from list to dict.
 
-        dc.execute( query, data )
-        rows = dc.fetchall()
+        rows, count = fetch_with_count( dc, query, count_query, data )
 
         # headings = [ "Title", "Composer", "Canonical Book Name", "Page", "Sheet", "Source", "Local Book Name", "File" ],
 
@@ -374,7 +401,7 @@ def do_query_music_file_index_with_join( dc, title, composer, lyricist, album, a
                 # canonical_priority = row[ 'canonical_priority' ]                              # WRW 9 Apr 2022 - added
 
                 # page = fb.get_page_from_sheet( sheet, src, local )
-                page = fb.get_page_from_sheet( row[ 'sheet' ], row[ 'src' ], row[ 'local' ] )
+                page = str( int( row[ 'page' ] )) if row[ 'page' ] is not None else None    # WRW - Now from Page_Col in query.
 
                 # table.append( [ src_priority, canonical_priority, title, composer, canonical, page, sheet, src, local, file ] )
 
@@ -390,36 +417,6 @@ def do_query_music_file_index_with_join( dc, title, composer, lyricist, album, a
                                 'file' : row[ 'file' ]
                                } )
 
-        if MYSQL:
-            query = f"""
-                SELECT count(*) cnt
-                FROM titles_distinct
-                JOIN titles USING( title_id )
-                {local2canonical_join}
-                {where_clauses}
-            """
-        if SQLITE:
-            if FULLTEXT:
-                query = f"""
-                    SELECT count(*) cnt
-                    FROM titles_distinct_fts
-                    JOIN titles USING( title_id )
-                    {local2canonical_join}
-                    {where_clauses}
-                """
-            else:
-                query = f"""
-                    SELECT count(*) cnt
-                    FROM titles_distinct
-                    JOIN titles USING( title_id )
-                    {local2canonical_join}
-                    {where_clauses}
-                """
-
-        query = fix_query( query )
-        dc.execute( query, data )
-        count = dc.fetchone()[ 'cnt' ]
-
     return (table, count)
 
 # --------------------------------------------------------------------------
@@ -454,14 +451,9 @@ def do_query_audio_files_index( dc, title, album, artist ):
             data.append( title )
 
         if SQLITE:
-            if FULLTEXT:
-                wheres.append( f"""title MATCH ?""" )
-                data.append( title )
-
-            else:
-                w, d = fb.get_fulltext( "title", title )
-                wheres.append( w )
-                data.extend( d )
+            w, d = fb.get_fulltext( "audio_files.title", title )
+            wheres.append( w )
+            data.extend( d )
 
     if album:
         if MYSQL:
@@ -469,13 +461,9 @@ def do_query_audio_files_index( dc, title, album, artist ):
             data.append( album )
 
         if SQLITE:
-            if FULLTEXT:
-                wheres.append( f"""album MATCH ?""" )
-                data.append( album )
-            else:
-                w, d = fb.get_fulltext( "album", album )
-                wheres.append( w )
-                data.extend( d )
+            w, d = fb.get_fulltext( "audio_files.album", album )
+            wheres.append( w )
+            data.extend( d )
 
     if artist:
         if MYSQL:
@@ -483,13 +471,9 @@ def do_query_audio_files_index( dc, title, album, artist ):
             data.append( artist)
 
         if SQLITE:
-            if FULLTEXT:
-                wheres.append( f"""artist MATCH ?""" )
-                data.append( artist )
-            else:
-                w, d = fb.get_fulltext( "artist", artist )
-                wheres.append( w )
-                data.extend( d )
+            w, d = fb.get_fulltext( "audio_files.artist", artist )
+            wheres.append( w )
+            data.extend( d )
 
     # ---------------------------------------------------
 
@@ -505,26 +489,28 @@ def do_query_audio_files_index( dc, title, album, artist ):
                 LIMIT {Select_Limit}
             """
         if SQLITE:
-            if FULLTEXT:
-                query = f"""
-                    SELECT title, artist, album, file
-                    FROM audio_files_fts
-                    {where}
-                    ORDER BY title, artist   
-                    LIMIT {Select_Limit}
-                """
-            else:
-                query = f"""
-                    SELECT title, artist, album, file
-                    FROM audio_files
-                    {where}
-                    ORDER BY title, artist   
-                    LIMIT {Select_Limit}
-                """
-
-        query = fix_query( query )
-        dc.execute( query, data )
-        rows = dc.fetchall()
+            query = f"""
+                SELECT title, artist, album, file {Count_Col}
+                FROM audio_files
+                {where}
+                ORDER BY title, artist   
+                LIMIT {Select_Limit}
+            """
+
+        if MYSQL:
+            count_query = f"""
+                SELECT COUNT(*) cnt
+                FROM audio_files
+                {where}
+            """
+        if SQLITE:
+            count_query = f"""
+                SELECT COUNT(*) cnt
+                FROM audio_files    
+                {where}
+            """
+
+        rows, count = fetch_with_count( dc, query, count_query, data )
 
         if rows:
             for row in rows:
@@ -534,30 +520,6 @@ def do_query_audio_files_index( dc, title, album, artist ):
                 file = row[ 'file' ]
                 table.append( [ title, artist, album, file ] )
 
-        if MYSQL:
-            query = f"""
-                SELECT COUNT(*) cnt
-                FROM audio_files
-                {where}
-            """
-        if SQLITE:
-            if FULLTEXT:
-                query = f"""
-                    SELECT COUNT(*) cnt
-                    FROM audio_files_fts
-                    {where}
-                """
-            else:
-                query = f"""
-                    SELECT COUNT(*) cnt
-                    FROM audio_files    
-                    {where}
-                """
-
-        query = fix_query( query )
-        dc.execute( query, data )
-        count = dc.fetchone()[ 'cnt' ]
-
     return table, count
 
 # --------------------------------------------------------------------------
@@ -578,21 +540,13 @@ def do_query_music_filename( dc, title ):
             data.append( title )
 
         if SQLITE:
-            if FULLTEXT:
-                wheres.append( f"""rpath MATCH ?""" )
-                data.append( title )
-
-                wheres.append( f"""file MATCH ?""" )
-                data.append( title )
-
-            else:
-                w, d = fb.get_fulltext( "rpath", title )
-                wheres.append( w )
-                data.extend( d )
+            w, d = fb.get_fulltext( "music_files.rpath", title )
+            wheres.append( w )
+            data.extend( d )
 
-                w, d = fb.get_fulltext( "file", title )
-                wheres.append( w )
-                data.extend( d )
+            w, d = fb.get_fulltext( "music_files.file", title )
+            wheres.append( w )
+            data.extend( d )
 
     if len( data ):
 
@@ -607,59 +561,36 @@ def do_query_music_filename( dc, title ):
                 LIMIT {Select_Limit}
             """
         if SQLITE:
-            if FULLTEXT:
-                query = f"""
-                    SELECT rpath, file
-                    FROM music_files_fts
-                    {where}
-                    ORDER BY rpath, file   
-                    LIMIT {Select_Limit}
-                """
-            else:
-                query = f"""
-                    SELECT rpath, file
-                    FROM music_files
-                    {where}
-                    ORDER BY rpath, file   
-                    LIMIT {Select_Limit}
-                """
-
-        query = fix_query( query )
-        dc.execute( query, data )
-        rows = dc.fetchall()
-
-        if rows:
-            for row in rows:
-                rpath = row[ 'rpath' ]
-                file = row[ 'file' ]
-                table.append( [ rpath, file ] )
+            query = f"""
+                SELECT rpath, file {Count_Col}
+                FROM music_files
+                {where}
+                ORDER BY rpath, file   
+                LIMIT {Select_Limit}
+            """
 
         if MYSQL:
-            query = f"""
+            count_query = f"""
                 SELECT COUNT(*) cnt
                 FROM music_files
                 {where}
                 LIMIT {Select_Limit}
             """
         if SQLITE:
-            if FULLTEXT:
-                query = f"""
-                    SELECT COUNT(*) cnt
-                    FROM music_files_fts
-                    {where}
-                    LIMIT {Select_Limit}
-                """
-            else:
-                query = f"""
-                    SELECT COUNT(*) cnt
-                    FROM music_files
-                    {where}
-                    LIMIT {Select_Limit}
-                """
-
-        query = fix_query( query )
-        dc.execute( query, data )
-        count = dc.fetchone()[ 'cnt' ]
+            count_query = f"""
+                SELECT COUNT(*) cnt
+                FROM music_files
+                {where}
+                LIMIT {Select_Limit}
+            """
+
+        rows, count = fetch_with_count( dc, query, count_query, data )
+
+        if rows:
+            for row in rows:
+                rpath = row[ 'rpath' ]
+                file = row[ 'file' ]
+                table.append( [ rpath, file ] )
 
     return table, count
 
@@ -681,21 +612,13 @@ def do_query_midi_filename( dc, title ):
             data.append( title )
 
         if SQLITE:
-            if FULLTEXT:
-                wheres.append( "rpath MATCH ?" )
-                data.append( title )
-
-                wheres.append( "file MATCH ?" )
-                data.append( title )
+            w, d = fb.get_fulltext( "midi_files.rpath", title )
+            wheres.append( w )
+            data.extend( d )
 
-            else:
-                w, d = fb.get_fulltext( "rpath", title )
-                wheres.append( w )
-                data.extend( d )
-
-                w, d = fb.get_fulltext( "file", title )                                          
-                wheres.append( w )
-                data.extend( d )
+            w, d = fb.get_fulltext( "midi_files.file", title )                                          
+            wheres.append( w )
+            data.extend( d )
 
     if len( data ):
         where = "WHERE " + " OR ".join( wheres )
@@ -708,57 +631,33 @@ def do_query_midi_filename( dc, title ):
                 LIMIT {Select_Limit}
             """
         if SQLITE:
-            if FULLTEXT:
-                query = f"""
-                    SELECT rpath, file
-                    FROM midi_files_fts
-                    {where}
-                    ORDER BY rpath, file   
-                    LIMIT {Select_Limit}
-                """
-            else:
-                query = f"""
-                    SELECT rpath, file
-                    FROM midi_files
-                    {where}
-                    ORDER BY rpath, file   
-                    LIMIT {Select_Limit}
-                """
-
-        query = fix_query( query )
-
-        dc.execute( query, data )
-        rows = dc.fetchall()
-
-        if rows:
-            table = [ [ row[ 'rpath' ], row[ 'file' ] ] for row in rows ]
+            query = f"""
+                SELECT rpath, file {Count_Col}
+                FROM midi_files
+                {where}
+                ORDER BY rpath, file   
+                LIMIT {Select_Limit}
+            """
 
         if MYSQL:
-            query = f"""
+            count_query = f"""
                 SELECT COUNT(*) cnt
                 FROM midi_files
                 {where}
                 LIMIT {Select_Limit}
             """
         if SQLITE:
-            if FULLTEXT:
-                query = f"""
-                    SELECT COUNT(*) cnt
-                    FROM midi_files_fts
-                    {where}
-                    LIMIT {Select_Limit}
-                """
-            else:
-                query = f"""
-                    SELECT COUNT(*) cnt
-                    FROM midi_files
-                    {where}
-                    LIMIT {Select_Limit}
-                """
-
-        query = fix_query( query )
-        dc.execute( query, data )
-        count = dc.fetchone()[ 'cnt' ]
+            count_query = f"""
+                SELECT COUNT(*) cnt
+                FROM midi_files
+                {where}
+                LIMIT {Select_Limit}
+            """
+
+        rows, count = fetch_with_count( dc, query, count_query, data )
+
+        if rows:
+            table = [ [ row[ 'rpath' ], row[ 'file' ] ] for row in rows ]
 
     return table, count
 
@@ -776,14 +675,9 @@ def do_query_chordpro( dc, title, artist ):
             data.append( title )
 
         if SQLITE:
-            if FULLTEXT:
-                wheres.append( "title MATCH ?" )
-                data.append( title )
-
-            else:
-                w, d = fb.get_fulltext( "title", title )
-                wheres.append( w )
-                data.extend( d )
+            w, d = fb.get_fulltext( "chordpro_files.title", title )
+            wheres.append( w )
+            data.extend( d )
 
     if artist:
         if MYSQL:
@@ -791,14 +685,9 @@ def do_query_chordpro( dc, title, artist ):
             data.append( artist )
 
         if SQLITE:
-            if FULLTEXT:
-                wheres.append( "artist MATCH ?" )
-                data.append( artist )
-
-            else:
-                w, d = fb.get_fulltext( "artist", artist )
-                wheres.append( w )
-                data.extend( d )
+            w, d = fb.get_fulltext( "chordpro_files.artist", artist )
+            wheres.append( w )
+            data.extend( d )
 
     if len( data ):
         where = "WHERE " + " AND ".join( wheres )
@@ -811,57 +700,33 @@ def do_query_chordpro( dc, title, artist ):
                 LIMIT {Select_Limit}
             """
         if SQLITE:
-            if FULLTEXT:
-                query = f"""
-                    SELECT title, artist, file
-                    FROM chordpro_files_fts
-                    {where}
-                    ORDER BY title, artist, file
-                    LIMIT {Select_Limit}
-                """
-            else:
-                query = f"""
-                    SELECT title, artist, file
-                    FROM chordpro_files
-                    {where}
-                    ORDER BY title, artist, file
-                    LIMIT {Select_Limit}
-                """
-
-        query = fix_query( query )
-
-        dc.execute( query, data )
-        rows = dc.fetchall()
-
-        if rows:
-            table = [ [ row[ 'title' ], row[ 'artist' ], row[ 'file' ] ] for row in rows ]
+            query = f"""
+                SELECT title, artist, file {Count_Col}
+                FROM chordpro_files
+                {where}
+                ORDER BY title, artist, file
+                LIMIT {Select_Limit}
+            """
 
         if MYSQL:
-            query = f"""
+            count_query = f"""
                 SELECT COUNT(*) cnt
                 FROM chordpro_files
                 {where}
                 LIMIT {Select_Limit}
             """
         if SQLITE:
-            if FULLTEXT:
-                query = f"""
-                    SELECT COUNT(*) cnt
-                    FROM chordpro_files_fts
-                    {where}
-                    LIMIT {Select_Limit}
-                """
-            else:
-                query = f"""
-                    SELECT COUNT(*) cnt
-                    FROM chordpro_files
-                    {where}
-                    LIMIT {Select_Limit}
-                """
-
-        query = fix_query( query )
-        dc.execute( query, data )
-        count = dc.fetchone()[ 'cnt' ]
+            count_query = f"""
+                SELECT COUNT(*) cnt
+                FROM chordpro_files
+                {where}
+                LIMIT {Select_Limit}
+            """
+
+        rows, count = fetch_with_count( dc, query, count_query, data )
+
+        if rows:
+            table = [ [ row[ 'title' ], row[ 'artist' ], row[ 'file' ] ] for row in rows ]
 
     return table, count
 
@@ -880,14 +745,9 @@ def do_query_jjazz_filename( dc, title ):
             data.append( title )
 
         if SQLITE:
-            if FULLTEXT:
-                wheres.append( "title MATCH ?" )
-                data.append( title )
-
-            else:
-                w, d = fb.get_fulltext( "title", title )
-                wheres.append( w )
-                data.extend( d )
+            w, d = fb.get_fulltext( "jjazz_files.title", title )
+            wheres.append( w )
+            data.extend( d )
 
     if len( data ):
         where = "WHERE " + " OR ".join( wheres )
@@ -900,57 +760,33 @@ def do_query_jjazz_filename( dc, title ):
                 LIMIT {Select_Limit}
             """
         if SQLITE:
-            if FULLTEXT:
-                query = f"""
-                    SELECT title, file
-                    FROM jjazz_files_fts
-                    {where}
-                    ORDER BY title, file
-                    LIMIT {Select_Limit}
-                """
-            else:
-                query = f"""
-                    SELECT title, file
-                    FROM jjazz_files
-                    {where}
-                    ORDER BY title, file
-                    LIMIT {Select_Limit}
-                """
-
-        query = fix_query( query )
-
-        dc.execute( query, data )
-        rows = dc.fetchall()
-
-        if rows:
-            table = [ [ row[ 'title' ], row[ 'file' ] ] for row in rows ]
+            query = f"""
+                SELECT title, file {Count_Col}
+                FROM jjazz_files
+                {where}
+                ORDER BY title, file
+                LIMIT {Select_Limit}
+            """
 
         if MYSQL:
-            query = f"""
+            count_query = f"""
                 SELECT COUNT(*) cnt
                 FROM jjazz_files
                 {where}
                 LIMIT {Select_Limit}
             """
         if SQLITE:
-            if FULLTEXT:
-                query = f"""
-                    SELECT COUNT(*) cnt
-                    FROM jjazz_files_fts
-                    {where}
-                    LIMIT {Select_Limit}
-                """
-            else:
-                query = f"""
-                    SELECT COUNT(*) cnt
-                    FROM jjazz_files
-                    {where}
-                    LIMIT {Select_Limit}
-                """
-
-        query = fix_query( query )
-        dc.execute( query, data )
-        count = dc.fetchone()[ 'cnt' ]
+            count_query = f"""
+                SELECT COUNT(*) cnt
+                FROM jjazz_files
+                {where}
+                LIMIT {Select_Limit}
+            """
+
+        rows, count = fetch_with_count( dc, query, count_query, data )
+
+        if rows:
+            table = [ [ row[ 'title' ], row[ 'file' ] ] for row in rows ]
 
     return table, count
 
@@ -976,51 +812,25 @@ def do_query_youtube_index( dc, title ):
             data.append( title )
 
         if SQLITE:
-            if FULLTEXT:
-                query = f"""
-                    SELECT title,
-                    title2youtube.ytitle, title2youtube.duration, title2youtube.yt_id
-                    FROM titles_distinct_fts
-                    JOIN title2youtube USING( title_id )
-                    WHERE titles_distinct_fts.title MATCH ?
-                    ORDER BY titles_distinct.title, title2youtube.ytitle   
-                    LIMIT {Select_Limit}
-                """
-                data.append( title )
-
-            else:
-                w, d = fb.get_fulltext( "titles_distinct.title", title )
-                data.extend( d )
-
-                query = f"""
-                    SELECT title,
-                    title2youtube.ytitle, title2youtube.duration, title2youtube.yt_id
-                    FROM titles_distinct
-                    JOIN title2youtube USING( title_id )
-                    WHERE {w}
-                    ORDER BY titles_distinct.title, title2youtube.ytitle   
-                    LIMIT {Select_Limit}
-                """
-
-        query = fix_query( query )
+            w, d = fb.get_fulltext( "titles_distinct.title", title )
+            data.extend( d )
+
+            query = f"""
+                SELECT title,
+                title2youtube.ytitle, title2youtube.duration, title2youtube.yt_id {Count_Col}
+                FROM titles_distinct
+                JOIN title2youtube USING( title_id )
+                WHERE {w}
+                ORDER BY titles_distinct.title, title2youtube.ytitle   
+                LIMIT {Select_Limit}
+            """
 
     # --------------------------------------------------------------------
 
     if len( data ):
-        dc.execute( query, data )
-        rows = dc.fetchall()
-
-        if rows:
-            for row in rows:
-                title = row[ 'title' ]
-                ytitle = row[ 'ytitle' ]
-                duration = row[ 'duration' ]
-                yt_id = row[ 'yt_id' ]
-                table.append( [ title, ytitle, duration, yt_id ] )
-
         # data = []
         if MYSQL:
-            query = f"""
+            count_query = f"""
                 SELECT COUNT(*) cnt
                 FROM titles_distinct
                 JOIN title2youtube ON title2youtube.title_id = titles_distinct.title_id
@@ -1029,37 +839,31 @@ def do_query_youtube_index( dc, title ):
             # data.append( title )
 
         if SQLITE:
-            if FULLTEXT:
-                query = f"""
-                    SELECT COUNT(*) cnt
-                    FROM titles_distinct_fts
-                    JOIN title2youtube USING( title_id )
-                    WHERE titles_distinct_fts.title MATCH ?
-                """
-                # data.append( title )
-
-            else:
-                # w, d = fb.get_fulltext( "titles_distinct.title", title )
-                query = f"""
-                    SELECT COUNT(*) cnt
-                    FROM titles_distinct
-                    JOIN title2youtube USING( title_id )
-                    WHERE {w}
-                """
-                # data.extend( d )
-
-        query = fix_query( query )
-        dc.execute( query, data )
-        count = dc.fetchone()[ 'cnt' ]
+            # w, d = fb.get_fulltext( "titles_distinct.title", title )
+            count_query = f"""
+                SELECT COUNT(*) cnt
+                FROM titles_distinct
+                JOIN title2youtube USING( title_id )
+                WHERE {w}
+            """
+            # data.extend( d )
+
+        rows, count = fetch_with_count( dc, query, count_query, data )
+
+        if rows:
+            for row in rows:
+                title = row[ 'title' ]
+                ytitle = row[ 'ytitle' ]
+                duration = row[ 'duration' ]
+                yt_id = row[ 'yt_id' ]
+                table.append( [ title, ytitle, duration, yt_id ] )
 
     return table, count
 
 # --------------------------------------------------------------------------
 
 def process_events( event, values ):
-    global indexed_music_file_table_data, audio_file_table_data, music_file_table_data, midi_file_table_data
-    global youtube_file_table_data, chordpro_file_table_data, jjazz_file_table_data
-    
+
     if( event == 'search' or                        #   Search button or 'Enter' in search text boxes.
         event == 'exclude-duplicate-none' or        #   Also events when these buttons change.
         event == 'exclude-duplicate-titles' or
@@ -1102,146 +906,375 @@ def process_events( event, values ):
             pass
 
         # ---------------------------------------
-        #   Initialize all tables to no data. Update tables only when matched search selection.
+        #   Supersede any search still running, initialize all tables to no data.
+        #   Update tables only when matched search selection.
 
-        indexed_music_file_table_data = music_file_table_data = audio_file_table_data = \
-            midi_file_table_data = youtube_file_table_data = chordpro_file_table_data = jjazz_file_table_data = []
+        cancel_searches()
+        check_search_cache()
 
-        # ------------------------------------------------------------------------------
-        #   Search music filename, audio file index, youtube index in database.
-        #       Update associated tables.
+        for table, tab, focus, setter in Search_Tables:
+            Search_Results[ table ] = []
+
+        Search_Pending.clear()
+        Search_Pending.update( [ x[0] for x in Search_Tables ] )
+
+        fb.have_book_keys()                 # Check in main thread, the queries run in the pool threads.
 
-        #   Select first tab for search results found going from left to right.
-        #       Leave select/focus as is if nothing found.
+        if SQLITE:                          # Check in main thread, get_fulltext() runs in the pool threads.
+            fb.have_word_index()
+            if FULLTEXT:
+                fb.have_fts_index()
+
+        # ------------------------------------------------------------------------------
+        #   Search music index, music filename, audio file index, midi, chordpro, jjazz and
+        #       youtube index in database. Update associated tables as each one completes.
 
         #   /// RESUME OK - include additional search terms in do_query*() functions?
 
-        # ---------------------------------------
-        #   Set True when first tab selected. Don't select others after that.
+        start_search( 'indexed-music-file-table', do_query_music_index,
+                      ( title, composer, lyricist, album, artist, src, canonical, join_flag ),
+                      lambda data: exclude_duplicates( data, exclude_duplicate_titles, exclude_duplicate_canonicals, exclude_duplicate_srcs ))
 
-        tab_selected = False
+        start_search( 'music-filename-table', do_query_music_filename, ( title, ) )
+        start_search( 'audio-file-table', do_query_audio_files_index, ( title, album, artist ) )
+        start_search( 'midi-file-table', do_query_midi_filename, ( title, ) )                   # WRW 8 Feb 2022 - Add support for midi files
+        start_search( 'current-chordpro-table', do_query_chordpro, ( title, artist ) )          # WRW 27 Apr 2022 - Add support for chordpro files
+        start_search( 'current-jjazz-table', do_query_jjazz_filename, ( title, ) )              # WRW 27 Apr 2022 - Add support for jjazz files
+        start_search( 'youtube-file-table', do_query_youtube_index, ( title, ) )
 
-        # ---------------------------------------
-        if join_flag:
-            indexed_music_file_table_data, pdf_count = do_query_music_file_index_with_join( dc, title, composer, lyricist, album, artist, src, canonical )
-        else:
-            indexed_music_file_table_data, pdf_count = do_query_music_file_index( dc, title, composer, lyricist, src, canonical )
+        return True
+
+    # --------------------------------------------------------------------------
+    #   One search completed in the pool, posted by run_search() with write_event_value().
+    #   Ignore results of a superseded search.
+
+    elif event == 'search-result':
+        generation, table, key, result = values[ 'search-result' ]
+        if generation == Search_Generation:
+            if result:
+                cache_search_result( key, result )
+            show_search_result( table, result or ( [], 0 ))
+        return True
 
-        # ------------------------
-        #   WRW 10 Apr 2022 - Changed this around a bit, now disjoint selection via radio buttons.
+    # --------------------------------------------------------------------------
 
-        if exclude_duplicate_titles:
-            indexed_music_file_table_data = select_unique_titles( indexed_music_file_table_data )
+    else:
+        return False
 
-        elif exclude_duplicate_canonicals:
-            indexed_music_file_table_data = select_unique_canonicals( indexed_music_file_table_data )
+# --------------------------------------------------------------------------
+#   WRW - Music index query. Duplicate exclusion is applied later by exclude_duplicates()
+#       so the raw result can be cached and reused when only the exclusion buttons change.
 
-        elif exclude_duplicate_srcs:
-            indexed_music_file_table_data = select_unique_srcs( indexed_music_file_table_data )
+#   WRW - When a title search finds nothing try again with the closest titles, see do_query_fuzzy_title_ids().
 
-        # ------------------------
-        indexed_music_file_table_data = strip_priority_data( indexed_music_file_table_data )
+def do_query_music_index( dc, title, composer, lyricist, album, artist, src, canonical, join_flag ):
+    if not join_flag:
+        album = artist = None
 
-        fb.safe_update( window['indexed-music-file-table'] , indexed_music_file_table_data, None )
+    data, count = do_query_music_file_index_with_join( dc, title, composer, lyricist, album, artist, src, canonical )
 
-        if len( indexed_music_file_table_data ):
-            window.Element( 'tab-indexed-music-file-table' ).select()
-            window.Element( 'tab-display-pdf' ).set_focus()
-            tab_selected = True
+    if not data and title and SQLITE:
+        title_ids = do_query_fuzzy_title_ids( dc, title )
+        if title_ids:
+            data, count = do_query_music_file_index_with_join( dc, None, composer, lyricist, album, artist, src, canonical, title_ids )
+            rank = { title : i for i, title in enumerate( title_ids.values() ) }
+            data = sorted( data, key = lambda x: rank.get( x[ 'title' ], len( rank ) ))
 
-        # ---------------------------------------
-        music_file_table_data, music_count = do_query_music_filename( dc, title )
-        fb.safe_update( window['music-filename-table'], music_file_table_data, None )
-
-        if len( music_file_table_data  ) and not tab_selected:
-            window.Element( 'tab-music-filename-table' ).select()
-            window.Element( 'tab-music-filename-table' ).set_focus()
-            tab_selected = True
-
-        # -----------------------
-        audio_file_table_data, audio_count = do_query_audio_files_index( dc, title, album, artist )
-        fb.safe_update( window['audio-file-table'], audio_file_table_data, None )
-
-        if len( audio_file_table_data  ) and not tab_selected:
-            window.Element( 'tab-audio-file-table' ).select()
-            window.Element( 'tab-audio-file-table' ).set_focus()
-            tab_selected = True
-
-        # -----------------------
-        #   WRW 8 Feb 2022 - Add support for midi files
-        midi_file_table_data, midi_count = do_query_midi_filename( dc, title )
-        fb.safe_update( window['midi-file-table'], midi_file_table_data, None )
-
-        if len( midi_file_table_data  ) and not tab_selected:
-            window.Element( 'tab-midi-file-table' ).select()
-            window.Element( 'tab-midi-file-table' ).set_focus()
-            tab_selected = True
-
-        # -----------------------
-        #   WRW 27 Apr 2022 - Add support for chordpro files
-
-        chordpro_file_table_data, chordpro_count = do_query_chordpro( dc, title, artist )
-        fb.safe_update( window['current-chordpro-table'], chordpro_file_table_data, None )
-
-        if len( chordpro_file_table_data  ) and not tab_selected:
-            window.Element( 'tab-chordpro-index-table' ).select()
-            window.Element( 'tab-chordpro-index-table' ).set_focus()
-            tab_selected = True
-
-        # -----------------------
-        #   WRW 27 Apr 2022 - Add support for jjazz files
-        jjazz_file_table_data, jjazz_count = do_query_jjazz_filename( dc, title )
-        fb.safe_update( window['current-jjazz-table'], jjazz_file_table_data, None )
-
-        if len( jjazz_file_table_data  ) and not tab_selected:
-            window.Element( 'tab-jjazzlab-index-table' ).select()
-            window.Element( 'tab-jjazzlab-index-table' ).set_focus()
-            tab_selected = True
-
-        # -----------------------
-        youtube_file_table_data, youtube_count = do_query_youtube_index( dc, title )
-        fb.safe_update( window['youtube-file-table'], youtube_file_table_data, None )
-
-        if len( youtube_file_table_data  ) and not tab_selected:
-            window.Element( 'tab-youtube-table' ).select()
-            window.Element( 'tab-youtube-table' ).set_focus()
-            tab_selected = True
-
-        # ------------------------------------------------------------
-        #   Post result counts to status bar
-
-        status_bar.set_music_index( pdf_count, len(indexed_music_file_table_data) )
-        status_bar.set_audio_index( audio_count, len(audio_file_table_data) )
-        status_bar.set_music_files( music_count, len(music_file_table_data) )
-        status_bar.set_midi_files( midi_count, len(midi_file_table_data) )
-        status_bar.set_chordpro_files( chordpro_count, len(chordpro_file_table_data) )
-        status_bar.set_jjazz_files( jjazz_count, len(jjazz_file_table_data) )
-        status_bar.set_youtube_index( youtube_count, len(youtube_file_table_data) )
-        status_bar.show()
+    return data, count
 
-        return True
+# --------------------------------------------------------------------------
+#   WRW - Typo-tolerant title search. Candidates are the titles sharing the most trigrams
+#       with title in title_trigrams, built by build_tables.py, ranked by edit distance
+#       on the normalized titles. Return up to Fuzzy_Limit { title_id : title }, best first,
+#       only those within Fuzzy_Distance of title. Sqlite only.
+
+Fuzzy_Limit = 10
+Fuzzy_Candidates = 100
+
+def fuzzy_distance( key ):
+    return max( 2, len( key ) // 2 )
+
+def do_query_fuzzy_title_ids( dc, title ):
+    key = fb_utils.fuzzy_key( title )
+    trigrams = sorted( fb_utils.title_trigrams( title ) )
+    if not key:
+        return {}
+
+    query = f"""
+        SELECT title_id, title
+        FROM titles_distinct
+        WHERE title_id IN (
+            SELECT title_id
+            FROM title_trigrams
+            WHERE trigram IN ( {', '.join( [ '?' ] * len( trigrams ))} )
+            GROUP BY title_id
+            HAVING COUNT(*) >= ?
+            ORDER BY COUNT(*) DESC
+            LIMIT ?
+        )
+    """
+    data = [ *trigrams, max( 1, len( trigrams ) // 3 ), Fuzzy_Candidates ]
+
+    try:
+        dc.execute( query, data )
 
-    # --------------------------------------------------------------------------
+    except sqlite3.OperationalError:            # No title_trigrams in database built before it was added.
+        return {}
+
+    scored = []
+    for row in dc.fetchall():
+        distance = Levenshtein.distance( key, fb_utils.fuzzy_key( row[ 'title' ] ))
+        if distance <= fuzzy_distance( key ):
+            scored.append( ( distance, row[ 'title' ], row[ 'title_id' ] ) )
+
+    return { title_id : title for distance, title, title_id in sorted( scored )[ : Fuzzy_Limit ] }
+
+# --------------------------------------------------------------------------
+
+def exclude_duplicates( data, exclude_duplicate_titles, exclude_duplicate_canonicals, exclude_duplicate_srcs ):
+
+    # ------------------------
+    #   WRW 10 Apr 2022 - Changed this around a bit, now disjoint selection via radio buttons.
+
+    if exclude_duplicate_titles:
+        data = select_unique_titles( data )
+
+    elif exclude_duplicate_canonicals:
+        data = select_unique_canonicals( data )
+
+    elif exclude_duplicate_srcs:
+        data = select_unique_srcs( data )
+
+    # ------------------------
+    data = strip_priority_data( data )
+
+    return data
+
+# --------------------------------------------------------------------------
+#   WRW - Concurrent search. Each search runs on its own read-only Sqlite connection from
+#       Search_Pool and posts its result back to the event loop as a 'search-result' event.
+#       A new search bumps Search_Generation, the progress handler on the connections
+#       then interrupts any query still running for the old one.
+#   MySql, or no pool, runs each search in place on the main cursor as before.
+
+#   Table, tab, element to focus, status bar setter. Tabs are selected in this order.
+
+Search_Tables = [
+    ( 'indexed-music-file-table', 'tab-indexed-music-file-table', 'tab-display-pdf', 'set_music_index' ),
+    ( 'music-filename-table', 'tab-music-filename-table', 'tab-music-filename-table', 'set_music_files' ),
+    ( 'audio-file-table', 'tab-audio-file-table', 'tab-audio-file-table', 'set_audio_index' ),
+    ( 'midi-file-table', 'tab-midi-file-table', 'tab-midi-file-table', 'set_midi_files' ),
+    ( 'current-chordpro-table', 'tab-chordpro-index-table', 'tab-chordpro-index-table', 'set_chordpro_files' ),
+    ( 'current-jjazz-table', 'tab-jjazzlab-index-table', 'tab-jjazzlab-index-table', 'set_jjazz_files' ),
+    ( 'youtube-file-table', 'tab-youtube-table', 'tab-youtube-table', 'set_youtube_index' ),
+]
+
+Search_Pool = None              # Queue of read-only connections
+Search_Executor = None
+Search_Futures = []
+Search_Generation = 0
+Search_Results = { x[0] : [] for x in Search_Tables }
+Search_Pending = set()
+Search_Tab_Selected = False     # Set True when first tab selected. Don't select others after that.
+Search_Progress_Ops = 1000      # Sqlite VM instructions between cancellation checks.
+Search_Post = {}                # Applied to raw result before display, by table.
+
+Search_Cache = OrderedDict()
+Search_Cache_Size = 100
+Search_Cache_Generation = None
+
+Ascii_Lower = str.maketrans( string.ascii_uppercase, string.ascii_lowercase )
+
+# --------------------------------------------------------------------------
+
+def set_search_pool( db_path, size=len( Search_Tables ) ):
+    global Search_Pool, Search_Executor
+
+    if not SQLITE:
+        return
+
+    uri = Path( db_path ).as_uri() + '?mode=ro'
+    Search_Pool = queue.Queue()
+
+    try:
+        for i in range( size ):
+            conn = sqlite3.connect( uri, uri=True, check_same_thread=False )
+            conn.create_function( 'my_match_c', 2, fb.my_match_c )
+            Search_Pool.put( conn )
+
+    except Exception as e:
+        (extype, value, traceback) = sys.exc_info()
+        print( f"ERROR on connect() for search pool, type: {extype}, value: {value}", file=sys.stderr )
+        Search_Pool = None
+        return
+
+    Search_Executor = ThreadPoolExecutor( max_workers=size, thread_name_prefix='search' )
+
+# --------------------------------------------------------------------------
+#   WRW - After build_tables.py replaced the database file. Searches still running finish on
+#       the old connections and return them to the old pool, which is then dropped.
+
+def reopen_search_pool( db_path ):
+    if not Search_Pool:
+        return
+
+    cancel_searches()
+    old_pool, old_executor = Search_Pool, Search_Executor
+    set_search_pool( db_path )
+    old_executor.shutdown( wait=False )
+
+    while not old_pool.empty():
+        old_pool.get_nowait().close()
+
+# --------------------------------------------------------------------------
+
+def cancel_searches():
+    global Search_Generation, Search_Tab_Selected
+
+    Search_Generation += 1
+    Search_Tab_Selected = False
+    for future in Search_Futures:
+        future.cancel()                 # Only succeeds for searches not yet started.
+    Search_Futures.clear()
+
+# --------------------------------------------------------------------------
+
+def start_search( table, func, args, post=None ):
+    Search_Post[ table ] = post
+    args = tuple( normalize_search( x ) for x in args )
+    key = ( func.__name__, args )
+
+    if key in Search_Cache:
+        Search_Cache.move_to_end( key )
+        show_search_result( table, Search_Cache[ key ] )
+
+    elif Search_Executor:
+        Search_Futures.append( Search_Executor.submit( run_search, Search_Generation, table, key, func, args ))
 
     else:
-        return False
+        result = func( dc, *args )
+        cache_search_result( key, result )
+        show_search_result( table, result )
+
+# --------------------------------------------------------------------------
+#   Runs in a pool thread. Must not touch the window except through write_event_value().
+
+def run_search( generation, table, key, func, args ):
+    if generation != Search_Generation:
+        return
+
+    pool = Search_Pool
+    conn = pool.get()
+    conn.set_progress_handler( lambda: generation != Search_Generation, Search_Progress_Ops )
+
+    try:
+        tdc = conn.cursor()
+        tdc.row_factory = sqlite3.Row
+        result = func( tdc, *args )
+
+    except Exception as e:
+        if generation != Search_Generation:         # Interrupted by progress handler, superseded.
+            return
+        (extype, value, traceback) = sys.exc_info()
+        print( f"ERROR on search for {table}, type: {extype}, value: {value}", file=sys.stderr )
+        result = None
+
+    finally:
+        conn.set_progress_handler( None, 0 )
+        pool.put( conn )
+
+    window.write_event_value( 'search-result', ( generation, table, key, result ) )
+
+# --------------------------------------------------------------------------
+#   WRW - Cache of raw search results, LRU, keyed on query function and normalized search terms.
+#       Repeated searches and toggling the exclude-duplicate buttons are served from here.
+#       Cleared when the database changes, see fb.get_db_generation(). Not used with MySql.
+
+def check_search_cache():
+    global Search_Cache_Generation
+
+    generation = fb.get_db_generation()
+    if generation is None or generation != Search_Cache_Generation:
+        Search_Cache.clear()
+        Search_Cache_Generation = generation
+
+# --------------------------------------------------------------------------
+
+def cache_search_result( key, result ):
+    if Search_Cache_Generation is None:
+        return
+
+    Search_Cache[ key ] = result
+    Search_Cache.move_to_end( key )
+    while len( Search_Cache ) > Search_Cache_Size:
+        Search_Cache.popitem( last=False )
+
+# --------------------------------------------------------------------------
+#   Search terms are matched case-insensitive, ignore surrounding and repeated white space.
+#   Quoted terms are exact except for case.
+
+def normalize_search( val ):
+    if not isinstance( val, str ):
+        return val
+
+    val = val.strip()
+    if not val:
+        return None
+
+    if not ( len( val ) > 1 and val[0] == val[-1] and val[0] in '\'"' ):
+        val = ' '.join( val.split() )
+
+    val = val.translate( Ascii_Lower )
+
+    return val
+
+# --------------------------------------------------------------------------
+#   Update one table and its status. Select first tab for search results found going from
+#       left to right. Tabs are selected only after all tabs to the left have completed
+#       so the choice is the same whatever order the searches complete in.
+#       Leave select/focus as is if nothing found.
+
+def show_search_result( table, result ):
+    global Search_Tab_Selected
+
+    data, count = result
+    if Search_Post[ table ]:
+        data = Search_Post[ table ]( data )
+    Search_Results[ table ] = data
+    Search_Pending.discard( table )
+
+    fb.safe_update( window[ table ], data, None )
+
+    for ttable, tab, focus, setter in Search_Tables:
+        if ttable == table:
+            getattr( status_bar, setter )( count, len( data ) )
+    status_bar.show()
+
+    if Search_Tab_Selected:
+        return
+
+    for ttable, tab, focus, setter in Search_Tables:
+        if ttable in Search_Pending:
+            break
+        if len( Search_Results[ ttable ] ):
+            window.Element( tab ).select()
+            window.Element( focus ).set_focus()
+            Search_Tab_Selected = True
+            break
 
 # --------------------------------------------------------------------------
 #   WRW 30 Mar 2022 - This strikes me as a bit messy. Better way? This is
 #       consequence of pulling out of birdland.py. Maybe one at a time?<ctrl>F9
 
 def get_search_results():
-    global indexed_music_file_table_data, audio_file_table_data, music_file_table_data
-    global midi_file_table_data, youtube_file_table_data, chordpro_file_table_data, jjazz_file_table_data
-
     return (
-        indexed_music_file_table_data,
-        audio_file_table_data,
-        music_file_table_data,
-        midi_file_table_data,
-        chordpro_file_table_data, 
-        jjazz_file_table_data,
-        youtube_file_table_data
+        Search_Results[ 'indexed-music-file-table' ],
+        Search_Results[ 'audio-file-table' ],
+        Search_Results[ 'music-filename-table' ],
+        Search_Results[ 'midi-file-table' ],
+        Search_Results[ 'current-chordpro-table' ],
+        Search_Results[ 'current-jjazz-table' ],
+        Search_Results[ 'youtube-file-table' ]
     )
 
 # --------------------------------------------------------------------------
@@ -60,261 +60,210 @@ exceptions = [
 ]
 
 # --------------------------------------------------------------------------
-#   WRW 22 Feb 2022 - change from 3 or more to 1 or more
-
-def titlecase( s ):
-    return re.sub(r"[A-Za-z]{1,}('[A-Za-z]+)?", lambda mo: mo.group(0).capitalize(), s)
+#   WRW - Lookup forms of the lists above. First entry wins in corrections as in the
+#       original linear scan. Exceptions are prefixes, grouped by length so a check is
+#       one set lookup per distinct length.
 
-    # return re.sub(r"[A-Za-z]{3,}('[A-Za-z]+)?",
-    #    lambda mo: mo.group(0).capitalize(), s)
+Corrections = {}
+for old, new in corrections:
+    Corrections.setdefault( old, new )
 
-def do_correction( log, ntitle ):
+Exception_Prefixes = collections.defaultdict( set )
+for exception in exceptions:
+    Exception_Prefixes[ len( exception ) ].add( exception )
 
-        def my_print( s ):
-            item, val = s.split( ':', 1 )
-            print( f"{item:>45}: {val}", file=log )
+def is_exception( title ):
+    return any( title[ :n ] in prefixes for n, prefixes in Exception_Prefixes.items() )
 
-        if not log:
-            log = open( os.devnull, 'w' )
-                    
-        # -----------------------------------------
-        #   Haven't seen leading/trailing spaces but be cautious. 
-        #   Probaby stripped in source-specific do_* code.
-        #   However, one of the fixes left a trailing space.
-        #   'Glory of love , The' -> 'The Glory of love '
-        
-        otitle = ntitle
-
-        ntitle = ntitle.strip()     
-        if len( ntitle ) == 0:      #   Did see one empty title
-            my_print( f"Empty title after strip: '{otitle}' -> '{ntitle}'" )
-            Fixes[ 'Empty title after strip' ] += 1
-            return None
-
-        if otitle != ntitle:
-            my_print( f"Strip spaces: '{otitle}' -> '{ntitle}'" )
-            Fixes[ 'Strip spaces' ] += 1
-
-        # -----------------------------------------
-        #   Found several titles needing correction.
-                    
-        found = False
-        for item in corrections:
-            if otitle == item[0]:
-                ntitle = item[1]
-                my_print( f"Correcting: '{otitle}' -> '{ntitle}'" )
-                found = True
-                break
-        if found:   
-            Fixes[ 'Corrections' ] += 1
-            return ntitle
-
-        # -----------------------------------------
-        #   Suppress legitimate titles that would otherwise match and be changed.               
-
-        found = False
-        for exception in exceptions:
-            if otitle.startswith( exception ):
-                my_print( f"Exception: {otitle}" )
-                ntitle = otitle
-                found = True
-                break
-        if found:
-            Fixes[ 'Exception' ] += 1
-            return ntitle
-
-        # -----------------------------------------
-        #   Leading digits with optional - followed by space
-
-        m = re.match( '^(\d+\s*-*\s*) (.*)$', otitle )
-        if m:
-            ntitle = f"{m[2]}"
-            my_print( f"Leading digit(s) '{m[1]}':   '{otitle}' -> '{ntitle}'" )
-            Fixes[ 'Leading digits' ] += 1
-
-        else:
-            ntitle = otitle
-
-        # -----------------------------------------
-        #   A few of this pattern: '24: 23 - All This Time', process it separately from above
-
-        otitle = ntitle
-        m = re.match( '^(\d+: \d+\s+-\s+)(.*)$', otitle )
-
-        if m:
-            ntitle = f"{m[2]}"
-            my_print( f"Leading digit(s) with colon '{m[1]}':   '{otitle}' -> '{ntitle}'" )
-            Fixes[ 'Leading digits with colon' ] += 1
-
-        else:
-            ntitle = otitle
-
-        # -----------------------------------------
-        #   A couple of this pattern: '1: Front'
-
-        otitle = ntitle
-        m = re.match( '^(\d+:\s+)(.*)$', otitle )
+# --------------------------------------------------------------------------
+#   WRW - The pattern rules applied in order by do_correction(), compiled once.
+#       ( pattern, name in Fixes, replacement, log message ), replacement and message
+#       are format() strings of the match 'm', message also of old 'o' and new 'n' title.
 
-        if m:
-            ntitle = f"{m[2]}"
-            my_print( f"Leading digit(s) with colon '{m[1]}':   '{otitle}' -> '{ntitle}'" )
-            Fixes[ 'Leading digits with colon' ] += 1
+Rules = [
+    #   Leading digits with optional - followed by space
+    ( r'^(\d+\s*-*\s*) (.*)$', 'Leading digits', '{m[2]}', "Leading digit(s) '{m[1]}':   '{o}' -> '{n}'" ),
 
-        else:
-            ntitle = otitle
+    #   A few of this pattern: '24: 23 - All This Time', process it separately from above
+    ( r'^(\d+: \d+\s+-\s+)(.*)$', 'Leading digits with colon', '{m[2]}', "Leading digit(s) with colon '{m[1]}':   '{o}' -> '{n}'" ),
 
-        # -----------------------------------------
-        # 11A - Intro To A Wild, Wild Party
+    #   A couple of this pattern: '1: Front'
+    ( r'^(\d+:\s+)(.*)$', 'Leading digits with colon', '{m[2]}', "Leading digit(s) with colon '{m[1]}':   '{o}' -> '{n}'" ),
 
-        otitle = ntitle
-        m = re.match( '^(\d+[AB]\s*-\s+)(.*)$', otitle )
+    # 11A - Intro To A Wild, Wild Party
+    ( r'^(\d+[AB]\s*-\s+)(.*)$', 'Leading digits with letter', '{m[2]}', "Leading digit(s) with letter '{m[1]}':   '{o}' -> '{n}'" ),
 
-        if m:
-            ntitle = f"{m[2]}"
-            my_print( f"Leading digit(s) with letter '{m[1]}':   '{otitle}' -> '{ntitle}'" )
-            Fixes[ 'Leading digits with letter' ] += 1
+    #   Trailing sequence number, possibly in parens
+    #   WRW 2 Apr 2022 - Replace '\s+' with '\s*'? No, not a problem as is.
+    ( r'(.*)\s+(\(\d+\))$', 'Trailing sequence number', '{m[1]}', "Trailing sequence number '{m[2]}': '{o}' -> '{n}'" ),
 
-        else:
-            ntitle = otitle
+    #   Trailing [key] signature.
+    ( r'(.*)\s+(\[F]|\[Bb]|\[Eb]|\[Bass]|\[Ab])$', 'Trailing [key] signature', '{m[1]}', "Trailing [key] '{m[2]}': '{o}' -> '{n}'" ),
 
-        # -----------------------------------------
-        #   Trailing sequence number, possibly in parens
-        #   WRW 2 Apr 2022 - Replace '\s+' with '\s*'? No, not a problem as is.
+    #   Trailing (key) signature with asterisk.
+    #   WRW 13 Apr 2022 - Make asterisk optional.
+    #   Note that this is ambiguous with article '(A)' instead of key '(A)'. Not many songs in A (3 sharps)
+    #       so this loses, trailing article wins.
+    ( r'(.*)\s+((\(C#\)|\(E\)|\(Ab\)|\(Gb\)|\(B\)|\(Bbm\)|\(Gm\)|\(Bm\)|\(Fm\)|\(D\)|\(Em\)|\(Cm\)|\(Am\)|\(Dm\)|\(G\)|\(C\)|\(F\)|\(Bb\)|\(Db\)|\(Eb\)|\(Bass\)|\(Ab\))\*?)$',
+      'Trailing (key)* signature', '{m[1]}', "Trailing (key) '{m[2]}': '{o}' -> '{n}'" ),
 
-        otitle = ntitle
+    #   Trailing A, a, An, definitely in parens. Move it to front.
+    #   WRW 2 Apr 2022 - was not working, moved parens to correct.
+    #   Split into two tests. One with parens and optional leading space.
+    ( r'(.*?),?\s*\((A|a|An|an)\)$', "Trailing '(A)'", '{m[2]} {m[1]}', "Trailing '({m[2]})': '{o}' -> '{n}'" ),
 
-        m = re.match( '(.*)\s+(\(\d+\))$', otitle )
-        if m:
-            ntitle = f"{m[1]}"
-            my_print( f"Trailing sequence number '{m[2]}': '{otitle}' -> '{ntitle}'" )
-            Fixes[ 'Trailing sequence number' ] += 1
+    #   Trailing A, a, An, an not in parens. Move it to front.
+    #   Split into two tests. One without parens and required leading space.
+    ( r'(.*?),?\s+(A|a|An|an)$', "Trailing 'A'", '{m[2]} {m[1]}', "Trailing '{m[2]}': '{o}' -> '{n}'" ),
 
-        else:
-            ntitle = otitle
+    #   Trailing 'The', definitely in parens, possibly with comma
+    ( r'(.*?)\s?,?\s+(\([Tt]he\))$', "Trailing 'The'", 'The {m[1]}', "Trailing '{m[2]}': '{o}' -> '{n}'" ),
 
-        # -----------------------------------------
-        #   Trailing [key] signature.
+    #   Trailing 'The', no parens, possibly with comma
+    ( r'(.*?)\s?,?\s+([Tt]he)$', "Trailing 'The'", 'The {m[1]}', "Trailing '{m[2]}': '{o}' -> '{n}'" ),
+]
 
-        otitle = ntitle
+Rules = [ ( re.compile( pattern ), fix, replace, message ) for pattern, fix, replace, message in Rules ]
 
-        m = re.match( '(.*)\s+(\[F]|\[Bb]|\[Eb]|\[Bass]|\[Ab])$', otitle )
-        if m:
-            ntitle = f"{m[1]}"
-            my_print( f"Trailing [key] '{m[2]}': '{otitle}' -> '{ntitle}'" )
-            Fixes[ 'Trailing [key] signature' ] += 1
+# --------------------------------------------------------------------------
+#   WRW 22 Feb 2022 - change from 3 or more to 1 or more
 
-        else:
-            ntitle = otitle
+Word = re.compile( r"[A-Za-z]{1,}('[A-Za-z]+)?" )
 
-        # -----------------------------------------
-        #   Trailing (key) signature with asterisk.
-        #   WRW 13 Apr 2022 - Make asterisk optional.
-        #   Note that this is ambiguous with article '(A)' instead of key '(A)'. Not many songs in A (3 sharps)
-        #       so this loses, trailing article wins.
+def titlecase( s ):
+    return Word.sub( lambda mo: mo.group(0).capitalize(), s )
 
-        otitle = ntitle
+    # return re.sub(r"[A-Za-z]{3,}('[A-Za-z]+)?",
+    #    lambda mo: mo.group(0).capitalize(), s)
 
-        m = re.match( '(.*)\s+((\(C#\)|\(E\)|\(Ab\)|\(Gb\)|\(B\)|\(Bbm\)|\(Gm\)|\(Bm\)|\(Fm\)|\(D\)|\(Em\)|\(Cm\)|\(Am\)|\(Dm\)|\(G\)|\(C\)|\(F\)|\(Bb\)|\(Db\)|\(Eb\)|\(Bass\)|\(Ab\))\*?)$', otitle )
-        if m:
-            ntitle = f"{m[1]}"
-            my_print( f"Trailing (key) '{m[2]}': '{otitle}' -> '{ntitle}'" )
-            Fixes[ 'Trailing (key)* signature' ] += 1
+# --------------------------------------------------------------------------
+#   WRW - The corrections of one title: ( ntitle, hits ), hits is a tuple of ( fix, message )
+#       of each correction applied, in order. Depends only on the title, so do_correction()
+#       keeps the result for titles seen again, many are in several books.
 
-        else:
-            ntitle = otitle
+def correct( otitle ):
+        hits = []
 
         # -----------------------------------------
-        #   Trailing A, a, An, definitely in parens. Move it to front.
-        #   WRW 2 Apr 2022 - was not working, moved parens to correct.
-        #   Split into two tests. One with parens and optional leading space.
+        #   Haven't seen leading/trailing spaces but be cautious. 
+        #   Probaby stripped in source-specific do_* code.
+        #   However, one of the fixes left a trailing space.
+        #   'Glory of love , The' -> 'The Glory of love '
+        #   Note that the rules below start again from the unstripped title.
 
-        otitle = ntitle
+        ntitle = otitle.strip()     
+        if len( ntitle ) == 0:      #   Did see one empty title
+            hits.append( ( 'Empty title after strip', f"Empty title after strip: '{otitle}' -> '{ntitle}'" ) )
+            return None, tuple( hits )
 
-        m = re.match( '(.*?),?\s*\((A|a|An|an)\)$', otitle )
-        if m:
-            ntitle = f"{m[2]} {m[1]}"
-            my_print( f"Trailing '({m[2]})': '{otitle}' -> '{ntitle}'"  )
-            Fixes[ 'Trailing \'(A)\'' ] += 1
-        else:
-            ntitle = otitle
+        if otitle != ntitle:
+            hits.append( ( 'Strip spaces', f"Strip spaces: '{otitle}' -> '{ntitle}'" ) )
 
         # -----------------------------------------
-        #   Trailing A, a, An, an not in parens. Move it to front.
-        #   WRW 2 Apr 2022 - was not working, moved parens to correct.
-        #   Split into two tests. One without parens and required leading space.
-
-        otitle = ntitle
+        #   Found several titles needing correction.
 
-        m = re.match( '(.*?),?\s+(A|a|An|an)$', otitle )
-        if m:
-            ntitle = f"{m[2]} {m[1]}"
-            my_print( f"Trailing '{m[2]}': '{otitle}' -> '{ntitle}'"  )
-            Fixes[ 'Trailing \'A\'' ] += 1
-        else:
-            ntitle = otitle
+        ntitle = Corrections.get( otitle )
+        if ntitle is not None:
+            hits.append( ( 'Corrections', f"Correcting: '{otitle}' -> '{ntitle}'" ) )
+            return ntitle, tuple( hits )
 
         # -----------------------------------------
-        #   Trailing 'The', definitely in parens, possibly with comma
-
-        otitle = ntitle
+        #   Suppress legitimate titles that would otherwise match and be changed.               
 
-        m = re.match( '(.*?)\s?,?\s+(\([Tt]he\))$', otitle )
-        if m:
-            ntitle = f"The {m[1]}"
-            my_print( f"Trailing '{m[2]}': '{otitle}' -> '{ntitle}'" )
-            Fixes[ 'Trailing \'The\'' ] += 1
-        else:
-            ntitle = otitle
+        if is_exception( otitle ):
+            hits.append( ( 'Exception', f"Exception: {otitle}" ) )
+            return otitle, tuple( hits )
 
         # -----------------------------------------
-        #   Trailing 'The', no parens, possibly with comma
-
-        otitle = ntitle
 
-        m = re.match( '(.*?)\s?,?\s+([Tt]he)$', otitle )
-        if m:
-            ntitle = f"The {m[1]}"
-            my_print( f"Trailing '{m[2]}': '{otitle}' -> '{ntitle}'" )
-            Fixes[ 'Trailing \'The\'' ] += 1
-        else:
-            ntitle = otitle
+        ntitle = otitle
+        for pattern, fix, replace, message in Rules:
+            m = pattern.match( ntitle )
+            if m:
+                otitle, ntitle = ntitle, replace.format( m=m )
+                hits.append( ( fix, message.format( m=m, o=otitle, n=ntitle ) ) )
 
         # -----------------------------------------
         #   WRW 23 Feb 2022 - Diacriticals are causing duplicates in titles_distinct.
 
         otitle = ntitle
-
         ntitle = unidecode.unidecode( otitle )
         if otitle != ntitle:
-            my_print( f"Diacritical removal: '{otitle}' -> '{ntitle}'" )
-            Fixes[ 'Diacritical removal' ] += 1
+            hits.append( ( 'Diacritical removal', f"Diacritical removal: '{otitle}' -> '{ntitle}'" ) )
 
         # -----------------------------------------
         #   Title case, a few all in upper case
 
         otitle = ntitle
-
-        # ntitle = ntitle.title()
         ntitle = titlecase( otitle )
         if otitle != ntitle:
-            my_print( f"Case correction: '{otitle}' -> '{ntitle}'" )
-            Fixes[ 'Case correction' ] += 1
+            hits.append( ( 'Case correction', f"Case correction: '{otitle}' -> '{ntitle}'" ) )
 
-        # -----------------------------------------
-        otitle = ntitle
+        return ntitle, tuple( hits )
+
+# --------------------------------------------------------------------------
+#   WRW - Results of correct() by title. Cleared when full, that is well above the
+#       number of distinct titles in all of Music-Index.
+
+Cache = {}
+Cache_Size = 200000
 
-        return ntitle
+def log_print( log, s ):
+    item, val = s.split( ':', 1 )
+    print( f"{item:>45}: {val}", file=log )
+
+#   WRW - Count and log the hits again on every call, cached or not, so Fixes and the
+#       log are as if each title was corrected anew. Nothing is written when no log.
+
+def do_correction( log, ntitle ):
+    res = Cache.get( ntitle )
+    if res is None:
+        if len( Cache ) >= Cache_Size:
+            Cache.clear()
+        res = Cache[ ntitle ] = correct( ntitle )
+
+    ntitle, hits = res
+    for fix, message in hits:
+        Fixes[ fix ] += 1
+        if log:
+            log_print( log, message )
+
+    return ntitle
+
+#   WRW - Correct a list of titles, return the corrected titles and a Counter of the
+#       hits of each rule for just these titles. Fixes is updated as well.
+
+def do_correction_many( log, titles ):
+    counts = collections.Counter()
+    ntitles = []
+    for title in titles:
+        res = Cache.get( title )
+        if res is None:
+            if len( Cache ) >= Cache_Size:
+                Cache.clear()
+            res = Cache[ title ] = correct( title )
+
+        ntitle, hits = res
+        for fix, message in hits:
+            counts[ fix ] += 1
+            if log:
+                log_print( log, message )
+        ntitles.append( ntitle )
+
+    Fixes.update( counts )
+    return ntitles, counts
 
 # --------------------------------------------------------------------------
 
 def check_pages( dc, log ):
     count_match = count_mismatch = 0
 
-    query = """
-       SELECT title, titles.src, local, sheet, canonical, file
+    k = fb.book_keys()
+    query = f"""
+       SELECT title, titles.src, titles.local, sheet, canonical, file
         FROM titles
         JOIN titles_distinct USING( title_id )
-        JOIN local2canonical USING( local, src )
+        JOIN local2canonical {k['book_using']}
         JOIN canonical2file USING( canonical )
         ORDER BY title, canonical
     """
@@ -341,18 +290,19 @@ def proc_one_book( src, data, file, **kwargs):
     contents = data[ 'contents' ]
   # print( "src:", src, file=log )
 
-    for content in contents:
-        title = content[ 'title' ]
-        if title:
-            Fixes[ 'Total Title Count' ] += 1
-            title = do_correction( log, title )
-        else:
-            Fixes[ 'Null Title Count' ] += 1
+    titles = [ content[ 'title' ] for content in contents if content[ 'title' ] ]
+    Fixes[ 'Total Title Count' ] += len( titles )
+    Fixes[ 'Null Title Count' ] += len( contents ) - len( titles )
+
+    do_correction_many( log, titles )
 
 # --------------------------------------------------------------------------
 
+#   WRW - One book at a time from the Music-Index reader.
+
 def get_titles( src, **kwargs ):
-    fb.get_music_index_data_by_src( src, proc_one_book, **kwargs )
+    for entry, data in fb.music_index.iter_books( src ):
+        proc_one_book( src, data, entry.path.name, **kwargs )
 
 # --------------------------------------------------------------------------
 #   WRW 25 Feb 2022 - Changed to run from Music-Index, not database. Still
@@ -19,16 +19,29 @@ import gzip
 import ctypes
 import csv
 import tempfile
+import threading
+import bisect
+import heapq
 
 import fb_title_correction
+import fb_music_index
 
 try:                            # WRW 3 May 2022 - in case there is a problem with fullword module in some environments.
     import fullword             # Make bogus name 'xfullword' to test missing module
     Fullword_Available = True
+    Fullword_Compile = hasattr( fullword, 'compile' )     # WRW - Not in modules built before compile() was added.
 
 except ImportError as e:
   # print( "OPERATIONAL: import fullword failed, using alternative", file=sys.stderr )
     Fullword_Available = False
+    Fullword_Compile = False
+
+#   WRW - Compiled fullword matchers by search value for my_match_c(). Each search thread
+#       may be matching a different value at the same time, the module-level fullword.match()
+#       keeps only one value in its cache.
+
+Fullword_Matchers = {}
+Fullword_Matchers_Size = 100
 
 # ---------------------------------------------------------------------------
 #   Note, some index files have 4th column with page count for title.
@@ -47,6 +60,147 @@ ignore_words = set( ['mid', 'pdf'] )    # used in my_match()
 
 extcmd_popen = None
 
+# ---------------------------------------------------------------------------
+#   WRW - Same break and ignore chars as in Fullword-Match/fullwordmodule.c. Keep them in sync.
+#       Used to build the word (posting list) index tables in build_tables.py and to
+#       split search values for lookup in them.
+
+Fullword_Ignore_Chars = '"!?()'
+Fullword_Break_Chars  = '_-/,.'
+
+Fullword_Translate = str.maketrans(
+    { **{ c : None for c in Fullword_Ignore_Chars },
+      **{ c : ' ' for c in Fullword_Break_Chars },
+      **{ chr(c) : chr(c + 32) for c in range( ord('A'), ord('Z') + 1 ) }       # tolower() in C locale, ASCII only.
+    } )
+
+# ---------------------------------------------------------------------------
+#   Split 's' into words exactly as copy_to_buffer() and partition_buffer() do in fullwordmodule.c.
+
+def fullword_tokens( s ):
+    if not s:
+        return []
+    return [ x for x in s.translate( Fullword_Translate ).split( ' ' ) if x ]
+
+# ---------------------------------------------------------------------------
+#   WRW - Trigrams of a title for the typo-tolerant title search. Title is normalized
+#       with the fullword rules, padded so word starts and ends count, too.
+#       Used to build title_trigrams in build_tables.py and for the search in fb_search.py.
+
+def fuzzy_key( s ):
+    return ' '.join( fullword_tokens( s ) )
+
+def title_trigrams( s ):
+    key = f"  {fuzzy_key( s )} "
+    return { key[ i : i+3 ] for i in range( len( key ) - 2 ) }
+
+# ---------------------------------------------------------------------------
+#   WRW - Word index tables built by build_tables.py. Map a searched column to the
+#       key column in the search query and the SELECT returning keys containing one word.
+#       Searches on these columns intersect the posting lists for each word and
+#       then confirm with my_match_c() on just the surviving rows.
+
+Word_Index = {
+    'titles_distinct.title' : ( 'titles_distinct.title_id', "SELECT title_id FROM title_words WHERE word = ?" ),
+    'titles.composer' :       ( 'titles.composer', "SELECT name FROM credit_words WHERE col = 'composer' AND word = ?" ),
+    'titles.lyricist' :       ( 'titles.lyricist', "SELECT name FROM credit_words WHERE col = 'lyricist' AND word = ?" ),
+}
+
+# ---------------------------------------------------------------------------
+#   WRW - FTS5 tables built by build_tables.py with --fulltext. Map a searched column to the
+#       key column in the search query, the contentless FTS5 table indexing it and the
+#       column name in that table. Key is the rowid of the indexed table.
+
+Fts_Index = {
+    'titles_distinct.title' :     ( 'titles_distinct.title_id', 'titles_distinct_fts', 'title' ),
+    'titles.composer' :           ( 'titles.rowid', 'titles_fts', 'composer' ),
+    'titles.lyricist' :           ( 'titles.rowid', 'titles_fts', 'lyricist' ),
+    'local2canonical.canonical' : ( 'local2canonical.rowid', 'local2canonical_fts', 'canonical' ),
+    'audio_files.title' :         ( 'audio_files.rowid', 'audio_files_fts', 'title' ),
+    'audio_files.artist' :        ( 'audio_files.rowid', 'audio_files_fts', 'artist' ),
+    'audio_files.album' :         ( 'audio_files.rowid', 'audio_files_fts', 'album' ),
+    'music_files.rpath' :         ( 'music_files.rowid', 'music_files_fts', 'rpath' ),
+    'music_files.file' :          ( 'music_files.rowid', 'music_files_fts', 'file' ),
+    'midi_files.rpath' :          ( 'midi_files.rowid', 'midi_files_fts', 'rpath' ),
+    'midi_files.file' :           ( 'midi_files.rowid', 'midi_files_fts', 'file' ),
+    'chordpro_files.title' :      ( 'chordpro_files.rowid', 'chordpro_files_fts', 'title' ),
+    'chordpro_files.artist' :     ( 'chordpro_files.rowid', 'chordpro_files_fts', 'artist' ),
+    'jjazz_files.title' :         ( 'jjazz_files.rowid', 'jjazz_files_fts', 'title' ),
+}
+
+#   FTS5 'ascii' tokenizer splits on every ASCII character that is not alphanumeric. Keep all
+#       but space and the fullword break and ignore chars in the tokens. The FTS5 tables index
+#       fuzzy_key() of the column, not the column, so the ignore chars are already gone and
+#       'Rock(s)' is the one word 'rocks' in both. Only space is left to split on.
+
+Fts_Token_Chars = ''.join( [ chr(c) for c in range( ord('!'), ord('~') + 1 )
+                             if not chr(c).isalnum() and chr(c) not in Fullword_Ignore_Chars + Fullword_Break_Chars ] )
+
+Fts_Tokenize = "ascii tokenchars '{}'".format( Fts_Token_Chars.replace( "'", "''" ) )
+
+#   FTS5 query for 's' on 'col', every fullword word as a quoted string, all required.
+
+def fts_query( col, s ):
+    return ' AND '.join( [ f'{col} : "{w}"' for w in fullword_tokens( s ) ] )
+
+# ---------------------------------------------------------------------------
+#   WRW - Join fragments for the integer book_id and canonical_id keys from the books step of
+#       build_tables.py, and the src/local and canonical joins they replaced for databases built
+#       before it. The string columns are still there, the old joins give the same results. See
+#       FB.book_keys().
+
+Book_Keys = {
+    'books_join' :      'JOIN books USING( book_id )',      # Then {books}src, {books}local for src and local of the book.
+    'books' :           'books.',
+    'book_using' :      'USING( book_id )',                 # JOIN local2canonical to titles
+    'canonical_using' : 'USING( canonical_id )',            # JOIN canonical2file or local2canonical to canonicals
+    'titles_l2c' :      'local2canonical.book_id = titles.book_id',
+    'canonicals_l2c' :  'canonicals.canonical_id = local2canonical.canonical_id',
+    'c2f_canonicals' :  'canonical2file.canonical_id = canonicals.canonical_id',
+    'offsets_titles' :  'sheet_offsets.book_id = titles.book_id',
+}
+
+Old_Book_Keys = {
+    'books_join' :      '',
+    'books' :           '',
+    'book_using' :      'USING( local, src )',
+    'canonical_using' : 'USING( canonical )',
+    'titles_l2c' :      '(local2canonical.local = titles.local AND local2canonical.src = titles.src)',
+    'canonicals_l2c' :  'canonicals.canonical = local2canonical.canonical',
+    'c2f_canonicals' :  'canonical2file.canonical = canonicals.canonical',
+    'offsets_titles' :  'sheet_offsets.src = titles.src AND sheet_offsets.local = titles.local',
+}
+
+# ---------------------------------------------------------------------------
+#   WRW - Sheet/page translation on the in-memory sheet offsets of one book, see FB.load_sheet_offsets().
+#       'sheet_mins' and 'page_mins' are suffix minimums of sheet_start and sheet_start + sheet_offset.
+#       Return index of the offset to apply to value or None if none applies.
+
+def suffix_min( vals ):
+    res = list( vals )
+    for i in range( len( res ) - 2, -1, -1 ):
+        res[ i ] = min( res[ i ], res[ i+1 ] )
+    return res
+
+def find_sheet_offset( offsets, mins, value ):
+    if not offsets:
+        return None
+    try:
+        value = int( value )
+    except ( ValueError, TypeError ):
+        return None
+
+    i = bisect.bisect_right( offsets[ mins ], value ) - 1
+    return i if i >= 0 else None
+
+def page_from_sheet( offsets, sheet ):
+    i = find_sheet_offset( offsets, 'sheet_mins', sheet )
+    return str( int( sheet ) + offsets[ 'offsets' ][ i ] ) if i is not None else None
+
+def sheet_from_page( offsets, page ):
+    i = find_sheet_offset( offsets, 'page_mins', page )
+    return str( int( page ) - offsets[ 'offsets' ][ i ] ) if i is not None else None
+
 # ---------------------------------------------------------------------------
 #   Replace spaces with underscores and path separators with dash so can
 #       keep these files in flat directory hierarchy.
@@ -72,6 +226,8 @@ class FB():
 
     def __init__( self ):
         self.books = {}
+        self.saved_books = set()
+        self.csv_runs = []
         self.music_popen = None
         self.audio_popen = None
         self.midi_popen = None
@@ -88,6 +244,15 @@ class FB():
         self.save_music_file = None
         self.log_data = []
         self.log_histo_data = {}
+        self.word_index_available = False
+        self.fts_index_available = False
+        self.book_keys_available = None
+        self.music_index = None
+        self.sheet_offsets = None
+        self.sheet_offsets_generation = None
+        self.db_file = None
+        self.db_file_id = None
+        self.extcmd_thread = None
 
         #   For testing fb_title_correction.py on the raw data. 
         #       Set log below 
@@ -136,6 +301,7 @@ class FB():
         self.Source_Priority =          self.conf.val('source_priority')
     
         self.MusicIndexDir =            self.conf.val('music_index_dir')
+        self.music_index = fb_music_index.MusicIndex( self.MusicIndexDir, Path( self.conf.home_confdir, self.conf.music_index_manifest_file ))
 
     # ------------------------------------------------------------------------
     #   Only used by add() for source-specific do_*.py, don't bother loading otherwise.
@@ -270,6 +436,14 @@ class FB():
 
     def my_match_c( self, column, value ):
         try:
+            if Fullword_Compile:
+                matcher = Fullword_Matchers.get( value )
+                if not matcher:
+                    if len( Fullword_Matchers ) >= Fullword_Matchers_Size:
+                        Fullword_Matchers.clear()
+                    matcher = Fullword_Matchers[ value ] = fullword.compile( value )
+                return matcher.match( column )
+
             return fullword.match( column, value )
 
         except Exception as e:                                  # TESTING, no, keep, may generate exception on unexpected data length.
@@ -279,6 +453,95 @@ class FB():
             print( f"  Value: {value}", file=sys.stderr  )
             return False
 
+    # ----------------------------------------
+    #   WRW - The word index tables appear only after build_tables.py has been run with this version.
+    #       Fall back to plain my_match_c() on older databases. Remember only a positive result,
+    #       the tables may appear after a rebuild while birdland is running.
+    #       Check only from the main thread, dc belongs to it. fb_search checks before starting the
+    #       search pool threads.
+
+    def have_word_index( self ):
+        if self.word_index_available or threading.current_thread() is not threading.main_thread():
+            return self.word_index_available
+
+        txt = """SELECT COUNT(*) cnt FROM sqlite_master
+                 WHERE type = 'table' AND name IN ( 'title_words', 'credit_words' )
+              """
+        try:
+            dc.execute( txt )
+
+        except Exception as e:
+            (extype, value, traceback) = sys.exc_info()
+            print( f"ERROR on SELECT, type: {extype}, value: {value}", file=sys.stderr )
+            print( f"  {txt}", file=sys.stderr  )
+            return False
+
+        self.word_index_available = dc.fetchone()[ 'cnt' ] == 2
+        return self.word_index_available
+
+    # ----------------------------------------
+    #   WRW - The books table and integer keys appear only after build_tables.py has been run with this
+    #       version. Checked once, again after a reopen or a command run from birdland. Other threads get
+    #       the old joins until checked from the main thread, they work on either database.
+
+    def have_book_keys( self ):
+        if self.book_keys_available is not None or threading.current_thread() is not threading.main_thread():
+            return bool( self.book_keys_available )
+
+        if MYSQL:
+            txt = """SELECT COUNT(*) cnt FROM information_schema.tables
+                     WHERE table_schema = DATABASE() AND table_name = 'books'
+                  """
+        else:
+            txt = """SELECT COUNT(*) cnt FROM sqlite_master
+                     WHERE type = 'table' AND name = 'books'
+                  """
+        try:
+            dc.execute( txt )
+
+        except Exception as e:
+            (extype, value, traceback) = sys.exc_info()
+            print( f"ERROR on SELECT, type: {extype}, value: {value}", file=sys.stderr )
+            print( f"  {txt}", file=sys.stderr  )
+            return False
+
+        self.book_keys_available = dc.fetchone()[ 'cnt' ] == 1
+        if not self.book_keys_available:
+            print( "WARNING: Database was built by an older version of build_tables.py, searches will be slower.", file=sys.stderr )
+            print( "    Rebuild it with Database->Rebuild All Tables or 'build_tables.py --all'.", file=sys.stderr )
+
+        return self.book_keys_available
+
+    def book_keys( self ):
+        return Book_Keys if self.have_book_keys() else Old_Book_Keys
+
+    # ----------------------------------------
+    #   WRW - Same for the FTS5 tables, they appear only after build_tables.py has been run with --fulltext.
+
+    def have_fts_index( self ):
+        if self.fts_index_available or threading.current_thread() is not threading.main_thread():
+            return self.fts_index_available
+
+        #   WRW - Tables from older builds index the raw column, external content. They split words
+        #       at the ignore chars and would drop rows my_match_c() accepts, don't use them.
+
+        tables = sorted( set( [ x[1] for x in Fts_Index.values() ] ) )
+        txt = f"""SELECT COUNT(*) cnt FROM sqlite_master
+                 WHERE type = 'table' AND name IN ( {', '.join( [ '?' ] * len( tables ) )} )
+                 AND sql LIKE ?
+              """
+        try:
+            dc.execute( txt, [ *tables, "%content=''%" ] )
+
+        except Exception as e:
+            (extype, value, traceback) = sys.exc_info()
+            print( f"ERROR on SELECT, type: {extype}, value: {value}", file=sys.stderr )
+            print( f"  {txt}", file=sys.stderr  )
+            return False
+
+        self.fts_index_available = dc.fetchone()[ 'cnt' ] == len( tables )
+        return self.fts_index_available
+
     # ----------------------------------------
     #   WRW 16 Feb 2022 - Include this along with create_function() in do_main() to add SELECT REGEXP support.
     #   Was slow and never fully implemented.
@@ -301,8 +564,8 @@ class FB():
     #   Called from do_query...() functions in birdland.py.
     #   Return a where clause and data for parameter substitution.
     #   Function my_match_c() is called by Sqlite when matching.
-    #   Note: This ONLY used when SQLITE is True and FULLTEXT is False, which is the default case.
-    #       It is never used when MYSQL is True.
+    #   Note: This ONLY used when SQLITE is True. With FULLTEXT the FTS5 index built with --fulltext
+    #       narrows the rows first. It is never used when MYSQL is True.
 
     #   match_type = "simple-like"    # Select one of several approaches here. Keep if ever want to evaluate others again.
     #   match_type = "regexp"
@@ -327,6 +590,33 @@ class FB():
             w = s[1:-1]                     # Remove leading and trailing quote
             return f"{col} = ? COLLATE NOCASE", [w]
 
+        # ----------------------------------------------
+        #   WRW - FTS5 index built with --fulltext. Limit rows to those containing every word
+        #       with the FTS5 index, then confirm with my_match_c(), which also checks word order.
+
+        elif FULLTEXT and col in Fts_Index and fullword_tokens( s ) and self.have_fts_index():
+            key, fts, fts_col = Fts_Index[ col ]
+            q = fts_query( fts_col, s )
+
+            if match_type == "my_match_c":
+                return f"({key} IN ( SELECT rowid FROM {fts} WHERE {fts} MATCH ? ) AND my_match_c( {col}, ? ))", [ q, s ]
+            else:
+                return f"{key} IN ( SELECT rowid FROM {fts} WHERE {fts} MATCH ? )", [ q ]
+
+        # ----------------------------------------------
+        #   WRW - Column has a word index. Limit rows to those containing every word
+        #       by intersecting the posting lists, then confirm with my_match_c(), which
+        #       also checks word order. my_match_c() is now called only for candidate rows.
+
+        elif match_type == "my_match_c" and col in Word_Index and self.have_word_index():
+            key, select = Word_Index[ col ]
+            words = fullword_tokens( s )
+            if not words:
+                return f"my_match_c( {col}, ? )", [s]
+
+            selects = ' INTERSECT '.join( [ select ] * len( words ) )
+            return f"({key} IN ( {selects} ) AND my_match_c( {col}, ? ))", [ *words, s ]
+
         # ----------------------------------------------
         #   This is best and fast. Same as below but in C.
 
@@ -424,7 +714,7 @@ class FB():
              open( Proto_Sheet_Offsets, "w" ) as ppo_fd,  \
              open( Proto_Canonical2File, "w" ) as pc2f_fd:
 
-            for book in sorted( self.books ):
+            for book in sorted( set( self.books ) | self.saved_books ):
                 print( book, file=ln_fd )
                 print( f"{book} | (1, 0)", file=ppo_fd )
                 print( f"{book} | {book}", file=pl2c_fd )
@@ -436,54 +726,97 @@ class FB():
 
                 print( f"{book} | {music_file}", file=pc2f_fd )
 
-                fbook = clean_filename( book )
-                ofile = f'{self.MusicIndexDir}/{src}-{fbook}.json.gz'
+                if book in self.books:
+                    self.save_book( source, src, book, self.books[ book ] )
+
+    # ------------------------------------------------------------------------
+    #   Write the Music-Index file of one book.
+
+    def save_book( self, source, src, book, contents ):
+        fbook = clean_filename( book )
+        ofile = f'{self.MusicIndexDir}/{src}-{fbook}.json.gz'
+
+        book = " ".join( book.split())
+        source = " ".join( source.split())
+
+        full_contents = {
+            'local': book,
+            'source' : source,
+            'contents': contents,
+        }                             
 
-                book = " ".join( book.split())
-                source = " ".join( source.split())
+        #   WRW 11 Feb 2022 - Compress output
 
-                full_contents = {
-                    'local': book,
-                    'source' : source,
-                    'contents': self.books[ book ],
-                }                             
+        json_text = json.dumps( full_contents, indent=2 )
+        with gzip.open( ofile, 'wt' ) as ofd:
+            ofd.write( json_text )
+
+        # with open( ofile, "w" ) as ofd:
+        #     ofd.write( json.dumps( full_contents, indent=2 ))
 
-                #   WRW 11 Feb 2022 - Compress output
+    # ------------------------------------------------------------------------
+    #   WRW - For converters of large raw indexes. Call when the rows of 'book' are complete
+    #       to write its Music-Index file now and drop its contents, save() then writes the
+    #       remaining books and the Proto files of all. Should a flushed book get more rows
+    #       later its file is read back and written again with them added.
+
+    def flush_book( self, source, src, book ):
+        contents = self.books.pop( book, None )
+        if contents is None:
+            return
 
-                json_text = json.dumps( full_contents, indent=2 )
-                with gzip.open( ofile, 'wt' ) as ofd:
-                    ofd.write( json_text )
+        if book in self.saved_books:
+            ofile = f'{self.MusicIndexDir}/{src}-{clean_filename( book )}.json.gz'
+            with gzip.open( ofile, 'rt' ) as ifd:
+                contents = json.load( ifd )[ 'contents' ] + contents
 
-                # with open( ofile, "w" ) as ofd:
-                #     ofd.write( json.dumps( full_contents, indent=2 ))
+        self.save_book( source, src, book, contents )
+        self.saved_books.add( book )
 
     # ------------------------------------------------------------------------
     #   WRW 7 Mar 2022 - Added save_csv() so can avoid shipping the entire buffalo.html
     #       raw source file. Huge.
+    #   WRW - Rows may be moved out to temp files in runs by save_csv_run() as they are
+    #       added, save_csv() then merges the runs. Same output, each run is sorted by book
+    #       in order added and heapq.merge() keeps the order of runs for equal books.
+
+    def save_csv_run( self ):
+        tfd = tempfile.TemporaryFile( 'w+', newline='' )
+        csvwriter = csv.writer( tfd )
+        for book in sorted( self.books ):
+            for content in self.books[ book ]:
+                csvwriter.writerow( [book, content['title'], content[ 'sheet' ], content['composer'], content['lyricist'] ] )
+        tfd.seek( 0 )
+        self.csv_runs.append( tfd )
+        self.books = {}
 
     def save_csv( self, source, src, ofile ):
+        if self.csv_runs:
+            self.save_csv_run()
+            rows = heapq.merge( *[ csv.reader( tfd ) for tfd in self.csv_runs ], key=lambda row: row[0] )
+        else:
+            rows = ( [book, content['title'], content[ 'sheet' ], content['composer'], content['lyricist'] ]
+                     for book in sorted( self.books ) for content in self.books[ book ] )
+
         with gzip.open( ofile, 'wt' ) as ofd:
         # with open( ofile, "w" ) as ofd:
             csvwriter = csv.writer( ofd )
-            for book in sorted( self.books ):
-                book = " ".join( book.split())
-                source = " ".join( source.split())
-                for content in self.books[ book ]:
-                    csvwriter.writerow( [book, content['title'], content[ 'sheet' ], content['composer'], content['lyricist'] ] )
+            for row in rows:
+                row[0] = " ".join( row[0].split())
+                csvwriter.writerow( row )
+
+        for tfd in self.csv_runs:
+            tfd.close()
+        self.csv_runs = []
 
     # ------------------------------------------------------------------------
     #   Call 'callback' for each source file in Index.Json matching 'src'
+    #   WRW - Now through the Music-Index reader, by absolute path, no chdir. Books are
+    #       loaded one at a time, in order of file name.
 
     def get_music_index_data_by_src( self, src, callback, **kwargs ):
-        curdir = os.getcwd()
-        os.chdir( self.MusicIndexDir )
-        files = glob.glob( f"{src}*.json.gz" )
-        for file in files:
-          # with open( file ) as ifd:
-            with gzip.open( file, 'rt' ) as ifd:
-                data = json.load( ifd )
-                callback( src, data, file, **kwargs )
-        os.chdir ( curdir )
+        for entry, data in self.music_index.iter_books( src ):
+            callback( src, data, entry.path.name, **kwargs )
 
     # ------------------------------------------------------------------------
     #   WRW 2 Mar 2022 - Original returned array of arrays, now returns just array.
@@ -569,28 +902,29 @@ class FB():
     #   WRW 25 Apr 2022 - Always include 'Usr' files for 'No-Index' as we may want to edit them after they were added to database.
 
     def get_canonicals_for_create( self, select ):
+        k = self.book_keys()
         if select == 'All':
-            txt = """SELECT DISTINCT canonicals.canonical
+            txt = f"""SELECT DISTINCT canonicals.canonical
                      FROM canonicals
-                     JOIN canonical2file USING( canonical )
+                     JOIN canonical2file {k['canonical_using']}
                      ORDER BY canonicals.canonical
                  """
 
         elif select == 'No-Index':                              # This is default and only useful option.
-            txt = """SELECT DISTINCT canonicals.canonical
+            txt = f"""SELECT DISTINCT canonicals.canonical
                      FROM canonicals
-                     JOIN canonical2file USING( canonical )
-                     LEFT JOIN local2canonical USING( canonical )
+                     JOIN canonical2file {k['canonical_using']}
+                     LEFT JOIN local2canonical {k['canonical_using']}
                      WHERE (local2canonical.canonical IS NULL) OR
                      (local2canonical.src = 'Usr')
                      ORDER BY canonicals.canonical
                  """
 
         elif select == 'Only-Index':
-            txt = """SELECT DISTINCT canonicals.canonical
+            txt = f"""SELECT DISTINCT canonicals.canonical
                      FROM canonicals
-                     JOIN canonical2file USING( canonical )
-                     LEFT JOIN local2canonical USING( canonical )
+                     JOIN canonical2file {k['canonical_using']}
+                     LEFT JOIN local2canonical {k['canonical_using']}
                      WHERE local2canonical.canonical IS NOT NULL
                      ORDER BY canonicals.canonical
                  """
@@ -672,9 +1006,11 @@ class FB():
     #   WRW 1 Apr 2022 - For editing raw index sources
 
     def get_raw_file( self, title, local, src ):
-        query = """SELECT file, line FROM raw_index
+        k = self.book_keys()
+        query = f"""SELECT file, line FROM raw_index
                    JOIN titles_distinct USING( title_id )
-                   WHERE title = %s AND src = %s AND local = %s
+                   {k['books_join']}
+                   WHERE title = %s AND {k['books']}src = %s AND {k['books']}local = %s
                 """
         query = fix_query( query )
         data = [ title, src, local ]
@@ -698,15 +1034,10 @@ class FB():
     #    This is based on index files, not the database, now config file.
     #       Need both. This used by build-tables.py
 
-    def get_srcs_from_index( self ):
-        srcs = set()
-        cur = os.getcwd()
-        os.chdir ( self.MusicIndexDir )
-        files = glob.glob( '*' )
-        os.chdir ( cur )
-        [ srcs.add( re.sub( '\-.*$', '', file )) for file in files ]
+    #   WRW - From the Music-Index reader, only srcs of .json.gz files, sorted.
 
-        return list( srcs )
+    def get_srcs_from_index( self ):
+        return self.music_index.get_srcs()
 
     # ------------------------------------------------------------------------
     #   Get list of local names from MusicIndexDir for src
@@ -759,10 +1090,12 @@ class FB():
 
     def get_index_from_src_local( self, src, local ):
 
-        query = """SELECT title, sheet, composer FROM titles_distinct
+        k = self.book_keys()
+        query = f"""SELECT title, sheet, composer FROM titles_distinct
                    JOIN titles USING( title_id )
-                   WHERE src = %s
-                   AND local = %s
+                   {k['books_join']}
+                   WHERE {k['books']}src = %s
+                   AND {k['books']}local = %s
                    ORDER BY sheet +0
                 """
         query = fix_query( query )
@@ -845,22 +1178,23 @@ class FB():
     #   WRW change ORDER BY id to ORDER BY offset_id. Can't do much with id in sqlite3.
     #   WRW 1 May 2022 - Realized not working. Added '+ sheet_offset' to 'AND %s >= sheet_start + sheet_offset'
 
-    def get_sheet_offset_from_page( self, page, src, local ):
-        query = """
-            SELECT sheet_offset
-            FROM sheet_offsets
-            WHERE src = %s
-            AND local = %s
-            AND %s >= sheet_start + sheet_offset
-            ORDER BY offset_id DESC
-            LIMIT 1
-        """
-        query = fix_query( query )
-        data = [ src, local, page ]
-        dc.execute( query, data )
-        row = dc.fetchone()
+    #   WRW - Now from in-memory offsets, see load_sheet_offsets().
 
-        return row[ 'sheet_offset' ] if row else None
+    def get_sheet_offset_from_page( self, page, src, local ):
+        offsets = self.get_sheet_offsets( src, local )
+        i = find_sheet_offset( offsets, 'page_mins', page )
+        return offsets[ 'offsets' ][ i ] if i is not None else None
+
+    #   Batch version. items is iterable of ( page, src, local ). Returns list of offset or None.
+
+    def get_sheet_offsets_from_pages( self, items ):
+        self.check_sheet_offsets()
+        res = []
+        for page, src, local in items:
+            offsets = self.get_sheet_offsets( src, local )
+            i = find_sheet_offset( offsets, 'page_mins', page )
+            res.append( offsets[ 'offsets' ][ i ] if i is not None else None )
+        return res
 
     # --------------------------------------------------------------------------
     #   Remember: 'sheet' is what is printed in the book, 'page' is the PDF page number.
@@ -877,22 +1211,16 @@ class FB():
     #       Had error in earlier approach.
     #   WRW 1 May 2022 - Realized not working. Added '+ sheet_offset' to 'AND %s >= sheet_start + sheet_offset'
 
+    #   WRW - Now from in-memory offsets, see load_sheet_offsets().
+
     def get_sheet_from_page( self, page, src, local ):
+        return sheet_from_page( self.get_sheet_offsets( src, local ), page )
 
-        query = """SELECT %s - sheet_offset AS sheet
-                   FROM sheet_offsets
-                   WHERE src = %s
-                   AND local = %s
-                   AND %s >= sheet_start + sheet_offset
-                   ORDER BY offset_id DESC
-                   LIMIT 1
-                """
-        query = fix_query( query )
-        data = [page, src, local, page]
-        dc.execute( query, data )
+    #   Batch version. items is iterable of ( page, src, local ). Returns list of sheet or None.
 
-        row = dc.fetchone()
-        return str(int(row[ 'sheet' ])) if row else None
+    def get_sheets_from_pages( self, items ):
+        self.check_sheet_offsets()
+        return [ sheet_from_page( self.get_sheet_offsets( src, local ), page ) for page, src, local in items ]
 
     # ----------------------------------------------------------------------------
 
@@ -956,26 +1284,121 @@ class FB():
     #       of page vs sheet. Problem is with Sqlite, OK with MySql. Prob is use of primary key 'id'. Add
     #       a separate id value in table as offset_id. Solved problem
 
+    #   WRW - Now from in-memory offsets, see load_sheet_offsets().
+
     def get_page_from_sheet( self, sheet, src, local ):
+        return page_from_sheet( self.get_sheet_offsets( src, local ), sheet )
+
+    #   Batch version. items is iterable of ( sheet, src, local ). Returns list of page or None.
 
-        query = """SELECT %s + sheet_offset AS page
+    def get_pages_from_sheets( self, items ):
+        self.check_sheet_offsets()
+        return [ page_from_sheet( self.get_sheet_offsets( src, local ), sheet ) for sheet, src, local in items ]
+
+    # ----------------------------------------------------------------------------
+    #   WRW - All of sheet_offsets loaded once into memory by ( src, local ). Translation between
+    #       sheet and page is then a bisect and an add, no SELECT per lookup.
+    #   The SQL picked the row with highest offset_id among those with start <= value. Keep
+    #       the rows in offset_id order and bisect on the suffix minimum of start, which is
+    #       non-decreasing, to get the same row even if a source lists its offsets out of order.
+    #   Loaded at first lookup after invalidate_sheet_offsets(). That is called by check_sheet_offsets()
+    #       when the database changed, e.g. after build_tables.py --offset, and on reopen and after a
+    #       build run from birdland. A single lookup does no database access at all.
+
+    def load_sheet_offsets( self ):
+        query = """SELECT src, local, sheet_start, sheet_offset
                    FROM sheet_offsets
-                   WHERE src = %s
-                   AND local = %s
-                   AND %s >= sheet_start
-                   ORDER BY offset_id DESC
-                   LIMIT 1
+                   ORDER BY offset_id
                 """
+        try:
+            dc.execute( query )
 
-        query = fix_query( query )
-        data = [sheet, src, local, sheet]
-        dc.execute( query, data )
+        except Exception as e:
+            (extype, value, traceback) = sys.exc_info()
+            print( f"ERROR on SELECT, type: {extype}, value: {value}", file=sys.stderr )
+            print( f"  {query}", file=sys.stderr  )
+            return {}
 
-        # print( query )
-        # print( data )
+        rows_by_book = {}
+        for row in dc.fetchall():
+            rows_by_book.setdefault( ( row[ 'src' ], row[ 'local' ] ), [] ).append( ( int( row[ 'sheet_start' ] ), int( row[ 'sheet_offset' ] )) )
 
-        row = dc.fetchone()
-        return str(int(row[ 'page' ])) if row else None
+        sheet_offsets = {}
+        for book, rows in rows_by_book.items():
+            sheet_offsets[ book ] = {
+                'starts' :     [ start for start, offset in rows ],
+                'offsets' :    [ offset for start, offset in rows ],
+                'sheet_mins' : suffix_min( [ start for start, offset in rows ] ),
+                'page_mins' :  suffix_min( [ start + offset for start, offset in rows ] ),
+            }
+
+        return sheet_offsets
+
+    # ----------------------------------------------------------------------------
+    #   WRW - Called once per GUI event and by the batch lookups, not per lookup. Generation is
+    #       None when it can't be determined (MySql), only the explicit invalidation applies then.
+
+    def check_sheet_offsets( self ):
+        if self.sheet_offsets is None:
+            return
+        generation = self.get_db_generation()
+        if generation is not None and generation != self.sheet_offsets_generation:
+            self.invalidate_sheet_offsets()
+
+    def invalidate_sheet_offsets( self ):
+        self.sheet_offsets = None
+        self.sheet_offsets_generation = None
+
+    #   WRW - After a command run from birdland, it may have rebuilt the database in place (MySql).
+
+    def database_changed( self ):
+        self.invalidate_sheet_offsets()
+        self.book_keys_available = None
+
+    def get_sheet_offsets( self, src, local ):
+        if self.sheet_offsets is None:
+            self.sheet_offsets_generation = self.get_db_generation()
+            self.sheet_offsets = self.load_sheet_offsets()
+        return self.sheet_offsets.get( ( src, local ) )
+
+    # ----------------------------------------------------------------------------
+    #   WRW - Changes when the database changes. 'PRAGMA data_version' changes when another
+    #       connection, i.e. build_tables.py, commits, total_changes when we do. Sqlite only.
+    #       db_file_id changes when build_tables.py replaces the file and birdland reopens it.
+
+    def get_db_generation( self ):
+        if not SQLITE:
+            return None
+
+        dc.execute( 'PRAGMA data_version' )
+        return ( self.db_file_id, dc.fetchone()[0], dc.connection.total_changes )
+
+    # ----------------------------------------------------------------------------
+    #   WRW - build_tables.py builds a new Sqlite database file and renames it over the old one.
+    #       An open connection keeps reading the old file, a new inode tells us to reopen.
+    #       Call set_db_file() after each (re)open, it also forgets what was learned about
+    #       the old database.
+
+    def set_db_file( self, path ):
+        self.db_file = Path( path )
+        self.db_file_id = self.get_db_file_id()
+        self.word_index_available = False
+        self.fts_index_available = False
+        self.book_keys_available = None
+        self.invalidate_sheet_offsets()
+
+    def get_db_file_id( self ):
+        try:
+            st = os.stat( self.db_file )
+        except OSError:
+            return None
+        return ( st.st_dev, st.st_ino )
+
+    def db_file_replaced( self ):
+        if not SQLITE or not self.db_file:
+            return False
+        file_id = self.get_db_file_id()
+        return file_id is not None and file_id != self.db_file_id
 
     # ----------------------------------------------------------------------------
     #   WRW 7 Jan 2022 - For First/Prev/Next/Last - do a higher level to update button box
@@ -992,11 +1415,13 @@ class FB():
 
     def get_titles_from_sheet( self, sheet, src, local ):
 
-        query = """SELECT title FROM titles_distinct
+        k = self.book_keys()
+        query = f"""SELECT title FROM titles_distinct
                    JOIN titles USING( title_id )
+                   {k['books_join']}
                    WHERE sheet = %s
-                   AND src = %s
-                   AND local = %s
+                   AND {k['books']}src = %s
+                   AND {k['books']}local = %s
                    ORDER BY title
                 """
         query = fix_query( query )
@@ -1010,10 +1435,12 @@ class FB():
 
     def get_table_of_contents( self, src, local ):
 
-        query = """SELECT title, sheet FROM titles_distinct
+        k = self.book_keys()
+        query = f"""SELECT title, sheet FROM titles_distinct
                    JOIN titles USING( title_id )
-                   WHERE src = %s
-                   AND local = %s
+                   {k['books_join']}
+                   WHERE {k['books']}src = %s
+                   AND {k['books']}local = %s
                    ORDER BY title
                 """
         query = fix_query( query )
@@ -1061,9 +1488,11 @@ class FB():
     # --------------------------------------------------------------------------
 
     def get_canonical_from_src_local( self, src, local ):
-        query = """SELECT canonical FROM local2canonical
-                   WHERE src = %s
-                   AND local = %s
+        k = self.book_keys()
+        query = f"""SELECT canonical FROM local2canonical
+                   {k['books_join']}
+                   WHERE {k['books']}src = %s
+                   AND {k['books']}local = %s
                 """
         query = fix_query( query )
         data = [ src, local ]
@@ -1118,11 +1547,12 @@ class FB():
 
     def get_diff_data( self, canonical ):
 
-        query = """
-            SELECT title, titles.src, local, sheet
+        k = self.book_keys()
+        query = f"""
+            SELECT title, titles.src, titles.local, sheet
             FROM titles
             JOIN titles_distinct USING( title_id )
-            JOIN local2canonical USING( local, src )
+            JOIN local2canonical {k['book_using']}
             WHERE canonical = %s
             ORDER BY sheet+0
         """
@@ -1373,18 +1803,15 @@ class FB():
     # ---------------------------------------------------
     #   WRW 8 Feb 2022 - Get all offsets for a given src/local
 
+    #   WRW - Now from in-memory offsets, see load_sheet_offsets().
+
     def get_offsets( self, src, local ):
-        query = """SELECT sheet_start, sheet_offset
-                   FROM sheet_offsets
-                   WHERE src = %s
-                   AND local = %s
-                   ORDER BY sheet_start DESC
-                """
-        query = fix_query( query )
-        data = [src, local]
-        dc.execute( query, data )
+        offsets = self.get_sheet_offsets( src, local )
+        if not offsets:
+            return []
 
-        return [ { 'start': row[ 'sheet_start' ], 'offset': row[ 'sheet_offset' ] } for row in dc.fetchall() ]
+        res = [ { 'start': start, 'offset': offset } for start, offset in zip( offsets[ 'starts' ], offsets[ 'offsets' ] ) ]
+        return sorted( res, key = lambda x: x[ 'start' ], reverse=True )
 
     # ---------------------------------------------------
 
@@ -1418,6 +1845,51 @@ class FB():
         else:
             self.window['results-text' ].print( f"\nCommand completed successfully." )
 
+    # ------------------------------------
+    #   WRW - Same as run_external_command() but don't block the GUI. Output and completion come
+    #       back to the event loop as 'external-command-output' and 'external-command-done' events,
+    #       pass those to external_command_event(). One command at a time.
+
+    def run_external_command_background( self, command ):
+        self.window[ 'tab-results-text' ].select()
+        self.window[ 'tab-results-text'].update( visible = True )
+
+        if self.extcmd_thread and self.extcmd_thread.is_alive():
+            self.window['results-text' ].print( f"\nA command is still running, wait for it to complete." )
+            return
+
+        self.window[ 'results-text' ].update( value='' )
+        self.extcmd_thread = threading.Thread( target=self.run_external_command_thread, args=( command, ), daemon=True )
+        self.extcmd_thread.start()
+
+    def run_external_command_thread( self, command ):
+        try:
+            popen = subprocess.Popen( command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True )
+            for line in popen.stdout:
+                self.window.write_event_value( 'external-command-output', line )
+
+            popen.stdout.close()
+            rcode = popen.wait()
+
+        except Exception as e:
+            (extype, value, traceback) = sys.exc_info()
+            self.window.write_event_value( 'external-command-output', f"ERROR running command, type: {extype}, value: {value}\n" )
+            rcode = 1
+
+        self.window.write_event_value( 'external-command-done', ( command, rcode ) )
+
+    def external_command_event( self, event, values ):
+        if event == 'external-command-output':
+            self.window['results-text' ].print( values[ event ], end='' )
+
+        elif event == 'external-command-done':
+            command, rcode = values[ event ]
+            self.database_changed()                     # The command may have rebuilt the database.
+            if rcode:
+                self.window['results-text' ].print( f"\nCommand failed, { ' '.join( command )} returned exit code: {rcode}" )
+            else:
+                self.window['results-text' ].print( f"\nCommand completed successfully." )
+
     # ------------------------------------
 
     def run_external_command_quiet( self, command, res_win, rerouted ):
@@ -1482,6 +1954,7 @@ class FB():
                 res_win.restore_stdout()
                 res_win.restore_stderr()
 
+            self.database_changed()                     # The command may have rebuilt the database.
             return rcode
 
         # --------------------------------------------------------------------------
@@ -1498,6 +1971,7 @@ class FB():
     
             extcmd_popen.stdout.close()
             rcode = extcmd_popen.wait()
+            self.database_changed()
             return rcode
 
 # ----------------------------------------------------------------------------